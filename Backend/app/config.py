@@ -13,12 +13,86 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = Field(default="sqlite:///./agrosense.db", env="DATABASE_URL")
+    async_database_url: str = Field(default="", env="ASYNC_DATABASE_URL")  # Derived from DATABASE_URL when empty
+    sqlite_tuned: bool = Field(default=True, env="SQLITE_TUNED")  # WAL + pragmas + separate writer pool
+    sqlite_synchronous: str = Field(default="NORMAL", pattern="^(OFF|NORMAL|FULL|EXTRA)$", env="SQLITE_SYNCHRONOUS")
+    sqlite_busy_timeout_ms: int = Field(default=5000, env="SQLITE_BUSY_TIMEOUT_MS")
+    sqlite_mmap_size: int = Field(default=256 * 1024 * 1024, env="SQLITE_MMAP_SIZE")
+    sqlite_cache_size_kib: int = Field(default=64 * 1024, env="SQLITE_CACHE_SIZE_KIB")
+    db_read_pool_size: int = Field(default=8, env="DB_READ_POOL_SIZE")
+    db_read_max_overflow: int = Field(default=8, env="DB_READ_MAX_OVERFLOW")
     
     # Security
     secret_key: str = Field(..., env="SECRET_KEY")
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     
+    # MQTT ingest
+    mqtt_ingest_mode: str = Field(default="asyncio", env="MQTT_INGEST_MODE")  # 'asyncio' or 'thread'
+    mqtt_ingest_queue_max: int = Field(default=5000, env="MQTT_INGEST_QUEUE_MAX")
+    mqtt_reconnect_min_s: float = Field(default=1.0, env="MQTT_RECONNECT_MIN_S")
+    mqtt_reconnect_max_s: float = Field(default=60.0, env="MQTT_RECONNECT_MAX_S")
+    mqtt_binary_topics: str = Field(default="AgriMonitor/bin", env="MQTT_BINARY_TOPICS")  # comma separated
+    mqtt_accept_literal_payloads: bool = Field(default=True, env="MQTT_ACCEPT_LITERAL_PAYLOADS")
+    sensor_zone_codes: str = Field(default="main,field_a,field_b", env="SENSOR_ZONE_CODES")  # index = binary zone code
+    sensor_timeout_s: float = Field(default=30, env="SENSOR_TIMEOUT_S")  # offline after this long without data
+    sensor_timeout_overrides: str = Field(default="", env="SENSOR_TIMEOUT_OVERRIDES")  # "sensor_id:seconds,..."
+    ingest_batch_size: int = Field(default=200, env="INGEST_BATCH_SIZE")
+    ingest_flush_interval_ms: int = Field(default=250, env="INGEST_FLUSH_INTERVAL_MS")
+    ingest_queue_max: int = Field(default=10000, env="INGEST_QUEUE_MAX")
+    
+    # Alert rules evaluated on ingest
+    alert_rules_enabled: bool = Field(default=True, env="ALERT_RULES_ENABLED")
+    alert_rules_path: str = Field(default="", env="ALERT_RULES_PATH")  # defaults to app/alert_rules.json
+    alert_dedup_window_s: int = Field(default=900, env="ALERT_DEDUP_WINDOW_S")  # 0 = never coalesce
+    
+    # Irrigation (valves listed in app/pinconfig.json, keyed by sensor module id)
+    irrigation_enabled: bool = Field(default=True, env="IRRIGATION_ENABLED")
+    irrigation_gpio_backend: str = Field(default="simulated", env="IRRIGATION_GPIO_BACKEND")  # 'simulated' or 'rpi'
+    irrigation_pin_config: str = Field(default="", env="IRRIGATION_PIN_CONFIG")  # defaults to app/pinconfig.json
+    irrigation_humidity_threshold: float = Field(default=80, env="IRRIGATION_HUMIDITY_THRESHOLD")
+    irrigation_debounce_readings: int = Field(default=3, env="IRRIGATION_DEBOUNCE_READINGS")
+    irrigation_water_s: float = Field(default=5, env="IRRIGATION_WATER_S")
+    irrigation_cooldown_s: float = Field(default=5, env="IRRIGATION_COOLDOWN_S")
+    irrigation_max_concurrent_valves: int = Field(default=1, env="IRRIGATION_MAX_CONCURRENT_VALVES")
+    
+    # Data retention (raw readings are archived per month, then purged)
+    retention_enabled: bool = Field(default=False, env="RETENTION_ENABLED")
+    retention_days: int = Field(default=90, env="RETENTION_DAYS")
+    alert_retention_days: int = Field(default=180, env="ALERT_RETENTION_DAYS")  # resolved alerts only
+    rollup_minute_retention_days: int = Field(default=30, env="ROLLUP_MINUTE_RETENTION_DAYS")  # 0 = keep forever
+    retention_archive_dir: str = Field(default="./archive", env="RETENTION_ARCHIVE_DIR")
+    retention_chunk_size: int = Field(default=500, env="RETENTION_CHUNK_SIZE")
+    retention_chunk_pause_ms: int = Field(default=50, env="RETENTION_CHUNK_PAUSE_MS")
+    retention_interval_hours: float = Field(default=24, env="RETENTION_INTERVAL_HOURS")
+    retention_vacuum: bool = Field(default=False, env="RETENTION_VACUUM")
+    
+    # WebSocket fan-out
+    ws_send_queue_size: int = Field(default=256, env="WS_SEND_QUEUE_SIZE")
+    ws_slow_client_policy: str = Field(default="drop_oldest", env="WS_SLOW_CLIENT_POLICY")  # 'drop_oldest' or 'disconnect'
+    ws_send_timeout_s: float = Field(default=10.0, env="WS_SEND_TIMEOUT_S")
+    ws_default_max_rate: float = Field(default=0, env="WS_DEFAULT_MAX_RATE")  # 0 = immediate delivery
+    ws_max_rate_limit: float = Field(default=20.0, env="WS_MAX_RATE_LIMIT")
+    
+    # AI calls (Gemini runs on its own thread pool)
+    ai_max_concurrency: int = Field(default=2, env="AI_MAX_CONCURRENCY")
+    ai_call_timeout_s: float = Field(default=30.0, env="AI_CALL_TIMEOUT_S")
+    ai_queue_timeout_s: float = Field(default=5.0, env="AI_QUEUE_TIMEOUT_S")  # wait for a free slot before 503
+    ai_max_pending_jobs: int = Field(default=20, env="AI_MAX_PENDING_JOBS")
+    ai_job_ttl_s: float = Field(default=600.0, env="AI_JOB_TTL_S")  # how long finished job results are kept
+    ai_batch_max_images: int = Field(default=50, env="AI_BATCH_MAX_IMAGES")
+    ai_batch_concurrency: int = Field(default=4, env="AI_BATCH_CONCURRENCY")  # also capped by AI_MAX_CONCURRENCY
+    ai_cache_enabled: bool = Field(default=True, env="AI_CACHE_ENABLED")  # plant analysis result cache
+    ai_cache_ttl_hours: float = Field(default=168, env="AI_CACHE_TTL_HOURS")
+    ai_cache_max_entries: int = Field(default=1000, env="AI_CACHE_MAX_ENTRIES")
+    ai_cache_phash_distance: int = Field(default=4, env="AI_CACHE_PHASH_DISTANCE")  # max differing dHash bits; -1 = exact only
+    
+    # Image uploads (decoded and downscaled on a process pool before AI analysis)
+    image_max_upload_mb: float = Field(default=10, env="IMAGE_MAX_UPLOAD_MB")
+    image_max_edge: int = Field(default=1024, env="IMAGE_MAX_EDGE")  # px, longest side sent to the model
+    image_jpeg_quality: int = Field(default=85, ge=1, le=95, env="IMAGE_JPEG_QUALITY")
+    image_workers: int = Field(default=2, env="IMAGE_WORKERS")
+    
     # CORS
     frontend_url: str = Field(default="http://localhost:3000", env="FRONTEND_URL")
     
@@ -1,21 +1,129 @@
-from sqlalchemy import create_engine
+from typing import AsyncIterator
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.schema import CreateColumn
 from .config import settings
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
+is_sqlite = settings.database_url.startswith("sqlite")
+# WAL and separate pools only make sense for a file-backed SQLite database
+sqlite_tuned = (
+    is_sqlite
+    and settings.sqlite_tuned
+    and ":memory:" not in settings.database_url
+    and settings.database_url.rstrip("/") != "sqlite:"
 )
 
+# Async drivers for the request handlers' engine, keyed by the sync URL scheme
+ASYNC_DRIVERS = {
+    "sqlite://": "sqlite+aiosqlite://",
+    "postgresql://": "postgresql+asyncpg://",
+}
+
+
+def _async_url(url: str) -> str:
+    if settings.async_database_url:
+        return settings.async_database_url
+    for scheme, async_scheme in ASYNC_DRIVERS.items():
+        if url.startswith(scheme):
+            return async_scheme + url[len(scheme):]
+    return url
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Per-connection SQLite settings for concurrent readers alongside a single writer."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")  # Readers no longer block the writer (or vice versa)
+    cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")  # NORMAL is durable enough under WAL
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kib)}")  # negative = KiB
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _create_engine(**pool_options):
+    connect_args = {}
+    if is_sqlite:
+        connect_args["check_same_thread"] = False
+    if sqlite_tuned:
+        connect_args["timeout"] = settings.sqlite_busy_timeout_ms / 1000
+    new_engine = create_engine(settings.database_url, connect_args=connect_args, **pool_options)
+    if sqlite_tuned:
+        event.listen(new_engine, "connect", _apply_sqlite_pragmas)
+    return new_engine
+
+
+def _create_async_engine(**pool_options):
+    connect_args = {}
+    if sqlite_tuned:
+        connect_args["timeout"] = settings.sqlite_busy_timeout_ms / 1000
+    new_engine = create_async_engine(
+        _async_url(settings.database_url), connect_args=connect_args, **pool_options
+    )
+    if sqlite_tuned:
+        # Pragmas go through the sync facade; aiosqlite connections are adapted to DBAPI
+        event.listen(new_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return new_engine
+
+
+engine = _create_engine()
+if sqlite_tuned:
+    # Request handlers read concurrently through a pool on the async engine...
+    # aiosqlite defaults to NullPool; pooling keeps each connection's page cache and mmap warm
+    async_engine = _create_async_engine(
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=settings.db_read_pool_size,
+        max_overflow=settings.db_read_max_overflow,
+    )
+    # ...while background writers (ingest, retention) share one connection,
+    # so they queue in the pool instead of fighting over SQLite's write lock.
+    write_engine = _create_engine(pool_size=1, max_overflow=0)
+else:
+    async_engine = _create_async_engine()
+    write_engine = engine
+
+# Sync sessions: startup, CLI tools and the background worker threads
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+WriteSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=write_engine)
+# Async sessions: request handlers. Objects stay loaded after commit, since
+# lazy refreshes would need an await the response serializer cannot do.
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+def ensure_indexes():
+    """Create indexes added to models after their tables already existed (create_all skips them)."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def ensure_columns():
+    """Add columns added to models after their tables already existed (create_all skips them)."""
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                # New columns must be nullable or carry a server default for existing rows
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}")
+                print(f"[DB] Added column {table.name}.{column.name}")
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """
+    Request-scoped async session. Sync helpers that take a Session
+    (rollups, latest cache, series loading) run through db.run_sync().
+    """
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
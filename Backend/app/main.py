@@ -3,47 +3,81 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import asyncio
 from .config import settings
-from .database import engine, Base
-from .routers import sensors, alerts, ai_analysis, websocket
-from .routers.websocket import check_sensor_timeouts
+from .pagination import NEXT_CURSOR_HEADER
+from .database import engine, async_engine, Base, SessionLocal, ensure_columns, ensure_indexes
+from .routers import sensors, alerts, ai_analysis, websocket, irrigation
+from .routers.websocket import restore_sensor_status, sensor_went_offline
 from .services.mqtt_listener import mqtt_listener
+from .services.mqtt_async import async_mqtt_listener
+from .services.ingest_writer import ingest_writer
+from .services.latest_cache import latest_cache
+from .services.liveness import sensor_liveness
+from .services.irrigation import irrigation as irrigation_controller
+from .services.alert_rules import alert_engine
+from .services.alert_store import alert_store, alert_counters
+from .services.retention import retention_job, retention_scheduler
+from .services.ai_executor import ai_executor
+from .services.analysis_cache import analysis_cache
+from .services.image_pipeline import image_pipeline
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+ensure_columns()
+ensure_indexes()
 
-# Background task for checking sensor timeouts
+# Background tasks
 sensor_check_task = None
-
-async def sensor_timeout_checker():
-    """Background task to periodically check for sensor timeouts."""
-    while True:
-        try:
-            await check_sensor_timeouts()
-        except Exception as e:
-            print(f"[SENSOR CHECK] Error: {e}")
-        await asyncio.sleep(10)  # Check every 10 seconds
-
+retention_task = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager."""
-    global sensor_check_task
+    global sensor_check_task, retention_task
     
     # Startup
-    mqtt_listener.start()
-    sensor_check_task = asyncio.create_task(sensor_timeout_checker())
-    print("[STARTUP] Sensor timeout checker started")
+    db = SessionLocal()
+    try:
+        latest_cache.warm(db)
+        analysis_cache.warm(db)
+        alert_store.warm(db)
+        alert_counters.load(db)
+    finally:
+        db.close()
+    alert_engine.load()
+    alert_engine.prime(latest_cache.all_sensors())
+    restore_sensor_status(latest_cache.all_sensors())
+    if settings.irrigation_enabled:
+        irrigation_controller.load()
+    ingest_writer.start()
+    if settings.mqtt_ingest_mode == "thread":
+        mqtt_listener.start()
+    else:
+        await async_mqtt_listener.start()
+    sensor_check_task = asyncio.create_task(sensor_liveness.run(sensor_went_offline))
+    print("[STARTUP] Sensor liveness tracker started")
+    if settings.retention_enabled:
+        retention_task = asyncio.create_task(retention_scheduler(retention_job))
+        print(f"[STARTUP] Retention job scheduled (keep {settings.retention_days} days)")
     
     yield
     
     # Shutdown
-    if sensor_check_task:
-        sensor_check_task.cancel()
-        try:
-            await sensor_check_task
-        except asyncio.CancelledError:
-            pass
-    mqtt_listener.shutdown()
+    for task in (sensor_check_task, retention_task):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    if settings.mqtt_ingest_mode == "thread":
+        mqtt_listener.shutdown()
+    else:
+        await async_mqtt_listener.shutdown()
+    ingest_writer.stop()
+    await irrigation_controller.shutdown()
+    await ai_executor.shutdown()
+    image_pipeline.shutdown()
+    await async_engine.dispose()
     print("[SHUTDOWN] Cleanup complete")
 
 
@@ -61,6 +95,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Include routers
@@ -68,6 +103,7 @@ app.include_router(sensors.router, prefix="/api/sensors", tags=["Sensors"])
 app.include_router(alerts.router, prefix="/api/alerts", tags=["Alerts"])
 app.include_router(ai_analysis.router, prefix="/api/ai", tags=["AI Analysis"])
 app.include_router(websocket.router, prefix="/ws", tags=["WebSocket"])
+app.include_router(irrigation.router, prefix="/api/irrigation", tags=["Irrigation"])
 
 
 @app.get("/")
@@ -1,2 +1,2 @@
 # Initialize models package
-from .models import SensorReading, Alert, AnalysisLog
+from .models import SensorReading, Alert, AnalysisLog, AnalysisCacheEntry, SensorRollupMinute, SensorRollupHour
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Index, UniqueConstraint, false, text
 from sqlalchemy.sql import func
 from datetime import datetime
 from ..database import Base
@@ -6,6 +6,11 @@ from ..database import Base
 
 class SensorReading(Base):
     __tablename__ = "sensor_readings"
+    __table_args__ = (
+        # Every read path filters by zone or sensor and orders by time
+        Index("ix_sensor_readings_zone_timestamp", "zone", "timestamp"),
+        Index("ix_sensor_readings_sensor_id_timestamp", "sensor_id", "timestamp"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=datetime.now, index=True)  # Local time
@@ -38,6 +43,12 @@ class Alert(Base):
     
     # Optional metadata
     zone = Column(String, nullable=True)
+    sensor_id = Column(Integer, nullable=True)  # Sensor that raised it (latest repeat, once coalesced)
+    
+    # Repeats of an open alert are coalesced into this row
+    occurrences = Column(Integer, default=1, server_default=text("1"), nullable=False)
+    first_seen = Column(DateTime, nullable=True)
+    last_seen = Column(DateTime, nullable=True)
 
 
 class AnalysisLog(Base):
@@ -51,3 +62,64 @@ class AnalysisLog(Base):
     
     # Store image reference or base64 (optional)
     image_path = Column(String, nullable=True)
+    
+    # Served from the analysis cache instead of a fresh model call
+    cache_hit = Column(Boolean, default=False, server_default=false(), nullable=False)
+
+
+class AnalysisCacheEntry(Base):
+    """Model result for one image, keyed by content hash, perceptual hash and prompt version."""
+    __tablename__ = "analysis_cache"
+    __table_args__ = (
+        UniqueConstraint("analysis_type", "prompt_version", "sha256", name="uq_analysis_cache_key"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    analysis_type = Column(String, nullable=False)
+    prompt_version = Column(String, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    phash = Column(String(16), nullable=False)  # 64-bit dHash, hex
+    result = Column(String, nullable=False)
+    
+    created_at = Column(DateTime, default=datetime.now, nullable=False)  # Local time
+    last_hit_at = Column(DateTime, default=datetime.now, nullable=False)
+    hit_count = Column(Integer, default=0, nullable=False)
+
+
+class SensorRollupMixin:
+    """Per sensor/zone aggregates over one time bucket, updated as readings are ingested."""
+    
+    bucket = Column(DateTime, primary_key=True)  # Bucket start, local time like readings
+    zone = Column(String, primary_key=True)
+    sensor_id = Column(Integer, primary_key=True)
+    
+    count = Column(Integer, nullable=False, default=0)
+    
+    moisture_sum = Column(Float, nullable=False, default=0)
+    moisture_min = Column(Float)
+    moisture_max = Column(Float)
+    temperature_sum = Column(Float, nullable=False, default=0)
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+    humidity_sum = Column(Float, nullable=False, default=0)
+    humidity_min = Column(Float)
+    humidity_max = Column(Float)
+    ph_sum = Column(Float, nullable=False, default=0)
+    ph_min = Column(Float)
+    ph_max = Column(Float)
+
+
+class SensorRollupMinute(SensorRollupMixin, Base):
+    __tablename__ = "sensor_rollups_minute"
+    __table_args__ = (
+        Index("ix_sensor_rollups_minute_zone_bucket", "zone", "bucket"),
+        Index("ix_sensor_rollups_minute_sensor_bucket", "sensor_id", "bucket"),
+    )
+
+
+class SensorRollupHour(SensorRollupMixin, Base):
+    __tablename__ = "sensor_rollups_hour"
+    __table_args__ = (
+        Index("ix_sensor_rollups_hour_zone_bucket", "zone", "bucket"),
+        Index("ix_sensor_rollups_hour_sensor_bucket", "sensor_id", "bucket"),
+    )
@@ -0,0 +1,43 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Sequence
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just past a (timestamp, id) position."""
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+
+def keyset_page(query, model, cursor: Optional[str]):
+    """
+    Order a query newest-first by (timestamp, id) and, given a cursor,
+    continue strictly after it. Unlike OFFSET, the database seeks straight
+    to the position through the timestamp index, so deep pages cost the
+    same as the first one.
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(model.timestamp, model.id) < tuple_(timestamp, row_id))
+    return query.order_by(model.timestamp.desc(), model.id.desc())
+
+
+def set_next_cursor(response: Response, rows: Sequence[Any], limit: int) -> None:
+    """Advertise the next page's cursor in a response header when the page came back full."""
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.timestamp, last.id)
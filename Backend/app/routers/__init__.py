@@ -1,2 +1,2 @@
 # Initialize routers package
-from . import sensors, alerts, ai_analysis, websocket
+from . import sensors, alerts, ai_analysis, websocket, irrigation
@@ -1,80 +1,272 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, Callable, List, Optional, Union
+import asyncio
+import json
+import anyio
 from datetime import datetime
-from ..database import get_db
+from ..config import settings
+from ..database import get_db, AsyncSessionLocal
 from ..models import AnalysisLog
-from ..schemas import AnalysisRequest, AnalysisResponse
+from ..schemas import AnalysisRequest, AnalysisResponse, AIJobResponse
 from ..services import gemini_service
+from ..services.gemini_service import PLANT_HEALTH_PROMPT_VERSION
+from ..services.analysis_cache import analysis_cache
+from ..services.ai_executor import ai_executor, AIExecutorError, AIBusyError
+from ..services.image_pipeline import image_pipeline, ImageError, PreparedImage
+from ..pagination import keyset_page, set_next_cursor
 
 router = APIRouter()
 
+ANALYZERS = {
+    "plant_health": gemini_service.analyze_plant_health,
+    "security": gemini_service.analyze_security_image,
+}
+STREAMING_ANALYZERS = {
+    "plant_health": gemini_service.stream_plant_health,
+    "security": gemini_service.stream_security_image,
+}
+# Prompt version per cacheable analysis type; results of other types are never cached
+CACHED_ANALYSES = {
+    "plant_health": PLANT_HEALTH_PROMPT_VERSION,
+}
+MAX_UPLOAD_BYTES = int(settings.image_max_upload_mb * 1024 * 1024)
+# Keep proxies (nginx) from buffering the event stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+async def _read_upload(file: UploadFile) -> bytes:
+    data = await file.read(MAX_UPLOAD_BYTES + 1)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image larger than {settings.image_max_upload_mb:g} MB")
+    return data
+
+
+def _check_base64_size(image_base64: str) -> None:
+    if len(image_base64) > MAX_UPLOAD_BYTES * 4 // 3 + 4:
+        raise HTTPException(status_code=413, detail=f"Image larger than {settings.image_max_upload_mb:g} MB")
+
+
+def _is_error_result(result: str) -> bool:
+    """gemini_service reports failures as "Error ..." text instead of raising."""
+    return result.startswith("Error ")
+
+
+async def _run_analysis(analysis_type: str, image: PreparedImage) -> tuple[str, Optional[dict]]:
+    """
+    Answer from the content-addressed result cache where the analysis type
+    allows it, else call the model. Touches no DB session, so many can run
+    concurrently; persist the outcome with _record_analysis.
+    
+    Returns:
+        (result text, the cache entry if it was a hit)
+    """
+    prompt_version = CACHED_ANALYSES.get(analysis_type)
+    if prompt_version is not None:
+        entry = analysis_cache.lookup(analysis_type, prompt_version, image.fingerprint)
+        if entry:
+            return entry["result"], entry
+    return await ANALYZERS[analysis_type](image.jpeg), None
+
+
+async def _record_analysis(
+    db: AsyncSession,
+    analysis_type: str,
+    image: Optional[PreparedImage],
+    result: str,
+    cache_entry: Optional[dict]
+) -> None:
+    """Add the AnalysisLog row and cache updates for one analysis to the session; the caller commits."""
+    if cache_entry:
+        await analysis_cache.record_hit(db, cache_entry)
+        db.add(AnalysisLog(analysis_type=analysis_type, result=result, cache_hit=True))
+        return
+    
+    prompt_version = CACHED_ANALYSES.get(analysis_type)
+    # Never cache failures
+    if image is not None and prompt_version is not None and not _is_error_result(result):
+        await analysis_cache.store(db, analysis_type, prompt_version, image.fingerprint, result)
+    db.add(AnalysisLog(analysis_type=analysis_type, result=result))
+
+
+async def _analyze(analysis_type: str, image: PreparedImage, db: AsyncSession) -> tuple[str, bool]:
+    """
+    Run and record one analysis (the caller commits).
+    
+    Returns:
+        (result text, whether it came from the cache)
+    """
+    result, cache_entry = await _run_analysis(analysis_type, image)
+    await _record_analysis(db, analysis_type, image, result, cache_entry)
+    return result, cache_entry is not None
+
+
+async def _analysis_response(
+    analysis_type: str,
+    data: Union[bytes, str],
+    db: AsyncSession
+) -> AnalysisResponse:
+    """Prepare the image off the event loop, analyze it and log the result."""
+    try:
+        image = await image_pipeline.prepare(data)
+    except ImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        # Perform AI analysis (or reuse a cached one) and log it
+        result, cache_hit = await _analyze(analysis_type, image, db)
+        await db.commit()
+        
+        return AnalysisResponse(
+            analysis_type=analysis_type,
+            result=result,
+            timestamp=datetime.utcnow(),
+            cache_hit=cache_hit
+        )
+    
+    except AIExecutorError as e:
+        raise _ai_http_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+
+def _ai_http_error(e: AIExecutorError) -> HTTPException:
+    """503 when the AI pool is saturated (with Retry-After), 504 on timeouts."""
+    headers = {"Retry-After": "5"} if isinstance(e, AIBusyError) else None
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
 
 @router.post("/analyze-plant", response_model=AnalysisResponse)
 async def analyze_plant_health(
     request: AnalysisRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Analyze plant leaf image using Gemini AI.
-    Expects base64 encoded image.
+    Expects base64 encoded image; prefer /analyze-plant/upload for new clients.
+    Repeat uploads of the same (or a nearly identical) photo are answered
+    from the analysis cache.
     """
     if request.analysis_type != "plant_health":
         raise HTTPException(status_code=400, detail="Invalid analysis type for this endpoint")
+    _check_base64_size(request.image_base64)
+    
+    return await _analysis_response("plant_health", request.image_base64, db)
+
+
+@router.post("/analyze-plant/upload", response_model=AnalysisResponse)
+async def upload_plant_image(
+    file: UploadFile = File(..., description="Leaf photo (JPEG, PNG, ...)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Analyze a plant leaf photo sent as a multipart file upload.
+    The image is oriented, downscaled and re-encoded before the model sees it.
+    """
+    return await _analysis_response("plant_health", await _read_upload(file), db)
+
+
+@router.post("/analyze-batch")
+async def analyze_batch(
+    files: List[UploadFile] = File(..., description="Images to analyze"),
+    analysis_type: str = Form("plant_health", description="'plant_health' or 'security'")
+):
+    """
+    Analyze many images in one request, a few at a time.
+    
+    Streams NDJSON: one line per image as soon as it completes (in completion
+    order, with its upload index), then a summary line. All AnalysisLog rows
+    are written in a single transaction at the end.
+    """
+    if analysis_type not in ANALYZERS:
+        raise HTTPException(status_code=400, detail=f"Unknown analysis type: {analysis_type}")
+    if len(files) > settings.ai_batch_max_images:
+        raise HTTPException(status_code=413, detail=f"At most {settings.ai_batch_max_images} images per batch")
     
+    uploads = [(file.filename, await _read_upload(file)) for file in files]
+    return StreamingResponse(_batch_results(analysis_type, uploads), media_type="application/x-ndjson")
+
+
+async def _batch_results(analysis_type: str, uploads: list[tuple[str, bytes]]) -> AsyncIterator[str]:
+    # Beyond the executor's own cap, extra concurrency would only queue for a model slot
+    # (and risk AIBusyError), so the batch fans out at most that wide
+    slots = asyncio.Semaphore(min(settings.ai_batch_concurrency, ai_executor.max_concurrency))
+    completed = []  # (image, result, cache entry) to log
+    
+    async def analyze_one(index: int, filename: str, data: bytes) -> dict:
+        item = {"index": index, "filename": filename}
+        async with slots:
+            try:
+                image = await image_pipeline.prepare(data)
+                result, cache_entry = await _run_analysis(analysis_type, image)
+            except ImageError as e:
+                return {**item, "status": "error", "status_code": 400, "error": str(e)}
+            except AIExecutorError as e:
+                return {**item, "status": "error", "status_code": e.status_code, "error": str(e)}
+            except Exception as e:
+                # One bad item must not abort the stream for the others
+                return {**item, "status": "error", "status_code": 500, "error": f"Analysis failed: {str(e)}"}
+        completed.append((image, result, cache_entry))
+        if _is_error_result(result):
+            # Logged like any other answer, but the model call failed
+            return {**item, "status": "error", "status_code": 502, "error": result}
+        return {**item, "status": "ok", "result": result, "cache_hit": cache_entry is not None}
+    
+    tasks = [asyncio.create_task(analyze_one(i, name, data)) for i, (name, data) in enumerate(uploads)]
+    errors = 0
+    logged = False
     try:
-        # Perform AI analysis
-        result = await gemini_service.analyze_plant_health(request.image_base64)
-        
-        # Log the analysis
-        log = AnalysisLog(
-            analysis_type="plant_health",
-            result=result
-        )
-        db.add(log)
-        db.commit()
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            errors += item["status"] == "error"
+            yield json.dumps(item) + "\n"
         
-        return AnalysisResponse(
-            analysis_type="plant_health",
-            result=result,
-            timestamp=datetime.utcnow()
-        )
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+        await _log_batch(analysis_type, completed)
+        logged = True
+        yield json.dumps({"done": True, "count": len(uploads), "errors": errors, "logged": len(completed)}) + "\n"
+    finally:
+        # Client went away mid-stream: stop outstanding work, still log what finished
+        for task in tasks:
+            task.cancel()
+        if not logged and completed:
+            # Shielded, or the disconnect's cancellation would cancel the write as well
+            with anyio.CancelScope(shield=True):
+                await _log_batch(analysis_type, completed)
+
+
+async def _log_batch(analysis_type: str, completed: list) -> None:
+    # Owns its session because the streamed response outlives the request scope
+    async with AsyncSessionLocal() as db:
+        for image, result, cache_entry in completed:
+            await _record_analysis(db, analysis_type, image, result, cache_entry)
+        await db.commit()
 
 
 @router.post("/analyze-security", response_model=AnalysisResponse)
 async def analyze_security_image(
     request: AnalysisRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Analyze security camera image using Gemini AI.
-    Expects base64 encoded image.
+    Expects base64 encoded image; prefer /analyze-security/upload for new clients.
     """
     if request.analysis_type != "security":
         raise HTTPException(status_code=400, detail="Invalid analysis type for this endpoint")
+    _check_base64_size(request.image_base64)
     
-    try:
-        # Perform AI analysis
-        result = await gemini_service.analyze_security_image(request.image_base64)
-        
-        # Log the analysis
-        log = AnalysisLog(
-            analysis_type="security",
-            result=result
-        )
-        db.add(log)
-        db.commit()
-        
-        return AnalysisResponse(
-            analysis_type="security",
-            result=result,
-            timestamp=datetime.utcnow()
-        )
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    return await _analysis_response("security", request.image_base64, db)
+
+
+@router.post("/analyze-security/upload", response_model=AnalysisResponse)
+async def upload_security_image(
+    file: UploadFile = File(..., description="Camera frame (JPEG, PNG, ...)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Analyze a security camera frame sent as a multipart file upload."""
+    return await _analysis_response("security", await _read_upload(file), db)
 
 
 @router.post("/farming-advice")
@@ -93,29 +285,199 @@ async def get_farming_advice(
             "timestamp": datetime.utcnow().isoformat()
         }
     
+    except AIExecutorError as e:
+        raise _ai_http_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get advice: {str(e)}")
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _stream_analysis(
+    analysis_type: str,
+    chunks: Callable[[], AsyncIterator[str]],
+    image: Optional[PreparedImage] = None
+) -> AsyncIterator[str]:
+    """
+    Server-Sent Events for one model answer: a `chunk` event per piece of
+    text as it is generated, then `done` with the full text once it has been
+    logged, or `error` (with an HTTP-style status code) if the call fails.
+    Cached plant analyses arrive as a single chunk.
+    """
+    cache_entry = None
+    prompt_version = CACHED_ANALYSES.get(analysis_type)
+    if image is not None and prompt_version is not None:
+        cache_entry = analysis_cache.lookup(analysis_type, prompt_version, image.fingerprint)
+    
+    parts = []
+    try:
+        if cache_entry:
+            parts.append(cache_entry["result"])
+            yield _sse("chunk", {"text": cache_entry["result"]})
+        else:
+            async for text in chunks():
+                parts.append(text)
+                yield _sse("chunk", {"text": text})
+    except AIExecutorError as e:
+        yield _sse("error", {"status_code": e.status_code, "detail": str(e)})
+        return
+    except Exception as e:
+        yield _sse("error", {"status_code": 500, "detail": f"Analysis failed: {str(e)}"})
+        return
+    
+    result = "".join(parts)
+    # Owns its session because the streamed response outlives the request scope
+    async with AsyncSessionLocal() as db:
+        await _record_analysis(db, analysis_type, image, result, cache_entry)
+        await db.commit()
+    yield _sse("done", {
+        "analysis_type": analysis_type,
+        "result": result,
+        "cache_hit": cache_entry is not None,
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+
+async def _stream_image_analysis(analysis_type: str, file: UploadFile) -> StreamingResponse:
+    try:
+        image = await image_pipeline.prepare(await _read_upload(file))
+    except ImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return StreamingResponse(
+        _stream_analysis(analysis_type, lambda: STREAMING_ANALYZERS[analysis_type](image.jpeg), image),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+@router.post("/analyze-plant/stream")
+async def stream_plant_analysis(
+    file: UploadFile = File(..., description="Leaf photo (JPEG, PNG, ...)")
+):
+    """Analyze an uploaded leaf photo, streaming the answer as Server-Sent Events."""
+    return await _stream_image_analysis("plant_health", file)
+
+
+@router.post("/analyze-security/stream")
+async def stream_security_analysis(
+    file: UploadFile = File(..., description="Camera frame (JPEG, PNG, ...)")
+):
+    """Analyze an uploaded camera frame, streaming the answer as Server-Sent Events."""
+    return await _stream_image_analysis("security", file)
+
+
+@router.post("/farming-advice/stream")
+async def stream_farming_advice(
+    context: str,
+    question: str
+):
+    """
+    Get farming advice streamed as Server-Sent Events while it is generated.
+    The full answer is logged to the analysis history once complete.
+    """
+    return StreamingResponse(
+        _stream_analysis("farming_advice", lambda: gemini_service.stream_farming_advice(context, question)),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+async def _analysis_job(analysis_type: str, data: Union[bytes, str]) -> str:
+    image = await image_pipeline.prepare(data)
+    # The job outlives its request, so it logs through its own session
+    async with AsyncSessionLocal() as db:
+        result, _ = await _analyze(analysis_type, image, db)
+        await db.commit()
+    return result
+
+
+def _submit_analysis_job(analysis_type: str, data: Union[bytes, str]) -> dict:
+    if analysis_type not in ANALYZERS:
+        raise HTTPException(status_code=400, detail=f"Unknown analysis type: {analysis_type}")
+    try:
+        return ai_executor.submit(analysis_type, _analysis_job(analysis_type, data))
+    except AIExecutorError as e:
+        raise _ai_http_error(e)
+
+
+@router.post("/jobs/analyze", response_model=AIJobResponse, status_code=202)
+async def submit_analysis_job(request: AnalysisRequest):
+    """
+    Queue a plant health or security image analysis and return immediately.
+    Poll GET /jobs/{job_id} for the result.
+    """
+    _check_base64_size(request.image_base64)
+    return _submit_analysis_job(request.analysis_type, request.image_base64)
+
+
+@router.post("/jobs/analyze/upload", response_model=AIJobResponse, status_code=202)
+async def submit_upload_analysis_job(
+    analysis_type: str = Form(..., description="'plant_health' or 'security'"),
+    file: UploadFile = File(...)
+):
+    """Queue an analysis of a multipart-uploaded image; poll GET /jobs/{job_id}."""
+    return _submit_analysis_job(analysis_type, await _read_upload(file))
+
+
+@router.post("/jobs/farming-advice", response_model=AIJobResponse, status_code=202)
+async def submit_farming_advice_job(
+    context: str,
+    question: str
+):
+    """Queue a farming advice question and return immediately; poll GET /jobs/{job_id}."""
+    try:
+        return ai_executor.submit("farming_advice", gemini_service.get_farming_advice(context, question))
+    except AIExecutorError as e:
+        raise _ai_http_error(e)
+
+
+@router.get("/jobs/{job_id}", response_model=AIJobResponse)
+async def get_job(job_id: str):
+    """Get the status of a queued AI job, and its result once done."""
+    job = ai_executor.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+@router.get("/executor/stats")
+async def get_executor_stats():
+    """Get in-flight call count, job counts and timeout/rejection totals of the AI executor."""
+    return ai_executor.stats()
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Get size and hit/miss/eviction counters of the plant analysis cache."""
+    return analysis_cache.stats()
+
+
 @router.get("/analysis-history")
 async def get_analysis_history(
+    response: Response,
     analysis_type: str = None,
-    limit: int = 50,
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: str = Query(None, description="Continue after this X-Next-Cursor value"),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get history of AI analyses."""
-    query = db.query(AnalysisLog)
+    """Get history of AI analyses, with keyset pagination via X-Next-Cursor."""
+    query = select(AnalysisLog)
     
     if analysis_type:
-        query = query.filter(AnalysisLog.analysis_type == analysis_type)
+        query = query.where(AnalysisLog.analysis_type == analysis_type)
     
-    logs = query.order_by(AnalysisLog.timestamp.desc()).limit(limit).all()
+    logs = (await db.scalars(keyset_page(query, AnalysisLog, cursor).limit(limit))).all()
+    set_next_cursor(response, logs, limit)
     
     return [
         {
             "id": log.id,
             "analysis_type": log.analysis_type,
             "result": log.result,
+            "cache_hit": log.cache_hit,
             "timestamp": log.timestamp
         }
         for log in logs
@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from datetime import datetime, timedelta
 from ..database import get_db
 from ..models import Alert
 from ..schemas import AlertCreate, AlertResponse, AlertUpdate
+from ..pagination import keyset_page, set_next_cursor
+from ..services.alert_rules import alert_engine
+from ..services.alert_store import alert_store, alert_counters
+from .websocket import broadcast_alert_changes, broadcast_alert_counters
 
 router = APIRouter()
 
@@ -12,102 +17,155 @@ router = APIRouter()
 @router.post("/", response_model=AlertResponse)
 async def create_alert(
     alert: AlertCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Create a new alert."""
-    db_alert = Alert(**alert.model_dump())
-    db.add(db_alert)
-    db.commit()
-    db.refresh(db_alert)
-    return db_alert
+    """
+    Create a new alert. A repeat of an open alert (same type, zone and
+    severity within the de-duplication window) is folded into it instead.
+    """
+    created, updated = await db.run_sync(alert_store.record, [alert.model_dump() | {"timestamp": datetime.now()}])
+    await db.commit()
+    await broadcast_alert_changes(created, updated)
+    return (created or updated)[0]
 
 
 @router.get("/", response_model=List[AlertResponse])
 async def get_alerts(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     unread_only: bool = Query(False, description="Show only unread alerts"),
     unresolved_only: bool = Query(False, description="Show only unresolved alerts"),
     severity: str = Query(None, description="Filter by severity"),
-    db: Session = Depends(get_db)
+    cursor: str = Query(None, description="Continue after this X-Next-Cursor value (ignores skip)"),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get alerts with optional filtering."""
-    query = db.query(Alert)
+    """
+    Get alerts with optional filtering.
+    Full pages carry an X-Next-Cursor header for keyset pagination.
+    """
+    query = select(Alert)
     
     if unread_only:
-        query = query.filter(Alert.is_read == False)
+        query = query.where(Alert.is_read == False)
     
     if unresolved_only:
-        query = query.filter(Alert.is_resolved == False)
+        query = query.where(Alert.is_resolved == False)
     
     if severity:
-        query = query.filter(Alert.severity == severity)
+        query = query.where(Alert.severity == severity)
     
-    alerts = query.order_by(Alert.timestamp.desc()).offset(skip).limit(limit).all()
+    query = keyset_page(query, Alert, cursor)
+    if not cursor:
+        query = query.offset(skip)
+    alerts = (await db.scalars(query.limit(limit))).all()
+    set_next_cursor(response, alerts, limit)
     return alerts
 
 
 @router.get("/recent", response_model=List[AlertResponse])
 async def get_recent_alerts(
+    response: Response,
     hours: int = Query(24, ge=1, le=168),
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str = Query(None, description="Continue after this X-Next-Cursor value"),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get alerts from the last N hours."""
+    """Get alerts from the last N hours, newest first, a page at a time."""
     cutoff_time = datetime.utcnow() - timedelta(hours=hours)
     
-    alerts = db.query(Alert).filter(
-        Alert.timestamp >= cutoff_time
-    ).order_by(Alert.timestamp.desc()).all()
+    query = select(Alert).where(Alert.timestamp >= cutoff_time)
+    alerts = (await db.scalars(keyset_page(query, Alert, cursor).limit(limit))).all()
     
+    set_next_cursor(response, alerts, limit)
     return alerts
 
 
+@router.get("/rules")
+async def get_alert_rules():
+    """Get the alert rules evaluated on every ingested reading."""
+    return alert_engine.describe()
+
+
+@router.post("/rules/reload")
+async def reload_alert_rules():
+    """Recompile alert rules from their JSON file (the current rules stay if it is invalid)."""
+    alert_engine.load()
+    return {"rules": len(alert_engine.rules)}
+
+
+@router.get("/dedup/stats")
+async def get_dedup_stats():
+    """Get alert de-duplication stats (window, open alerts indexed, rows created vs repeats coalesced)."""
+    return alert_store.stats()
+
+
 @router.get("/unread/count")
-async def get_unread_count(db: Session = Depends(get_db)):
-    """Get count of unread alerts."""
-    count = db.query(Alert).filter(Alert.is_read == False).count()
-    return {"unread_count": count}
+async def get_unread_count():
+    """Get count of unread alerts (from the in-memory counters; no table scan)."""
+    return {"unread_count": alert_counters.unread}
+
+
+@router.get("/counters")
+async def get_alert_counters():
+    """Get unread and unresolved alert counts, in total and by severity and zone."""
+    return alert_counters.snapshot()
 
 
 @router.patch("/{alert_id}", response_model=AlertResponse)
 async def update_alert(
     alert_id: int,
     alert_update: AlertUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update alert status (mark as read/resolved)."""
-    db_alert = db.query(Alert).filter(Alert.id == alert_id).first()
+    db_alert = await db.get(Alert, alert_id)
     
     if not db_alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     
+    was_read, was_resolved = bool(db_alert.is_read), bool(db_alert.is_resolved)
     update_data = alert_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_alert, field, value)
+    counts_changed = alert_counters.stage_transition(db.sync_session, db_alert, was_read, was_resolved)
     
-    db.commit()
-    db.refresh(db_alert)
+    await db.commit()
+    await db.refresh(db_alert)
+    if db_alert.is_read or db_alert.is_resolved:
+        alert_store.close(alert_id)
+    if counts_changed:
+        await broadcast_alert_counters()
     return db_alert
 
 
 @router.post("/mark-all-read")
-async def mark_all_alerts_read(db: Session = Depends(get_db)):
+async def mark_all_alerts_read(db: AsyncSession = Depends(get_db)):
     """Mark all alerts as read."""
-    db.query(Alert).filter(Alert.is_read == False).update({"is_read": True})
-    db.commit()
+    marked = await db.execute(
+        update(Alert).where(Alert.is_read == False).values(is_read=True).returning(Alert.severity, Alert.zone)
+    )
+    for severity, zone in marked:
+        alert_counters.stage(db.sync_session, severity, zone, -1, 0)
+    await db.commit()
+    alert_store.close_all()
+    await broadcast_alert_counters()
     return {"message": "All alerts marked as read"}
 
 
 @router.delete("/{alert_id}")
 async def delete_alert(
     alert_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a specific alert."""
-    alert = db.query(Alert).filter(Alert.id == alert_id).first()
+    alert = await db.get(Alert, alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     
-    db.delete(alert)
-    db.commit()
+    alert_counters.stage(db.sync_session, alert.severity, alert.zone, -int(not alert.is_read), -int(not alert.is_resolved))
+    await db.delete(alert)
+    await db.commit()
+    alert_store.close(alert_id)
+    await broadcast_alert_counters()
     return {"message": "Alert deleted successfully"}
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from ..services.irrigation import irrigation
+
+router = APIRouter()
+
+
+@router.get("/status")
+async def get_irrigation_status():
+    """Get valve state, low-humidity streak and last watering of every module."""
+    return irrigation.status()
+
+
+@router.post("/{sensor_id}/start")
+async def start_watering(
+    sensor_id: int,
+    seconds: Optional[float] = Query(None, gt=0, le=3600, description="Watering time; defaults to IRRIGATION_WATER_S"),
+):
+    """Water one module now (queued if all valve slots are busy)."""
+    if sensor_id not in irrigation.modules:
+        raise HTTPException(status_code=404, detail="No irrigation module for this sensor")
+    if not irrigation.start(sensor_id, seconds):
+        raise HTTPException(status_code=409, detail="Module is already watering, queued or cooling down")
+    return {"message": f"Watering scheduled for module {sensor_id}"}
+
+
+@router.post("/{sensor_id}/stop")
+async def stop_watering(sensor_id: int):
+    """Close a module's valve now, or drop its queued watering."""
+    if not irrigation.stop(sensor_id):
+        raise HTTPException(status_code=404, detail="Module is not watering")
+    return {"message": f"Watering stopped for module {sensor_id}"}
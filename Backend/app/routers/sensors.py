@@ -1,48 +1,96 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, List, Optional
+import asyncio
+import csv
+import io
+import json
 from datetime import datetime, timedelta
-from ..database import get_db
+from ..database import get_db, AsyncSessionLocal
 from ..models import SensorReading
+from ..config import settings
 from ..schemas import SensorReadingCreate, SensorReadingResponse
+from ..pagination import keyset_page, set_next_cursor
+from ..services.ingest_writer import ingest_writer
+from .websocket import sensor_status, sensor_last_seen, broadcast_alert_changes
+from ..services import rollups
+from ..services.latest_cache import latest_cache
+from ..services.alert_rules import alert_engine
+from ..services.alert_store import alert_store
+from ..services.liveness import sensor_liveness
+from ..services.downsample import SERIES_METRICS, load_series, downsample_series
 
 router = APIRouter()
 
+EXPORT_COLUMNS = ("id", "timestamp", "sensor_id", "zone", "moisture", "temperature", "humidity", "ph")
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _local_time(value: Optional[datetime]) -> Optional[datetime]:
+    """Convert a timezone-aware query datetime to the naive local time readings are stored in."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
 
 @router.post("/", response_model=SensorReadingResponse)
 async def create_sensor_reading(
     reading: SensorReadingCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new sensor reading."""
-    db_reading = SensorReading(**reading.model_dump())
+    db_reading = SensorReading(**reading.model_dump(), timestamp=datetime.now())
+    row = reading.model_dump() | {"timestamp": db_reading.timestamp}
     db.add(db_reading)
-    db.commit()
-    db.refresh(db_reading)
-    return db_reading
+    checkpoint = alert_engine.checkpoint([row]) if settings.alert_rules_enabled else None
+    try:
+        await db.run_sync(rollups.apply_rollups, [row])
+        alerts = alert_engine.evaluate([row]) if checkpoint is not None else []
+        created, updated = await db.run_sync(alert_store.record, alerts)
+        await db.commit()
+    except Exception:
+        if checkpoint is not None:
+            alert_engine.restore(checkpoint)  # The reading was not stored
+        raise
+    await db.refresh(db_reading)
+    response = SensorReadingResponse.model_validate(db_reading)
+    latest_cache.update([response.model_dump()])
+    await broadcast_alert_changes(created, updated)
+    return response
 
 
 @router.get("/", response_model=List[SensorReadingResponse])
 async def get_sensor_readings(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     hours: int = Query(24, ge=1, le=168, description="Get readings from last N hours"),
     zone: str = Query(None, description="Filter by zone"),
-    db: Session = Depends(get_db)
+    cursor: str = Query(None, description="Continue after this X-Next-Cursor value (ignores skip)"),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get sensor readings with optional filtering."""
-    query = db.query(SensorReading)
+    """
+    Get sensor readings with optional filtering.
+    Full pages carry an X-Next-Cursor header for keyset pagination.
+    """
+    query = select(SensorReading)
     
     # Filter by time
     cutoff_time = datetime.utcnow() - timedelta(hours=hours)
-    query = query.filter(SensorReading.timestamp >= cutoff_time)
+    query = query.where(SensorReading.timestamp >= cutoff_time)
     
     # Filter by zone if provided
     if zone:
-        query = query.filter(SensorReading.zone == zone)
+        query = query.where(SensorReading.zone == zone)
     
     # Order by timestamp descending and apply pagination
-    readings = query.order_by(SensorReading.timestamp.desc()).offset(skip).limit(limit).all()
+    query = keyset_page(query, SensorReading, cursor)
+    if not cursor:
+        query = query.offset(skip)
+    readings = (await db.scalars(query.limit(limit))).all()
+    set_next_cursor(response, readings, limit)
     return readings
 
 
@@ -50,29 +98,26 @@ async def get_sensor_readings(
 async def get_all_sensor_readings(
     limit: int = Query(1000, ge=1, le=5000),
     zone: str = Query(None, description="Filter by zone"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all sensor readings regardless of time (up to limit)."""
-    query = db.query(SensorReading)
+    query = select(SensorReading)
     
     # Filter by zone if provided
     if zone:
-        query = query.filter(SensorReading.zone == zone)
+        query = query.where(SensorReading.zone == zone)
     
     # Order by timestamp descending and apply limit
-    readings = query.order_by(SensorReading.timestamp.desc()).limit(limit).all()
+    readings = (await db.scalars(query.order_by(SensorReading.timestamp.desc()).limit(limit))).all()
     return readings
 
 
 @router.get("/latest", response_model=SensorReadingResponse)
 async def get_latest_reading(
-    zone: str = Query("main", description="Zone to get latest reading from"),
-    db: Session = Depends(get_db)
+    zone: str = Query("main", description="Zone to get latest reading from")
 ):
-    """Get the most recent sensor reading."""
-    reading = db.query(SensorReading).filter(
-        SensorReading.zone == zone
-    ).order_by(SensorReading.timestamp.desc()).first()
+    """Get the most recent sensor reading (served from the in-memory latest cache)."""
+    reading = latest_cache.for_zone(zone)
     
     if not reading:
         raise HTTPException(status_code=404, detail="No readings found")
@@ -80,68 +125,237 @@ async def get_latest_reading(
     return reading
 
 
+@router.get("/latest/all", response_model=List[SensorReadingResponse])
+async def get_latest_readings_all_sensors(
+    zone: str = Query(None, description="Filter by zone")
+):
+    """Get the most recent reading of every sensor (served from the in-memory latest cache)."""
+    return latest_cache.all_sensors(zone)
+
+
+@router.get("/status")
+async def get_sensor_status(
+    zone: str = Query(None, description="Filter by zone")
+):
+    """Get online status, last-seen time and latest reading for every known sensor."""
+    return [
+        {
+            "sensor_id": reading["sensor_id"],
+            "zone": reading["zone"],
+            "online": sensor_status.get(reading["sensor_id"]),
+            "last_seen": sensor_last_seen.get(reading["sensor_id"]),
+            "latest": SensorReadingResponse.model_validate(reading)
+        }
+        for reading in latest_cache.all_sensors(zone)
+    ]
+
+
 @router.get("/stats")
 async def get_sensor_stats(
     hours: int = Query(24, ge=1, le=168),
     zone: str = Query("main"),
-    db: Session = Depends(get_db)
+    sensor_id: int = Query(None, description="Limit to one hardware sensor"),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get statistical summary of sensor data."""
-    from sqlalchemy import func
+    """Get statistical summary of sensor data (served from the minute/hour rollups)."""
+    cutoff_time = datetime.now() - timedelta(hours=hours)  # Rollup buckets are local time
     
-    cutoff_time = datetime.utcnow() - timedelta(hours=hours)
+    stats = await db.run_sync(rollups.summarize, zone, cutoff_time, sensor_id=sensor_id)
     
-    stats = db.query(
-        func.avg(SensorReading.moisture).label('avg_moisture'),
-        func.min(SensorReading.moisture).label('min_moisture'),
-        func.max(SensorReading.moisture).label('max_moisture'),
-        func.avg(SensorReading.temperature).label('avg_temperature'),
-        func.min(SensorReading.temperature).label('min_temperature'),
-        func.max(SensorReading.temperature).label('max_temperature'),
-        func.avg(SensorReading.humidity).label('avg_humidity'),
-        func.avg(SensorReading.ph).label('avg_ph'),
-        func.count(SensorReading.id).label('reading_count')
-    ).filter(
-        SensorReading.timestamp >= cutoff_time,
-        SensorReading.zone == zone
-    ).first()
-    
-    if not stats or stats.reading_count == 0:
+    if not stats:
         raise HTTPException(status_code=404, detail="No readings found for the specified period")
     
     return {
         "zone": zone,
         "period_hours": hours,
         "moisture": {
-            "avg": round(stats.avg_moisture, 2),
-            "min": round(stats.min_moisture, 2),
-            "max": round(stats.max_moisture, 2)
+            "avg": round(stats["moisture"]["avg"], 2),
+            "min": round(stats["moisture"]["min"], 2),
+            "max": round(stats["moisture"]["max"], 2)
         },
         "temperature": {
-            "avg": round(stats.avg_temperature, 2),
-            "min": round(stats.min_temperature, 2),
-            "max": round(stats.max_temperature, 2)
+            "avg": round(stats["temperature"]["avg"], 2),
+            "min": round(stats["temperature"]["min"], 2),
+            "max": round(stats["temperature"]["max"], 2)
         },
         "humidity": {
-            "avg": round(stats.avg_humidity, 2)
+            "avg": round(stats["humidity"]["avg"], 2)
         },
         "ph": {
-            "avg": round(stats.avg_ph, 2)
+            "avg": round(stats["ph"]["avg"], 2)
         },
-        "reading_count": stats.reading_count
+        "reading_count": stats["reading_count"]
     }
 
 
+@router.get("/history")
+async def get_sensor_history(
+    hours: int = Query(168, ge=1, le=24 * 366),
+    zone: str = Query("main"),
+    resolution: str = Query("hour", pattern="^(minute|hour)$"),
+    sensor_id: int = Query(None, description="Limit to one hardware sensor"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get per-minute or per-hour avg/min/max buckets over long windows from the rollups."""
+    if resolution == "minute" and hours > 48:
+        raise HTTPException(status_code=400, detail="Minute resolution is limited to 48 hours")
+    
+    cutoff_time = datetime.now() - timedelta(hours=hours)  # Rollup buckets are local time
+    points = await db.run_sync(rollups.history, zone, cutoff_time, resolution=resolution, sensor_id=sensor_id)
+    return {
+        "zone": zone,
+        "resolution": resolution,
+        "period_hours": hours,
+        "points": points
+    }
+
+
+@router.get("/series")
+async def get_sensor_series(
+    start: datetime = Query(None, description="Range start (defaults to `hours` before end)"),
+    end: datetime = Query(None, description="Range end (defaults to now)"),
+    hours: int = Query(24, ge=1, le=24 * 366),
+    zone: str = Query(None, description="Filter by zone"),
+    sensor_id: int = Query(None, description="Filter by hardware sensor"),
+    metrics: str = Query("moisture", description="Comma separated: moisture,temperature,humidity,ph"),
+    points: int = Query(500, ge=3, le=5000, description="Target number of points per metric"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get a chart-ready time series downsampled server-side with
+    Largest-Triangle-Three-Buckets, which preserves peaks and dips.
+    """
+    metric_list = [m.strip() for m in metrics.split(",") if m.strip()]
+    unknown = [m for m in metric_list if m not in SERIES_METRICS]
+    if not metric_list or unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown metrics: {', '.join(unknown) or metrics}")
+    
+    end = _local_time(end) or datetime.now()  # Readings are stored in local time
+    start = _local_time(start) or end - timedelta(hours=hours)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    timestamps, values = await db.run_sync(load_series, start, end, metric_list, zone=zone, sensor_id=sensor_id)
+    # LTTB is pure CPU work; keep it off the event loop
+    series = await asyncio.to_thread(downsample_series, timestamps, values, metric_list, points)
+    
+    return {
+        "zone": zone,
+        "sensor_id": sensor_id,
+        "start": start,
+        "end": end,
+        "raw_count": len(timestamps),
+        "series": series
+    }
+
+
+@router.get("/export")
+async def export_sensor_readings(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start: datetime = Query(None, description="Range start (inclusive)"),
+    end: datetime = Query(None, description="Range end (inclusive)"),
+    zone: str = Query(None, description="Filter by zone"),
+    sensor_id: int = Query(None, description="Filter by hardware sensor")
+):
+    """
+    Stream sensor history as NDJSON or CSV, oldest first.
+    Rows are read from the DB in chunks and written as they arrive,
+    so memory stays flat however large the range.
+    """
+    start, end = _local_time(start), _local_time(end)
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    filename = f"sensor-readings-{zone or 'all'}.{format}"
+    return StreamingResponse(
+        _export_rows(format, start, end, zone, sensor_id),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+async def _export_rows(
+    format: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    zone: Optional[str],
+    sensor_id: Optional[int]
+) -> AsyncIterator[str]:
+    # Owns its session because the response outlives the request scope
+    async with AsyncSessionLocal() as db:
+        query = select(*(getattr(SensorReading, c) for c in EXPORT_COLUMNS))
+        if start:
+            query = query.where(SensorReading.timestamp >= start)
+        if end:
+            query = query.where(SensorReading.timestamp <= end)
+        if zone:
+            query = query.where(SensorReading.zone == zone)
+        if sensor_id is not None:
+            query = query.where(SensorReading.sensor_id == sensor_id)
+        query = query.order_by(SensorReading.timestamp, SensorReading.id)
+        
+        result = await db.stream(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            async for partition in result.partitions():
+                for row in partition:
+                    writer.writerow((row.id, row.timestamp.isoformat(), *row[2:]))
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            async for partition in result.partitions():
+                yield "".join(
+                    json.dumps({**row._asdict(), "timestamp": row.timestamp.isoformat()}) + "\n"
+                    for row in partition
+                )
+
+
+@router.get("/ingest/stats")
+async def get_ingest_stats():
+    """Get queue depth and flush statistics of the MQTT ingest writer."""
+    return ingest_writer.stats()
+
+
+@router.get("/liveness/stats")
+async def get_liveness_stats():
+    """Get online counts, timeouts and the next offline deadline of the liveness tracker."""
+    return sensor_liveness.stats()
+
+
+@router.put("/{sensor_id}/timeout")
+async def set_sensor_timeout(
+    sensor_id: int,
+    seconds: Optional[float] = Query(None, gt=0, description="Offline timeout; omit to restore the default"),
+):
+    """Override how long a sensor may stay silent before it is marked offline (until restart)."""
+    sensor_liveness.set_timeout(sensor_id, seconds)
+    return {"sensor_id": sensor_id, "timeout_s": sensor_liveness.timeout_for(sensor_id)}
+
+
 @router.delete("/{reading_id}")
 async def delete_sensor_reading(
     reading_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a specific sensor reading."""
-    reading = db.query(SensorReading).filter(SensorReading.id == reading_id).first()
+    reading = await db.get(SensorReading, reading_id)
     if not reading:
         raise HTTPException(status_code=404, detail="Reading not found")
     
-    db.delete(reading)
-    db.commit()
+    await db.run_sync(rollups.remove_from_rollups, reading)
+    await db.delete(reading)
+    await db.commit()
+    
+    cached_ids = {
+        (latest_cache.for_sensor(reading.sensor_id) or {}).get("id"),
+        (latest_cache.for_zone(reading.zone) or {}).get("id"),
+    }
+    if reading_id in cached_ids:
+        await db.run_sync(latest_cache.refresh, reading.sensor_id, reading.zone)
     return {"message": "Reading deleted successfully"}
@@ -1,44 +1,364 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import List, Dict
+from typing import Any, List, Dict, Optional, Set
 import json
 import asyncio
-from datetime import datetime, timedelta
+import logging
+from datetime import datetime
+from ..config import settings
+from ..schemas import AlertResponse
+from ..services.alert_store import alert_counters
+from ..services.liveness import sensor_liveness
+
+try:
+    import orjson
+
+    def _dumps(message: dict) -> str:
+        return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode()
+except ImportError:  # orjson is optional
+    def _dumps(message: dict) -> str:
+        return json.dumps(message, separators=(",", ":"))
+
+try:
+    import msgpack
+except ImportError:  # binary frames are only offered when msgpack is installed
+    msgpack = None
+
+FRAME_FORMATS = ("json", "msgpack") if msgpack else ("json",)
+
+# Compact field names used in delta-encoded reading frames
+DELTA_FIELDS = {
+    "zone": "z",
+    "moisture": "m",
+    "temperature": "t",
+    "humidity": "h",
+    "ph": "p",
+}
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Track sensor connection status (owned by the liveness tracker)
+# Key: sensor_id, Value: last_seen timestamp (UTC)
+sensor_last_seen: Dict[int, datetime] = sensor_liveness.last_seen
+sensor_status: Dict[int, bool] = sensor_liveness.online  # True = online, False = offline
+sensor_zone: Dict[int, str] = {}  # Last zone each sensor reported, for routing status messages
+
+
+class OutboundMessage:
+    """
+    A broadcast message, serialized at most once per wire format
+    no matter how many clients receive it.
+    """
+
+    __slots__ = ("message", "conflate_key", "_text", "_packed", "_compact")
+
+    def __init__(self, message: dict, conflate_key: Optional[int] = None):
+        self.message = message
+        # Messages sharing a key supersede each other for rate-limited clients
+        self.conflate_key = conflate_key
+        self._text: Optional[str] = None
+        self._packed: Optional[bytes] = None
+        self._compact: Optional[dict] = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = _dumps(self.message)
+        return self._text
+
+    @property
+    def packed(self) -> bytes:
+        if self._packed is None:
+            self._packed = msgpack.packb(self.message)
+        return self._packed
+
+    @property
+    def compact(self) -> Optional[dict]:
+        """
+        Short-key form of a sensor_reading used for delta frames:
+        s=sensorId, i=id, ts=epoch ms, plus the DELTA_FIELDS values.
+        None for any other message type.
+        """
+        if self._compact is None and self.message.get("type") == "sensor_reading":
+            data = self.message["data"]
+            compact = {"s": data.get("sensorId", 1)}
+            if "id" in data:
+                compact["i"] = data["id"]
+            if "timestamp" in data:
+                compact["ts"] = int(datetime.fromisoformat(data["timestamp"]).timestamp() * 1000)
+            for field, key in DELTA_FIELDS.items():
+                if field in data:
+                    compact[key] = data[field]
+            self._compact = compact
+        return self._compact
+
+
+class ClientConnection:
+    """
+    A connected dashboard with its own bounded send queue and writer task,
+    so a slow socket only ever delays itself.
+
+    With a max update rate set, conflatable messages (live readings) skip the
+    queue: the latest one per sensor is kept and everything pending is flushed
+    at most ``max_rate`` times per second.
+    """
+
+    def __init__(self, websocket: WebSocket, queue_size: int, max_rate: Optional[float] = None):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.conflated: Dict[int, OutboundMessage] = {}
+        self.max_rate: Optional[float] = None
+        self.dropped = 0
+        self.conflated_away = 0
+        self.task: Optional[asyncio.Task] = None
+        self.frame_format = "json"
+        self.delta = False
+        # Last values sent per sensor, the base for delta frames
+        self._last_sent: Dict[int, dict] = {}
+        self._wake = asyncio.Event()
+        self._next_flush = 0.0
+        self.set_max_rate(max_rate)
+
+    def set_encoding(self, frame_format: str, delta: bool):
+        """Choose the wire format; switching resets the delta base."""
+        self.frame_format = frame_format
+        self.delta = delta
+        self._last_sent.clear()
+
+    def set_max_rate(self, max_rate: Optional[float]):
+        """Switch between immediate delivery (None/0) and conflated delivery."""
+        self.max_rate = max_rate if max_rate and max_rate > 0 else None
+        if self.max_rate is None and self.conflated:
+            # Hand anything still pending back to the ordered queue
+            pending, self.conflated = self.conflated, {}
+            for outbound in pending.values():
+                self.enqueue(outbound)
+        self._wake.set()
+
+    def enqueue(self, outbound: OutboundMessage) -> bool:
+        """
+        Queue a message without waiting.
+        Returns False if the client is too far behind and should be disconnected.
+        """
+        if self.max_rate is not None and outbound.conflate_key is not None:
+            if outbound.conflate_key in self.conflated:
+                self.conflated_away += 1
+            self.conflated[outbound.conflate_key] = outbound
+            self._wake.set()
+            return True
+        try:
+            self.queue.put_nowait(outbound)
+        except asyncio.QueueFull:
+            if settings.ws_slow_client_policy == "disconnect":
+                return False
+            # drop_oldest: live data is only useful when fresh
+            self.queue.get_nowait()
+            self.queue.put_nowait(outbound)
+            self.dropped += 1
+        self._wake.set()
+        return True
 
-# Track sensor connection status
-# Key: sensor_id, Value: last_seen timestamp
-sensor_last_seen: Dict[int, datetime] = {}
-sensor_status: Dict[int, bool] = {}  # True = online, False = offline
+    async def run_writer(self, on_error) -> None:
+        try:
+            while True:
+                for outbound in await self._next_batch():
+                    await asyncio.wait_for(self._send(outbound), timeout=settings.ws_send_timeout_s)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            # wait_for cancelled the send mid-frame, so the stream is unusable either way
+            logger.warning("Send timed out after %ss, closing client", settings.ws_send_timeout_s)
+            on_error(self.websocket)
+            await _close_quietly(self.websocket, code=1013)  # try again later
+        except Exception as e:
+            logger.warning("Send failed, closing client: %s", e)
+            on_error(self.websocket)
+            await _close_quietly(self.websocket, code=1011)  # internal error
 
-SENSOR_TIMEOUT_SECONDS = 30  # Mark sensor offline if no data for 30 seconds
+    async def _send(self, outbound: OutboundMessage):
+        if self.delta and outbound.compact is not None:
+            # Delta frames differ per client, so they are encoded here rather than shared
+            frame = {"type": "reading_delta", "d": self._delta(outbound.compact)}
+            if self.frame_format == "msgpack":
+                await self.websocket.send_bytes(msgpack.packb(frame))
+            else:
+                await self.websocket.send_text(_dumps(frame))
+        elif self.frame_format == "msgpack":
+            await self.websocket.send_bytes(outbound.packed)
+        else:
+            await self.websocket.send_text(outbound.text)
+
+    def _delta(self, compact: dict) -> dict:
+        """Keep identity fields and drop values unchanged since the last frame for this sensor."""
+        previous = self._last_sent.get(compact["s"])
+        self._last_sent[compact["s"]] = compact
+        if previous is None:
+            return compact
+        return {
+            key: value for key, value in compact.items()
+            if key in ("s", "i", "ts") or previous.get(key) != value
+        }
+
+    async def _next_batch(self) -> List[OutboundMessage]:
+        """Wait for the next queued message, or for the next conflation flush to fall due."""
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wake.clear()
+            if not self.queue.empty():
+                return [self.queue.get_nowait()]
+
+            timeout = None
+            if self.conflated:
+                now = loop.time()
+                if now >= self._next_flush:
+                    self._next_flush = now + 1 / self.max_rate
+                    batch, self.conflated = list(self.conflated.values()), {}
+                    return batch
+                timeout = self._next_flush - now
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+class SubscriptionIndex:
+    """
+    Maps each filter value (message type, zone, sensor ID) to the clients
+    interested in it, so a broadcast only visits matching connections.
+    Clients without a filter on a dimension sit in that dimension's wildcard set.
+    """
+
+    DIMENSIONS = ("type", "zone", "sensor")
+
+    def __init__(self):
+        self._by_value: Dict[str, Dict[object, Set[WebSocket]]] = {d: {} for d in self.DIMENSIONS}
+        self._wildcard: Dict[str, Set[WebSocket]] = {d: set() for d in self.DIMENSIONS}
+        self._filters: Dict[WebSocket, Dict[str, Optional[frozenset]]] = {}
+
+    def set(self, websocket: WebSocket, filters: Dict[str, Optional[frozenset]]):
+        """Replace a client's filters. A None (or missing) dimension matches everything."""
+        self.remove(websocket)
+        filters = {d: filters.get(d) or None for d in self.DIMENSIONS}
+        self._filters[websocket] = filters
+        for dim, values in filters.items():
+            if values is None:
+                self._wildcard[dim].add(websocket)
+            else:
+                for value in values:
+                    self._by_value[dim].setdefault(value, set()).add(websocket)
+
+    def remove(self, websocket: WebSocket):
+        filters = self._filters.pop(websocket, None)
+        if filters is None:
+            return
+        for dim, values in filters.items():
+            if values is None:
+                self._wildcard[dim].discard(websocket)
+                continue
+            index = self._by_value[dim]
+            for value in values:
+                subscribers = index.get(value)
+                if subscribers is not None:
+                    subscribers.discard(websocket)
+                    if not subscribers:
+                        del index[value]
+
+    def filters(self, websocket: WebSocket) -> Dict[str, Optional[frozenset]]:
+        return self._filters.get(websocket, {})
+
+    def match(self, **keys) -> Set[WebSocket]:
+        """
+        Clients whose filters accept a message with the given keys.
+        Dimensions passed as None are not filtered on (e.g. status messages have no zone).
+        """
+        candidates = [
+            self._by_value[dim].get(value, set()) | self._wildcard[dim]
+            for dim, value in keys.items()
+            if value is not None
+        ]
+        if not candidates:
+            return set(self._filters)
+        candidates.sort(key=len)
+        matched = set(candidates[0])
+        for other in candidates[1:]:
+            matched &= other
+            if not matched:
+                break
+        return matched
 
 
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.subscriptions = SubscriptionIndex()
+    
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
     
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = ClientConnection(websocket, settings.ws_send_queue_size, settings.ws_default_max_rate)
+        client.task = asyncio.create_task(client.run_writer(self.disconnect))
+        self.clients[websocket] = client
+        self.subscriptions.set(websocket, {})
     
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        self.subscriptions.remove(websocket)
+        client = self.clients.pop(websocket, None)
+        if client and client.task and client.task is not asyncio.current_task():
+            client.task.cancel()
     
-    async def broadcast(self, message: dict):
-        """Broadcast message to all connected clients."""
-        dead_connections = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                dead_connections.append(connection)
+    def send(self, websocket: WebSocket, message: dict):
+        """Queue a message for a single client, preserving order with broadcasts."""
+        client = self.clients.get(websocket)
+        if client and not client.enqueue(OutboundMessage(message)):
+            self._drop_slow_client(websocket)
+    
+    def subscribe(self, websocket: WebSocket, filters: Dict[str, Optional[frozenset]]):
+        """Restrict which broadcasts a client receives."""
+        if websocket in self.clients:
+            self.subscriptions.set(websocket, filters)
+    
+    def set_encoding(self, websocket: WebSocket, frame_format: str, delta: bool):
+        """Set a client's wire format ('json' or 'msgpack') and delta encoding."""
+        client = self.clients.get(websocket)
+        if client:
+            client.set_encoding(frame_format, delta)
+    
+    def set_max_rate(self, websocket: WebSocket, max_rate: Optional[float]):
+        """Set a client's max live-reading update rate (None for immediate delivery)."""
+        client = self.clients.get(websocket)
+        if client:
+            client.set_max_rate(max_rate)
+    
+    async def broadcast(self, message: dict, zone: Optional[str] = None, sensor_id: Optional[int] = None):
+        """Broadcast message to every client subscribed to its type, zone and sensor."""
+        conflate_key = sensor_id if message.get("type") == "sensor_reading" else None
+        outbound = OutboundMessage(message, conflate_key)
+        recipients = self.subscriptions.match(type=message.get("type"), zone=zone, sensor=sensor_id)
+        slow_clients = [
+            websocket for websocket in recipients
+            if not self.clients[websocket].enqueue(outbound)
+        ]
         
-        # Clean up dead connections
-        for conn in dead_connections:
-            if conn in self.active_connections:
-                self.active_connections.remove(conn)
+        for websocket in slow_clients:
+            self._drop_slow_client(websocket)
+    
+    def _drop_slow_client(self, websocket: WebSocket):
+        logger.warning("Client fell behind, disconnecting")
+        self.disconnect(websocket)
+        # 1013 = try again later; the client's receive loop sees the disconnect
+        asyncio.create_task(_close_quietly(websocket, code=1013))
+
+
+async def _close_quietly(websocket: WebSocket, code: int):
+    try:
+        # Bounded: the peer that stalled a send may never complete the close handshake either
+        await asyncio.wait_for(websocket.close(code=code), timeout=settings.ws_send_timeout_s)
+    except Exception:
+        pass
 
 
 manager = ConnectionManager()
@@ -54,7 +374,7 @@ async def websocket_sensor_data(websocket: WebSocket):
     
     # Send current sensor status to newly connected client
     try:
-        await websocket.send_json({
+        manager.send(websocket, {
             "type": "sensor_status_init",
             "data": {
                 sensor_id: {
@@ -65,7 +385,7 @@ async def websocket_sensor_data(websocket: WebSocket):
             },
             "timestamp": datetime.utcnow().isoformat()
         })
-    except:
+    except Exception:
         pass
     
     try:
@@ -73,8 +393,13 @@ async def websocket_sensor_data(websocket: WebSocket):
             # Keep connection alive and wait for messages
             data = await websocket.receive_text()
             
+            request = _parse_client_message(data)
+            if request.get("action") in ("subscribe", "unsubscribe"):
+                handle_subscription(websocket, request)
+                continue
+            
             # Echo back or handle client messages if needed
-            await websocket.send_json({
+            manager.send(websocket, {
                 "type": "acknowledgment",
                 "message": "Connected to sensor data stream",
                 "timestamp": datetime.utcnow().isoformat()
@@ -88,42 +413,99 @@ async def websocket_sensor_data(websocket: WebSocket):
         manager.disconnect(websocket)
 
 
-def update_sensor_status(sensor_id: int) -> bool:
+def _parse_client_message(data: str) -> Dict[str, Any]:
+    try:
+        request = json.loads(data)
+    except ValueError:
+        return {}
+    return request if isinstance(request, dict) else {}
+
+
+def handle_subscription(websocket: WebSocket, request: Dict[str, Any]):
     """
-    Update the last seen timestamp for a sensor and mark it online.
-    Returns True if sensor status changed from offline to online.
+    Apply a client subscription request:
+        {"action": "subscribe", "zones": [...], "sensorIds": [...], "types": [...],
+         "maxRate": 2, "format": "msgpack", "delta": true}
+    Omitted or empty lists match everything; "unsubscribe" clears all filters.
+    maxRate (updates per second) switches live readings to latest-value-wins
+    delivery; omit it or send 0 for immediate delivery.
+    format selects JSON text or MessagePack binary frames; delta sends readings
+    as "reading_delta" frames carrying only the fields that changed per sensor.
     """
-    global sensor_last_seen, sensor_status
-    
-    was_offline = sensor_status.get(sensor_id, None) == False
-    sensor_last_seen[sensor_id] = datetime.utcnow()
-    sensor_status[sensor_id] = True
+    try:
+        if request["action"] == "unsubscribe":
+            filters = {}
+            max_rate = None
+            frame_format, delta = "json", False
+        else:
+            frame_format = request.get("format", "json")
+            if frame_format not in FRAME_FORMATS:
+                raise ValueError(f"format must be one of {', '.join(FRAME_FORMATS)}")
+            delta = bool(request.get("delta", False))
+            filters = {
+                "zone": _filter_values(request.get("zones"), str),
+                "sensor": _filter_values(request.get("sensorIds"), int),
+                "type": _filter_values(request.get("types"), str),
+            }
+            max_rate = request.get("maxRate")
+            if max_rate is not None:
+                max_rate = min(float(max_rate), settings.ws_max_rate_limit)
+                if max_rate < 0:
+                    raise ValueError("maxRate must not be negative")
+    except (TypeError, ValueError) as e:
+        manager.send(websocket, {
+            "type": "error",
+            "message": f"Invalid subscription: {e}",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        return
     
-    return was_offline or sensor_id not in sensor_status
+    manager.subscribe(websocket, filters)
+    manager.set_max_rate(websocket, max_rate)
+    # Frames are self-describing: msgpack goes out as binary frames, JSON as text
+    manager.set_encoding(websocket, frame_format, delta)
+    manager.send(websocket, {
+        "type": "subscribed",
+        "data": {
+            "zones": sorted(filters.get("zone") or []),
+            "sensorIds": sorted(filters.get("sensor") or []),
+            "types": sorted(filters.get("type") or []),
+            "maxRate": max_rate or None,
+            "format": frame_format,
+            "delta": delta,
+        },
+        "timestamp": datetime.utcnow().isoformat()
+    })
 
 
-async def check_sensor_timeouts():
+def _filter_values(values: Any, cast) -> Optional[frozenset]:
+    if values is None:
+        return None
+    if not isinstance(values, list):
+        raise TypeError("filters must be lists")
+    return frozenset(cast(v) for v in values) or None
+
+
+def update_sensor_status(sensor_id: int) -> bool:
     """
-    Check all sensors and mark any that haven't sent data recently as offline.
-    Should be called periodically.
+    Update the last seen timestamp for a sensor and mark it online.
+    Returns True if sensor status changed from offline (or unknown) to online.
     """
-    global sensor_status
-    
-    now = datetime.utcnow()
-    timeout_threshold = timedelta(seconds=SENSOR_TIMEOUT_SECONDS)
-    
-    sensors_went_offline = []
-    
-    for sensor_id, last_seen in sensor_last_seen.items():
-        if now - last_seen > timeout_threshold:
-            if sensor_status.get(sensor_id, True):  # Was online
-                sensor_status[sensor_id] = False
-                sensors_went_offline.append(sensor_id)
-                print(f"[SENSOR] Sensor {sensor_id} marked OFFLINE (no data for {SENSOR_TIMEOUT_SECONDS}s)")
-    
-    # Broadcast status change for any sensors that went offline
-    for sensor_id in sensors_went_offline:
-        await broadcast_sensor_status(sensor_id, False)
+    return sensor_liveness.seen(sensor_id)
+
+
+def restore_sensor_status(readings: List[dict]):
+    """Seed last-seen, online status and zone routing from each sensor's newest stored reading."""
+    for reading in readings:
+        sensor_zone[reading["sensor_id"]] = reading["zone"]
+    sensor_liveness.restore(readings)
+
+
+async def sensor_went_offline(sensor_id: int):
+    """Called by the liveness tracker at the moment a sensor's deadline passes."""
+    timeout = sensor_liveness.timeout_for(sensor_id)
+    print(f"[SENSOR] Sensor {sensor_id} marked OFFLINE (no data for {timeout:g}s)")
+    await broadcast_sensor_status(sensor_id, False)
 
 
 async def broadcast_sensor_status(sensor_id: int, online: bool):
@@ -137,7 +519,7 @@ async def broadcast_sensor_status(sensor_id: int, online: bool):
         },
         "timestamp": datetime.utcnow().isoformat()
     }
-    await manager.broadcast(message)
+    await manager.broadcast(message, zone=sensor_zone.get(sensor_id), sensor_id=sensor_id)
 
 
 async def broadcast_sensor_reading(reading_data: dict):
@@ -146,6 +528,9 @@ async def broadcast_sensor_reading(reading_data: dict):
     Call this from your sensor data creation endpoint.
     """
     sensor_id = reading_data.get("sensorId", 1)
+    zone = reading_data.get("zone")
+    if zone is not None:
+        sensor_zone[sensor_id] = zone
     
     # Update sensor status and check if it came back online
     came_online = update_sensor_status(sensor_id)
@@ -160,7 +545,7 @@ async def broadcast_sensor_reading(reading_data: dict):
         "data": reading_data,
         "timestamp": datetime.utcnow().isoformat()
     }
-    await manager.broadcast(message)
+    await manager.broadcast(message, zone=zone, sensor_id=sensor_id)
 
 
 async def broadcast_alert(alert_data: dict):
@@ -173,4 +558,37 @@ async def broadcast_alert(alert_data: dict):
         "data": alert_data,
         "timestamp": datetime.utcnow().isoformat()
     }
+    await manager.broadcast(message, zone=alert_data.get("zone"), sensor_id=alert_data.get("sensor_id"))
+
+
+async def broadcast_alert_update(alert_data: dict):
+    """
+    Broadcast a repeat folded into an existing alert (its occurrences,
+    last_seen and message changed), so clients update it in place.
+    """
+    message = {
+        "type": "alert_update",
+        "data": alert_data,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    await manager.broadcast(message, zone=alert_data.get("zone"), sensor_id=alert_data.get("sensor_id"))
+
+
+async def broadcast_alert_changes(created: List[dict], updated: List[dict]):
+    """Broadcast the (created, updated) alert rows returned by alert_store.record()."""
+    for alert in created:
+        await broadcast_alert(AlertResponse.model_validate(alert).model_dump(mode="json"))
+    for alert in updated:
+        await broadcast_alert_update(AlertResponse.model_validate(alert).model_dump(mode="json"))
+    if created:
+        await broadcast_alert_counters()
+
+
+async def broadcast_alert_counters():
+    """Push the current unread/unresolved alert counters (badge counts) to all clients."""
+    message = {
+        "type": "alert_counters",
+        "data": alert_counters.snapshot(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
     await manager.broadcast(message)
@@ -6,5 +6,6 @@ from .schemas import (
     AlertResponse,
     AlertUpdate,
     AnalysisRequest,
-    AnalysisResponse
+    AnalysisResponse,
+    AIJobResponse
 )
@@ -31,6 +31,7 @@ class AlertCreate(BaseModel):
     severity: str
     message: str
     zone: Optional[str] = None
+    sensor_id: Optional[int] = None
 
 
 class AlertResponse(BaseModel):
@@ -42,6 +43,10 @@ class AlertResponse(BaseModel):
     is_read: bool
     is_resolved: bool
     zone: Optional[str]
+    sensor_id: Optional[int] = None
+    occurrences: int = 1
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -61,3 +66,14 @@ class AnalysisResponse(BaseModel):
     analysis_type: str
     result: str
     timestamp: datetime
+    cache_hit: bool = False
+
+
+class AIJobResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str  # 'queued', 'running', 'done' or 'failed'
+    result: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
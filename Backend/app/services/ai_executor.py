@@ -0,0 +1,232 @@
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Coroutine, Iterator, Optional
+from ..config import settings
+
+
+_END = object()
+
+
+class AIExecutorError(Exception):
+    """Base class for AI execution failures that map to an HTTP status."""
+    status_code = 500
+
+
+class AIBusyError(AIExecutorError):
+    """All model slots stayed busy for longer than the queue wait allows."""
+    status_code = 503
+
+
+class AITimeoutError(AIExecutorError):
+    """A model call did not finish within its time budget."""
+    status_code = 504
+
+
+class AIExecutor:
+    """
+    Runs blocking model calls on a dedicated thread pool, off the event loop.
+
+    A semaphore caps in-flight calls; callers wait at most queue_timeout_s
+    for a slot (AIBusyError) and call_timeout_s for the result
+    (AITimeoutError). A timed-out call keeps its slot until the worker
+    thread actually returns, so the cap holds even for abandoned calls.
+
+    Also keeps a small in-memory job table for the submit/poll API: a job
+    is a coroutine run as a task, with status queued -> running -> done|failed.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = settings.ai_max_concurrency,
+        call_timeout_s: float = settings.ai_call_timeout_s,
+        queue_timeout_s: float = settings.ai_queue_timeout_s,
+        max_pending_jobs: int = settings.ai_max_pending_jobs,
+        job_ttl_s: float = settings.ai_job_ttl_s,
+    ) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.call_timeout_s = call_timeout_s
+        self.queue_timeout_s = queue_timeout_s
+        self.max_pending_jobs = max_pending_jobs
+        self.job_ttl_s = job_ttl_s
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="ai")
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight = 0
+        self._jobs: dict[str, dict[str, Any]] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._stats = {"calls": 0, "timeouts": 0, "rejected": 0, "errors": 0}
+
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Run a blocking callable in the AI pool and await its result.
+
+        Raises:
+            AIBusyError: No slot became free within the queue timeout
+            AITimeoutError: The call exceeded its timeout
+        """
+        timeout = timeout or self.call_timeout_s
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            self._stats["rejected"] += 1
+            raise AIBusyError("AI service is busy, try again shortly") from None
+
+        loop = asyncio.get_running_loop()
+        self._in_flight += 1
+        self._stats["calls"] += 1
+        future = loop.run_in_executor(self._pool, partial(fn, *args))
+        future.add_done_callback(self._release)
+        try:
+            # shield: a timeout abandons the wait, not the worker (threads cannot be cancelled)
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise AITimeoutError(f"AI call timed out after {timeout:g}s") from None
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+
+    async def stream(self, fn: Callable[..., Iterator[Any]], *args: Any, timeout: Optional[float] = None) -> AsyncIterator[Any]:
+        """
+        Run a blocking generator in the AI pool and yield its items as they are produced.
+
+        Items cross to the event loop through a queue. The whole stream shares
+        one timeout. If the consumer stops early, the worker stops at its next item.
+
+        Raises:
+            AIBusyError: No slot became free within the queue timeout
+            AITimeoutError: The stream did not finish within the timeout
+        """
+        timeout = timeout or self.call_timeout_s
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            self._stats["rejected"] += 1
+            raise AIBusyError("AI service is busy, try again shortly") from None
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stopped = threading.Event()
+
+        def put(item: Any, error: Optional[BaseException] = None) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+            except RuntimeError:
+                stopped.set()  # Event loop closed; nobody is listening any more
+
+        def produce() -> None:
+            try:
+                for item in fn(*args):
+                    if stopped.is_set():
+                        return
+                    put(item)
+            except Exception as e:
+                put(_END, e)
+            else:
+                put(_END)
+
+        self._in_flight += 1
+        self._stats["calls"] += 1
+        future = loop.run_in_executor(self._pool, produce)
+        future.add_done_callback(self._release)
+        deadline = loop.time() + timeout
+        try:
+            while True:
+                try:
+                    item, error = await asyncio.wait_for(queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    self._stats["timeouts"] += 1
+                    raise AITimeoutError(f"AI call timed out after {timeout:g}s") from None
+                if item is _END:
+                    if error is not None:
+                        self._stats["errors"] += 1
+                        raise error
+                    return
+                yield item
+        finally:
+            stopped.set()
+
+    def _release(self, future: asyncio.Future) -> None:
+        self._in_flight -= 1
+        self._slots.release()
+        if not future.cancelled():
+            future.exception()  # Mark retrieved; abandoned calls would otherwise log a warning
+
+    def submit(self, kind: str, coro: Coroutine[Any, Any, Any]) -> dict[str, Any]:
+        """
+        Start a job in the background and return its record.
+
+        Raises:
+            AIBusyError: Too many jobs are already queued or running
+        """
+        self._prune()
+        pending = sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+        if pending >= self.max_pending_jobs:
+            coro.close()
+            self._stats["rejected"] += 1
+            raise AIBusyError("Too many AI jobs pending, try again shortly")
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "created_at": datetime.utcnow(),
+            "finished_at": None,
+        }
+        self._jobs[job_id] = job
+        self._tasks[job_id] = asyncio.create_task(self._run_job(job, coro))
+        return job
+
+    async def _run_job(self, job: dict[str, Any], coro: Coroutine[Any, Any, Any]) -> None:
+        job["status"] = "running"
+        try:
+            job["result"] = await coro
+            job["status"] = "done"
+        except Exception as e:
+            job["error"] = str(e)
+            job["status"] = "failed"
+        finally:
+            job["finished_at"] = datetime.utcnow()
+            job["_finished"] = time.monotonic()
+            self._tasks.pop(job["job_id"], None)
+
+    def get_job(self, job_id: str) -> Optional[dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if not k.startswith("_")}
+
+    def _prune(self) -> None:
+        """Forget finished jobs whose results have been kept for job_ttl_s."""
+        cutoff = time.monotonic() - self.job_ttl_s
+        expired = [job_id for job_id, job in self._jobs.items() if job.get("_finished", cutoff + 1) < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "jobs_pending": len(self._tasks),
+            "jobs_stored": len(self._jobs),
+            **self._stats,
+        }
+
+    async def shutdown(self) -> None:
+        """Cancel outstanding jobs and stop accepting work; running model calls are abandoned."""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Create singleton instance
+ai_executor = AIExecutor()
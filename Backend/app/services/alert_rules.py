@@ -0,0 +1,313 @@
+import json
+import os
+import threading
+from typing import Any, Iterable, Optional
+import numpy as np
+from ..config import settings
+
+RULE_METRICS = ("moisture", "temperature", "humidity", "ph")
+RULE_KINDS = ("threshold", "rate")
+OPS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+}
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "alert_rules.json")
+DEFAULT_MESSAGE = "{name}: {metric} {value:.2f} (sensor {sensor_id}, zone {zone})"
+
+
+class AlertRule:
+    """
+    One compiled rule.
+
+    threshold: breach when `metric op value`.
+    rate: breach when the change against the sensor's newest reading at
+          least window_s (default per_seconds) older, scaled to
+          per_seconds, satisfies `op value`. Measuring over a whole window
+          keeps point-to-point jitter from looking like a trend; readings
+          without that much history behind them are not rated.
+    Both are edge-triggered with hysteresis: an alert fires when a sensor
+    enters breach and it cannot fire again until the reading (or rate)
+    has crossed back past `clear` (defaults to `value`).
+    """
+
+    def __init__(self, spec: dict[str, Any]) -> None:
+        self.name = spec["name"]
+        self.metric = spec["metric"]
+        self.kind = spec.get("kind", "threshold")
+        self.op = spec["op"]
+        self.value = float(spec["value"])
+        self.clear = float(spec.get("clear", self.value))
+        self.per_seconds = float(spec.get("per_seconds", 60))
+        self.window_s = max(float(spec.get("window_s", self.per_seconds)), 1e-3)
+        self.type = spec.get("type", self.metric)
+        self.severity = spec.get("severity", "medium")
+        self.zone: Optional[str] = spec.get("zone")
+        self.sensor_id: Optional[int] = spec.get("sensor_id")
+        self.message = spec.get("message", DEFAULT_MESSAGE)
+
+        if self.metric not in RULE_METRICS:
+            raise ValueError(f"Rule '{self.name}': unknown metric '{self.metric}'")
+        if self.kind not in RULE_KINDS:
+            raise ValueError(f"Rule '{self.name}': unknown kind '{self.kind}'")
+        if self.op not in OPS:
+            raise ValueError(f"Rule '{self.name}': unknown op '{self.op}'")
+        # The clear level must sit on the safe side of the trigger level
+        if self.op.startswith("<") and self.clear < self.value or self.op.startswith(">") and self.clear > self.value:
+            raise ValueError(f"Rule '{self.name}': clear level {self.clear} is inside the breach range")
+        self._compare = OPS[self.op]
+
+    def breach_and_clear(self, x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Per-row masks: entering breach, and back past the clear level. NaN is neither."""
+        breach = self._compare(x, self.value)
+        clear = ~self._compare(x, self.clear) & ~np.isnan(x)
+        return breach, clear & ~breach
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "type": self.type,
+            "metric": self.metric,
+            "kind": self.kind,
+            "op": self.op,
+            "value": self.value,
+            "clear": self.clear,
+            "per_seconds": self.per_seconds if self.kind == "rate" else None,
+            "window_s": self.window_s if self.kind == "rate" else None,
+            "severity": self.severity,
+            "zone": self.zone,
+            "sensor_id": self.sensor_id,
+        }
+
+
+class AlertRuleEngine:
+    """
+    Evaluates alert rules over each batch of ingested readings.
+
+    Rules are compiled once from a JSON file (app/alert_rules.json by
+    default). Each batch is turned into NumPy columns sorted by sensor and
+    time, and every rule runs as a handful of array operations over the
+    whole batch, including rate-of-change and hysteresis state carried per
+    sensor between batches. No DB queries are involved.
+    """
+
+    def __init__(self, rules_path: str = settings.alert_rules_path or DEFAULT_RULES_PATH) -> None:
+        self.rules_path = rules_path
+        self.rules: list[AlertRule] = []
+        self._lock = threading.Lock()
+        self._active: dict[tuple[str, int], bool] = {}  # (rule, sensor) -> currently in breach
+        # sensor -> (epoch s, RULE_METRICS columns), ascending, covering the longest rate window
+        self._history: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+
+    def load(self) -> None:
+        """(Re)compile rules from the JSON file. Keeps the current rules if the file is invalid."""
+        try:
+            with open(self.rules_path, "r") as file:
+                specs = json.load(file).get("rules", [])
+            rules = [AlertRule(spec) for spec in specs]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"[ALERT RULES] Could not load {self.rules_path}: {e}")
+            return
+        with self._lock:
+            self.rules = rules
+            self._active.clear()
+        print(f"[ALERT RULES] Loaded {len(rules)} rules from {self.rules_path}")
+
+    def evaluate(self, rows: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Run all rules over a batch of readings (dicts with sensor_id, zone,
+        timestamp and the metric values), in timestamp order per sensor.
+
+        Returns:
+            Alert dicts (type, severity, message, zone, sensor_id, timestamp) for rules that fired
+        """
+        rows = list(rows)
+        if not rows:
+            return []
+        with self._lock:
+            if not self.rules:
+                self._remember(rows)
+                return []
+            return self._evaluate(rows)
+
+    def _evaluate(self, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        n = len(rows)
+        sensor = np.fromiter((r["sensor_id"] for r in rows), np.int64, n)
+        ts = np.fromiter((r["timestamp"].timestamp() for r in rows), np.float64, n)
+        # Primary key sensor, then time, then arrival
+        order = np.lexsort((np.arange(n), ts, sensor))
+        sensor, ts = sensor[order], ts[order]
+        zone = np.array([rows[i]["zone"] or "" for i in order], dtype=object)
+        values = {
+            m: np.fromiter((rows[i][m] for i in order), np.float64, n) for m in RULE_METRICS
+        }
+
+        alerts = []
+        for rule in self.rules:
+            scope = np.ones(n, dtype=bool)
+            if rule.zone is not None:
+                scope &= zone == rule.zone
+            if rule.sensor_id is not None:
+                scope &= sensor == rule.sensor_id
+            idx = np.flatnonzero(scope)
+            if idx.size == 0:
+                continue
+            fired, observed = self._fire(rule, sensor[idx], ts[idx], values[rule.metric][idx])
+            for i, value in zip(fired, observed):
+                alerts.append(self._alert(rule, rows[order[idx[i]]], float(value)))
+
+        self._remember(rows)
+        alerts.sort(key=lambda alert: alert["timestamp"])
+        return alerts
+
+    def _fire(
+        self,
+        rule: AlertRule,
+        sensor: np.ndarray,
+        ts: np.ndarray,
+        x: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Positions (within the scoped arrays) where a sensor enters breach of
+        this rule, and the observed value (reading or rate) at each.
+        """
+        n = len(sensor)
+        starts = np.empty(n, dtype=bool)
+        starts[0] = True
+        np.not_equal(sensor[1:], sensor[:-1], out=starts[1:])
+        start_pos = np.flatnonzero(starts)
+
+        if rule.kind == "rate":
+            x = self._windowed_rate(rule, sensor, ts, x, start_pos)
+
+        breach, clear = rule.breach_and_clear(x)
+        prior = np.array([self._active.get((rule.name, int(sensor[pos])), False) for pos in start_pos])
+
+        # Hysteresis without a Python loop: the state after each reading is
+        # that of the last decisive reading (breach -> on, clear -> off) of the
+        # same sensor; each sensor's first row falls back to its carried state.
+        decisive = breach | clear
+        state_at = breach.copy()
+        first_undecided = start_pos[~decisive[start_pos]]
+        state_at[first_undecided] = prior[~decisive[start_pos]]
+        decisive[start_pos] = True
+        last_decisive = np.maximum.accumulate(np.where(decisive, np.arange(n), 0))
+        state = state_at[last_decisive]
+
+        previous = np.roll(state, 1)
+        previous[start_pos] = prior
+        fired = np.flatnonzero(state & ~previous)
+
+        # Carry each sensor's final state into the next batch
+        ends = np.r_[start_pos[1:] - 1, n - 1]
+        for pos in ends:
+            self._active[(rule.name, int(sensor[pos]))] = bool(state[pos])
+        return fired, x[fired]
+
+    def _windowed_rate(
+        self,
+        rule: AlertRule,
+        sensor: np.ndarray,
+        ts: np.ndarray,
+        x: np.ndarray,
+        start_pos: np.ndarray,
+    ) -> np.ndarray:
+        """Per-row rate against each sensor's newest reading at least window_s older (NaN if none)."""
+        column = RULE_METRICS.index(rule.metric)
+        rate = np.full(len(x), np.nan)
+        for start, end in zip(start_pos, np.r_[start_pos[1:], len(x)]):
+            # Baselines come from the carried history and from earlier rows of this batch
+            past_ts, past_values = self._history.get(int(sensor[start]), (np.empty(0), np.empty((0, len(RULE_METRICS)))))
+            base_ts = np.concatenate((past_ts, ts[start:end]))
+            base_x = np.concatenate((past_values[:, column], x[start:end]))
+            order = np.argsort(base_ts, kind="stable")
+            base_ts, base_x = base_ts[order], base_x[order]
+
+            base = np.searchsorted(base_ts, ts[start:end] - rule.window_s, side="right") - 1
+            has_base = base >= 0
+            base = np.maximum(base, 0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                segment = (x[start:end] - base_x[base]) / (ts[start:end] - base_ts[base]) * rule.per_seconds
+            rate[start:end] = np.where(has_base, segment, np.nan)
+        return rate
+
+    def _alert(self, rule: AlertRule, row: dict[str, Any], observed: float) -> dict[str, Any]:
+        fields = {
+            "name": rule.name,
+            "metric": rule.metric,
+            "value": row[rule.metric],
+            "threshold": rule.value,
+            "rate": observed if rule.kind == "rate" else float("nan"),
+            "sensor_id": row["sensor_id"],
+            "zone": row["zone"],
+        }
+        try:
+            message = rule.message.format(**fields)
+        except (KeyError, ValueError, IndexError):
+            message = DEFAULT_MESSAGE.format(**fields)
+        return {
+            "type": rule.type,
+            "severity": rule.severity,
+            "message": message,
+            "zone": row["zone"],
+            "sensor_id": row["sensor_id"],
+            "timestamp": row["timestamp"],
+        }
+
+    def prime(self, rows: Iterable[dict[str, Any]]) -> None:
+        """Seed rate-of-change baselines, e.g. from the latest reading cache at startup."""
+        with self._lock:
+            self._remember([row for row in rows if row.get("timestamp")])
+
+    def checkpoint(self, rows: Iterable[dict[str, Any]]) -> dict[str, Any]:
+        """
+        Capture the state evaluate(rows) would change (that of the rows' sensors),
+        so it can be put back with restore() if the batch is not persisted.
+        """
+        sensors = {row["sensor_id"] for row in rows}
+        with self._lock:
+            return {
+                "sensors": sensors,
+                "active": {key: state for key, state in self._active.items() if key[1] in sensors},
+                "history": {sensor: self._history.get(sensor) for sensor in sensors},
+            }
+
+    def restore(self, checkpoint: dict[str, Any]) -> None:
+        """Roll the checkpointed sensors back, e.g. after the batch's transaction failed."""
+        sensors = checkpoint["sensors"]
+        with self._lock:
+            for key in [key for key in self._active if key[1] in sensors]:
+                del self._active[key]
+            self._active.update(checkpoint["active"])
+            for sensor, history in checkpoint["history"].items():
+                if history is None:
+                    self._history.pop(sensor, None)
+                else:
+                    self._history[sensor] = history
+
+    def _remember(self, rows: list[dict[str, Any]]) -> None:
+        """Add readings to each sensor's history, keeping what later rate baselines can still use."""
+        horizon = max((rule.window_s for rule in self.rules if rule.kind == "rate"), default=0.0)
+        by_sensor: dict[int, list[dict[str, Any]]] = {}
+        for row in rows:
+            by_sensor.setdefault(row["sensor_id"], []).append(row)
+        for sensor, sensor_rows in by_sensor.items():
+            ts = np.fromiter((row["timestamp"].timestamp() for row in sensor_rows), np.float64, len(sensor_rows))
+            values = np.array([[row[m] for m in RULE_METRICS] for row in sensor_rows], dtype=np.float64)
+            previous = self._history.get(sensor)
+            if previous is not None:
+                ts = np.concatenate((previous[0], ts))
+                values = np.concatenate((previous[1], values))
+            order = np.argsort(ts, kind="stable")
+            ts, values = ts[order], values[order]
+            # Everything inside the horizon, plus the newest reading before it (the next baseline)
+            keep = max(int(np.searchsorted(ts, ts[-1] - horizon, side="right")) - 1, 0)
+            self._history[sensor] = (ts[keep:], values[keep:])
+
+    def describe(self) -> list[dict[str, Any]]:
+        return [rule.describe() for rule in self.rules]
+
+
+# Create singleton instance
+alert_engine = AlertRuleEngine()
@@ -0,0 +1,325 @@
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Iterable, Optional
+from sqlalchemy import case, event, func, insert, select, update
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models import Alert
+
+ALERT_FIELDS = (
+    "id", "timestamp", "type", "severity", "message", "is_read", "is_resolved",
+    "zone", "sensor_id", "occurrences", "first_seen", "last_seen",
+)
+NO_ZONE = "unassigned"  # Counter key for alerts without a zone
+
+
+class AlertCounters:
+    """
+    Unread and unresolved alert counts by severity and zone, kept in memory.
+
+    Loaded with one GROUP BY at startup, then maintained incrementally:
+    writers stage deltas on their session with stage() and the deltas are
+    applied only once that transaction commits (dropped on rollback), so
+    the counts never include uncommitted or rolled-back rows.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._unread: Counter[tuple[str, str]] = Counter()
+        self._unresolved: Counter[tuple[str, str]] = Counter()
+
+    def load(self, db: Session) -> None:
+        """Recount from the table (startup, and after bulk deletes that bypass stage())."""
+        rows = db.execute(
+            select(
+                Alert.severity,
+                Alert.zone,
+                func.sum(case((Alert.is_read == False, 1), else_=0)),
+                func.sum(case((Alert.is_resolved == False, 1), else_=0)),
+            ).group_by(Alert.severity, Alert.zone)
+        ).all()
+        with self._lock:
+            self._unread.clear()
+            self._unresolved.clear()
+            for severity, zone, unread, unresolved in rows:
+                self._unread[(severity, zone or NO_ZONE)] = unread or 0
+                self._unresolved[(severity, zone or NO_ZONE)] = unresolved or 0
+            self._drop_zeros()
+        print(f"[ALERTS] Counters loaded: {self.unread} unread, {self.unresolved} unresolved")
+
+    @staticmethod
+    def stage(db: Session, severity: str, zone: Optional[str], unread: int, unresolved: int) -> None:
+        """Queue a change to the counts, applied when db's transaction commits."""
+        if unread or unresolved:
+            db.info.setdefault("alert_counter_deltas", []).append((severity, zone or NO_ZONE, unread, unresolved))
+
+    def stage_transition(self, db: Session, alert: Any, was_read: bool, was_resolved: bool) -> bool:
+        """Stage the change of an alert's read/resolved flags. Returns whether the counts change."""
+        unread = int(was_read) - int(bool(alert.is_read))
+        unresolved = int(was_resolved) - int(bool(alert.is_resolved))
+        self.stage(db, alert.severity, alert.zone, unread, unresolved)
+        return bool(unread or unresolved)
+
+    def _apply(self, deltas: list[tuple[str, str, int, int]]) -> None:
+        with self._lock:
+            for severity, zone, unread, unresolved in deltas:
+                self._unread[(severity, zone)] += unread
+                self._unresolved[(severity, zone)] += unresolved
+            self._drop_zeros()
+
+    def _drop_zeros(self) -> None:
+        for counts in (self._unread, self._unresolved):
+            for key in [key for key, count in counts.items() if count <= 0]:
+                del counts[key]
+
+    # Reads take the lock too: after_commit applies deltas from the ingest writer thread
+
+    @property
+    def unread(self) -> int:
+        with self._lock:
+            return sum(self._unread.values())
+
+    @property
+    def unresolved(self) -> int:
+        with self._lock:
+            return sum(self._unresolved.values())
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            by_severity: dict[str, dict[str, int]] = {}
+            by_zone: dict[str, dict[str, int]] = {}
+            for name, counts in (("unread", self._unread), ("unresolved", self._unresolved)):
+                for (severity, zone), count in counts.items():
+                    by_severity.setdefault(severity, {"unread": 0, "unresolved": 0})[name] += count
+                    by_zone.setdefault(zone, {"unread": 0, "unresolved": 0})[name] += count
+            return {
+                "unread": sum(self._unread.values()),
+                "unresolved": sum(self._unresolved.values()),
+                "by_severity": by_severity,
+                "by_zone": by_zone,
+            }
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_counter_deltas(session: Session) -> None:
+    deltas = session.info.pop("alert_counter_deltas", None)
+    if deltas:
+        alert_counters._apply(deltas)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_counter_deltas(session: Session) -> None:
+    session.info.pop("alert_counter_deltas", None)
+
+
+class AlertStore:
+    """
+    Single write path for alerts, coalescing repeats.
+
+    An alert is open while it is unread and unresolved. A new alert with the
+    same (type, zone, severity) as an open alert last seen within window_s
+    is folded into that row: occurrences grows, last_seen and message move
+    forward. Open alerts are indexed in memory, so the check costs no query.
+    Like the counters, index changes are staged on the session and applied
+    only once its transaction commits. Marking an alert read or resolved
+    (or deleting it) closes it, and the next repeat starts a fresh row.
+    """
+
+    def __init__(self, window_s: int = settings.alert_dedup_window_s) -> None:
+        self.window = timedelta(seconds=max(0, window_s))
+        self._lock = threading.Lock()
+        self._open: dict[tuple[str, Optional[str], str], dict[str, Any]] = {}
+        self._keys: dict[int, tuple[str, Optional[str], str]] = {}  # alert id -> open key
+        self._stats = {"created": 0, "coalesced": 0}
+
+    @staticmethod
+    def _key(alert: dict[str, Any]) -> tuple[str, Optional[str], str]:
+        return alert["type"], alert.get("zone"), alert["severity"]
+
+    def record(self, db: Session, alerts: Iterable[dict[str, Any]]) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+        """
+        Persist alerts (dicts with type, severity, message, zone, timestamp
+        and optionally sensor_id)
+        with the caller's transaction; the caller commits. The open-alert
+        index and stats only take the changes once that commit happens.
+
+        Returns:
+            (created, updated) alert rows as AlertResponse-shaped dicts;
+            every recorded alert is part of one of them
+        """
+        groups = self._group(alerts)
+        if not groups:
+            return [], []
+
+        merges: list[tuple[int, dict[str, Any]]] = []
+        inserts: list[dict[str, Any]] = []
+        with self._lock:
+            self._prune(min(group["first_seen"] for group in groups))
+            for group in groups:
+                entry = self._open.get(self._key(group)) if self.window else None
+                if entry is not None and group["first_seen"] - entry["last_seen"] <= self.window:
+                    merges.append((entry["id"], group))
+                else:
+                    inserts.append(group)
+
+        updated_ids = []
+        for alert_id, group in merges:
+            # Relative increment, so concurrent writers folding into one row both count
+            result = db.execute(
+                update(Alert)
+                .where(Alert.id == alert_id, Alert.is_read == False, Alert.is_resolved == False)
+                .values(
+                    occurrences=Alert.occurrences + group["occurrences"],
+                    last_seen=group["last_seen"],
+                    message=group["message"],
+                    sensor_id=group["sensor_id"],
+                )
+            )
+            if result.rowcount:
+                updated_ids.append((alert_id, group))
+            else:
+                inserts.append(group)  # Closed or deleted behind the index's back
+
+        if inserts:
+            ids = db.scalars(insert(Alert).returning(Alert.id, sort_by_parameter_order=True), inserts).all()
+            for group, alert_id in zip(inserts, ids):
+                group.update(id=alert_id, is_read=False, is_resolved=False)
+                alert_counters.stage(db, group["severity"], group["zone"], 1, 1)
+
+        updated = []
+        reread = []
+        with self._lock:
+            for alert_id, group in updated_ids:
+                entry = self._open.get(self._key(group))
+                if entry is None or entry["id"] != alert_id:
+                    reread.append(alert_id)  # Closed or pruned after the update; the row still changed
+                    continue
+                updated.append(self._merged(entry, group))
+        db.info.setdefault("alert_index_changes", []).append((self, updated_ids, [dict(group) for group in inserts]))
+        if reread:
+            columns = [getattr(Alert, field) for field in ALERT_FIELDS]
+            updated += [dict(row._mapping) for row in db.execute(select(*columns).where(Alert.id.in_(reread)))]
+        created = [{field: group[field] for field in ALERT_FIELDS} for group in inserts]
+        return created, updated
+
+    @staticmethod
+    def _merged(entry: dict[str, Any], group: dict[str, Any]) -> dict[str, Any]:
+        """An open alert's entry with a coalesced group folded in (a new dict)."""
+        return {
+            **entry,
+            "occurrences": entry["occurrences"] + group["occurrences"],
+            "last_seen": max(entry["last_seen"], group["last_seen"]),
+            "message": group["message"],
+            "sensor_id": group["sensor_id"],
+        }
+
+    def _apply(self, updated_ids: list[tuple[int, dict[str, Any]]], inserts: list[dict[str, Any]]) -> None:
+        """Fold a committed record() into the index and stats."""
+        with self._lock:
+            for alert_id, group in updated_ids:
+                key = self._key(group)
+                entry = self._open.get(key)
+                if entry is not None and entry["id"] == alert_id:
+                    self._open[key] = self._merged(entry, group)
+            for group in sorted(inserts, key=lambda g: g["last_seen"]):
+                if self.window:
+                    self._track(group)
+            self._stats["created"] += len(inserts)
+            self._stats["coalesced"] += sum(group["occurrences"] for group in inserts) - len(inserts)
+            self._stats["coalesced"] += sum(group["occurrences"] for _, group in updated_ids)
+
+    def _group(self, alerts: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Collapse repeats within one call, in timestamp order, into one pending row per run."""
+        groups: list[dict[str, Any]] = []
+        current: dict[tuple[str, Optional[str], str], dict[str, Any]] = {}
+        for alert in sorted(alerts, key=lambda a: a["timestamp"]):
+            key = self._key(alert)
+            group = current.get(key)
+            if group is not None and self.window and alert["timestamp"] - group["last_seen"] <= self.window:
+                group["occurrences"] += 1
+                group["last_seen"] = alert["timestamp"]
+                group["message"] = alert["message"]
+                group["sensor_id"] = alert.get("sensor_id")
+                continue
+            group = {
+                "timestamp": alert["timestamp"],
+                "type": alert["type"],
+                "severity": alert["severity"],
+                "message": alert["message"],
+                "zone": alert.get("zone"),
+                "sensor_id": alert.get("sensor_id"),
+                "occurrences": 1,
+                "first_seen": alert["timestamp"],
+                "last_seen": alert["timestamp"],
+            }
+            current[key] = group
+            groups.append(group)
+        return groups
+
+    def _track(self, entry: dict[str, Any]) -> None:
+        key = self._key(entry)
+        previous = self._open.get(key)
+        if previous is not None:
+            self._keys.pop(previous["id"], None)
+        self._open[key] = entry
+        self._keys[entry["id"]] = key
+
+    def _prune(self, now: datetime) -> None:
+        """Forget open alerts that have been quiet for longer than the window."""
+        cutoff = now - self.window
+        for key in [key for key, entry in self._open.items() if entry["last_seen"] < cutoff]:
+            self._keys.pop(self._open.pop(key)["id"], None)
+
+    def close(self, alert_id: int) -> None:
+        """Stop coalescing into an alert (read, resolved or deleted)."""
+        with self._lock:
+            key = self._keys.pop(alert_id, None)
+            if key is not None:
+                self._open.pop(key, None)
+
+    def close_all(self) -> None:
+        with self._lock:
+            self._open.clear()
+            self._keys.clear()
+
+    def warm(self, db: Session) -> None:
+        """Index open alerts seen within the window, newest per key."""
+        if not self.window:
+            return
+        last_seen = func.coalesce(Alert.last_seen, Alert.timestamp)
+        rows = db.scalars(
+            select(Alert)
+            .where(Alert.is_read == False, Alert.is_resolved == False, last_seen >= datetime.now() - self.window)
+            .order_by(last_seen)
+        ).all()
+        with self._lock:
+            self._open.clear()
+            self._keys.clear()
+            for row in rows:
+                entry = {field: getattr(row, field) for field in ALERT_FIELDS}
+                entry["occurrences"] = entry["occurrences"] or 1
+                entry["first_seen"] = entry["first_seen"] or row.timestamp
+                entry["last_seen"] = entry["last_seen"] or row.timestamp
+                self._track(entry)
+        print(f"[ALERTS] Indexed {len(self._open)} open alerts for de-duplication")
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"window_s": int(self.window.total_seconds()), "open": len(self._open), **self._stats}
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_index_changes(session: Session) -> None:
+    for store, updated_ids, inserts in session.info.pop("alert_index_changes", ()):
+        store._apply(updated_ids, inserts)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_index_changes(session: Session) -> None:
+    session.info.pop("alert_index_changes", None)
+
+
+# Create singleton instances
+alert_counters = AlertCounters()
+alert_store = AlertStore()
@@ -0,0 +1,184 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from PIL import Image
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models import AnalysisCacheEntry
+
+
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """
+    64-bit difference hash: grayscale, shrink to (size+1) x size and record
+    whether each pixel is brighter than its right neighbour. Robust to
+    re-compression and resizing, so re-uploads of one photo hash alike.
+    """
+    pixels = list(image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS).getdata())
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+class AnalysisCache:
+    """
+    Content-addressed cache of model results, persisted in the analysis_cache table.
+
+    Entries are keyed by (analysis_type, prompt_version, sha256); a miss on
+    the exact hash falls back to the nearest perceptual hash within
+    max_distance bits, which catches re-encoded or resized re-uploads.
+    All entries live in an in-memory LRU (the table only makes them survive
+    restarts), bounded by max_entries and expired after ttl_hours.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.ai_cache_enabled,
+        ttl_hours: float = settings.ai_cache_ttl_hours,
+        max_entries: int = settings.ai_cache_max_entries,
+        max_distance: int = settings.ai_cache_phash_distance,
+    ) -> None:
+        self.enabled = enabled
+        self.ttl = timedelta(hours=ttl_hours)
+        self.max_entries = max(1, max_entries)
+        self.max_distance = max_distance
+        self._entries: OrderedDict[tuple[str, str, str], dict[str, Any]] = OrderedDict()
+        self._stats = {"hits": 0, "near_hits": 0, "misses": 0, "evictions": 0}
+
+    def lookup(
+        self,
+        analysis_type: str,
+        prompt_version: str,
+        fingerprint: tuple[str, int],
+    ) -> Optional[dict[str, Any]]:
+        """Find a live entry by exact hash, else by nearest perceptual hash. Marks it recently used."""
+        if not self.enabled:
+            return None
+        sha256, phash = fingerprint
+        key = (analysis_type, prompt_version, sha256)
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(entry):
+            del self._entries[key]
+            entry = None
+
+        if entry is None and self.max_distance >= 0:
+            best_distance = self.max_distance + 1
+            for other_key, other in self._entries.items():
+                if other_key[:2] != key[:2] or self._expired(other):
+                    continue
+                distance = (other["phash"] ^ phash).bit_count()
+                if distance < best_distance:
+                    key, entry, best_distance = other_key, other, distance
+            if entry is not None:
+                self._stats["near_hits"] += 1
+
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        self._entries.move_to_end(key)
+        entry["hit_count"] += 1
+        return entry
+
+    def _expired(self, entry: dict[str, Any]) -> bool:
+        return entry["created_at"] < datetime.now() - self.ttl
+
+    async def record_hit(self, db: AsyncSession, entry: dict[str, Any]) -> None:
+        """Persist recency so LRU order survives restarts. Commits with the caller's transaction."""
+        await db.execute(
+            update(AnalysisCacheEntry)
+            .where(AnalysisCacheEntry.id == entry["id"])
+            .values(last_hit_at=datetime.now(), hit_count=entry["hit_count"])
+        )
+
+    async def store(
+        self,
+        db: AsyncSession,
+        analysis_type: str,
+        prompt_version: str,
+        fingerprint: tuple[str, int],
+        result: str,
+    ) -> None:
+        """
+        Cache a fresh result, evicting least recently used and expired entries.
+        Commits with the caller's transaction.
+        """
+        if not self.enabled:
+            return
+        sha256, phash = fingerprint
+        key = (analysis_type, prompt_version, sha256)
+        if key in self._entries:
+            return
+
+        now = datetime.now()
+        values = {
+            "analysis_type": analysis_type,
+            "prompt_version": prompt_version,
+            "sha256": sha256,
+            "phash": f"{phash:016x}",
+            "result": result,
+            "created_at": now,
+            "last_hit_at": now,
+            "hit_count": 0,
+        }
+        if db.get_bind().dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = (
+            insert(AnalysisCacheEntry)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=["analysis_type", "prompt_version", "sha256"])
+            .returning(AnalysisCacheEntry.id)
+        )
+        entry_id = await db.scalar(stmt)
+        if entry_id is None:
+            return  # A concurrent request cached the same image first
+        self._entries[key] = {"id": entry_id, "phash": phash, "result": result, "created_at": now, "hit_count": 0}
+
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            _, entry = self._entries.popitem(last=False)
+            evicted.append(entry["id"])
+        self._stats["evictions"] += len(evicted)
+        cutoff = datetime.now() - self.ttl
+        await db.execute(
+            delete(AnalysisCacheEntry).where(
+                AnalysisCacheEntry.id.in_(evicted) | (AnalysisCacheEntry.created_at < cutoff)
+            )
+        )
+
+    def warm(self, db: Session) -> None:
+        """Load live entries from the DB, most recently hit last."""
+        cutoff = datetime.now() - self.ttl
+        rows = db.scalars(
+            select(AnalysisCacheEntry)
+            .where(AnalysisCacheEntry.created_at >= cutoff)
+            .order_by(AnalysisCacheEntry.last_hit_at.desc())
+            .limit(self.max_entries)
+        ).all()
+        self._entries.clear()
+        for row in reversed(rows):
+            self._entries[(row.analysis_type, row.prompt_version, row.sha256)] = self._entry(row)
+        print(f"[CACHE] Analysis cache warmed with {len(self._entries)} entries")
+
+    @staticmethod
+    def _entry(row: AnalysisCacheEntry) -> dict[str, Any]:
+        return {
+            "id": row.id,
+            "phash": int(row.phash, 16),
+            "result": row.result,
+            "created_at": row.created_at,
+            "hit_count": row.hit_count or 0,
+        }
+
+    def stats(self) -> dict[str, Any]:
+        return {"enabled": self.enabled, "entries": len(self._entries), "max_entries": self.max_entries, **self._stats}
+
+
+# Create singleton instance
+analysis_cache = AnalysisCache()
@@ -0,0 +1,120 @@
+from datetime import datetime
+from typing import Any, Optional, Sequence
+import numpy as np
+from sqlalchemy import String, select, type_coerce
+from sqlalchemy.orm import Session
+from ..models import SensorReading
+
+SERIES_METRICS = ("moisture", "temperature", "humidity", "ph")
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, for each of the threshold - 2
+    buckets in between, the point forming the largest triangle with the
+    previously selected point and the average of the next bucket. Area
+    computation within a bucket is vectorized.
+
+    Args:
+        x: Monotonic x values (e.g. epoch seconds)
+        y: Values, same length as x
+        threshold: Number of points to keep
+
+    Returns:
+        Indices of the selected points, ascending
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket edges over the interior points 1 .. n-2
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (the last bucket looks ahead to the final point)
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        areas = np.abs(
+            (x[a] - avg_x) * (bucket_y - y[a]) - (x[a] - bucket_x) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def load_series(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    metrics: Sequence[str],
+    zone: Optional[str] = None,
+    sensor_id: Optional[int] = None,
+    chunk_size: int = 5000,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Stream readings for a time range from the DB cursor into NumPy arrays.
+
+    Rows are fetched in chunks with yield_per and converted per chunk, so no
+    ORM objects are built and Python-level row lists never exceed one chunk.
+
+    Returns:
+        (timestamps as datetime64[ms], values with one column per metric)
+    """
+    timestamp = SensorReading.timestamp
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite stores ISO strings; NumPy parses them far faster than building datetimes per row
+        timestamp = type_coerce(timestamp, String)
+    columns = [timestamp] + [getattr(SensorReading, metric) for metric in metrics]
+    query = select(*columns).where(
+        SensorReading.timestamp >= start,
+        SensorReading.timestamp <= end,
+    )
+    if zone:
+        query = query.where(SensorReading.zone == zone)
+    if sensor_id is not None:
+        query = query.where(SensorReading.sensor_id == sensor_id)
+    query = query.order_by(SensorReading.timestamp).execution_options(yield_per=chunk_size)
+
+    ts_chunks = []
+    value_chunks = []
+    for partition in db.execute(query).partitions():
+        timestamps, *values = zip(*partition)
+        ts_chunks.append(np.array(timestamps, dtype="datetime64[ms]"))
+        value_chunks.append(np.array(values, dtype=np.float64).T)
+
+    if not ts_chunks:
+        return np.empty(0, dtype="datetime64[ms]"), np.empty((0, len(metrics)))
+    return np.concatenate(ts_chunks), np.concatenate(value_chunks)
+
+
+def downsample_series(
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    metrics: Sequence[str],
+    points: int,
+) -> dict[str, list[dict[str, Any]]]:
+    """Run LTTB independently for each metric column."""
+    x = timestamps.astype(np.int64).astype(np.float64)
+    series = {}
+    for column, metric in enumerate(metrics):
+        y = values[:, column]
+        keep = lttb(x, y, points)
+        series[metric] = [
+            {"timestamp": ts.isoformat(), "value": round(float(value), 2)}
+            for ts, value in zip(timestamps[keep].astype(datetime), y[keep])
+        ]
+    return series
@@ -1,63 +1,101 @@
 import google.generativeai as genai
 from ..config import settings
-import base64
-from io import BytesIO
-from PIL import Image
+from .ai_executor import ai_executor, AIExecutorError
+from typing import AsyncIterator, Iterator
 
 # Configure Gemini API
 genai.configure(api_key=settings.gemini_api_key)
 
+PLANT_HEALTH_PROMPT = """You are an agricultural expert AI. Analyze this plant leaf image. 
+            Detect any signs of disease, nutrient deficiency, or water stress. 
+            If it looks healthy, say so. Keep the response concise (max 3 sentences)."""
+# Bump whenever PLANT_HEALTH_PROMPT or the model changes; cached analyses are keyed on it
+PLANT_HEALTH_PROMPT_VERSION = "1"
+
+SECURITY_PROMPT = """You are a farm security AI. Identify what caused the motion trigger in this image. 
+            Is it a human, an animal, or a false alarm? Be brief."""
+
+FARMING_ADVICE_PROMPT = """Context: {context}
+
+User Question: {question}
+
+Answer as a helpful farming assistant:"""
+
 
 class GeminiService:
     def __init__(self):
         self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
     
-    async def analyze_plant_health(self, image_base64: str) -> str:
+    def _generate(self, contents) -> str:
+        """Blocking model call; only ever run inside the AI executor's thread pool."""
+        response = self.model.generate_content(
+            contents,
+            request_options={"timeout": settings.ai_call_timeout_s}
+        )
+        return response.text
+    
+    def _generate_stream(self, contents) -> Iterator[str]:
+        """Blocking streamed model call yielding text chunks; only run via ai_executor.stream."""
+        response = self.model.generate_content(
+            contents,
+            stream=True,
+            request_options={"timeout": settings.ai_call_timeout_s}
+        )
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # Chunk without text parts (e.g. only safety ratings)
+            if text:
+                yield text
+    
+    @staticmethod
+    def _image_contents(prompt: str, image_jpeg: bytes) -> list:
+        # Already oriented and downscaled by the image pipeline; sent as-is
+        return [prompt, {"mime_type": "image/jpeg", "data": image_jpeg}]
+    
+    def _generate_for_image(self, prompt: str, image_jpeg: bytes) -> str:
+        return self._generate(self._image_contents(prompt, image_jpeg))
+    
+    async def analyze_plant_health(self, image_jpeg: bytes) -> str:
         """
         Analyze plant leaf image for health issues.
         
         Args:
-            image_base64: Base64 encoded image string
+            image_jpeg: JPEG bytes prepared by the image pipeline
             
         Returns:
             Analysis result as text
+            
+        Raises:
+            AIExecutorError: The AI pool is saturated or the call timed out
         """
         try:
-            # Decode base64 image
-            image_data = base64.b64decode(image_base64)
-            image = Image.open(BytesIO(image_data))
-            
-            prompt = """You are an agricultural expert AI. Analyze this plant leaf image. 
-            Detect any signs of disease, nutrient deficiency, or water stress. 
-            If it looks healthy, say so. Keep the response concise (max 3 sentences)."""
-            
-            response = self.model.generate_content([prompt, image])
-            return response.text
+            return await ai_executor.run(self._generate_for_image, PLANT_HEALTH_PROMPT, image_jpeg)
         
+        except AIExecutorError:
+            raise
         except Exception as e:
             return f"Error analyzing image: {str(e)}"
     
-    async def analyze_security_image(self, image_base64: str) -> str:
+    async def analyze_security_image(self, image_jpeg: bytes) -> str:
         """
         Analyze security camera image for motion detection.
         
         Args:
-            image_base64: Base64 encoded image string
+            image_jpeg: JPEG bytes prepared by the image pipeline
             
         Returns:
             Analysis result as text
+            
+        Raises:
+            AIExecutorError: The AI pool is saturated or the call timed out
         """
         try:
-            # Decode base64 image
-            image_data = base64.b64decode(image_base64)
-            image = Image.open(BytesIO(image_data))
-            
-            prompt = """You are a farm security AI. Identify what caused the motion trigger in this image. 
-            Is it a human, an animal, or a false alarm? Be brief."""
-            
-            response = self.model.generate_content([prompt, image])
-            return response.text
+            return await ai_executor.run(self._generate_for_image, SECURITY_PROMPT, image_jpeg)
         
+        except AIExecutorError:
+            raise
         except Exception as e:
             return f"Error analyzing security image: {str(e)}"
     
@@ -71,19 +109,32 @@ class GeminiService:
             
         Returns:
             AI-generated advice
+            
+        Raises:
+            AIExecutorError: The AI pool is saturated or the call timed out
         """
         try:
-            prompt = f"""Context: {context}
-
-User Question: {question}
-
-Answer as a helpful farming assistant:"""
-            
-            response = self.model.generate_content(prompt)
-            return response.text
+            prompt = FARMING_ADVICE_PROMPT.format(context=context, question=question)
+            return await ai_executor.run(self._generate, prompt)
         
+        except AIExecutorError:
+            raise
         except Exception as e:
             return f"Error getting advice: {str(e)}"
+    
+    # Streaming variants yield text chunks as the model produces them. Unlike
+    # the methods above they raise on failure, since part of the answer may
+    # already have reached the client.
+    
+    def stream_plant_health(self, image_jpeg: bytes) -> AsyncIterator[str]:
+        return ai_executor.stream(self._generate_stream, self._image_contents(PLANT_HEALTH_PROMPT, image_jpeg))
+    
+    def stream_security_image(self, image_jpeg: bytes) -> AsyncIterator[str]:
+        return ai_executor.stream(self._generate_stream, self._image_contents(SECURITY_PROMPT, image_jpeg))
+    
+    def stream_farming_advice(self, context: str, question: str) -> AsyncIterator[str]:
+        prompt = FARMING_ADVICE_PROMPT.format(context=context, question=question)
+        return ai_executor.stream(self._generate_stream, prompt)
 
 
 # Create singleton instance
@@ -0,0 +1,124 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import NamedTuple, Optional, Union
+from PIL import Image, ImageOps
+from ..config import settings
+from .analysis_cache import dhash
+
+# Decompression-bomb guard: refuse frames above ~50 MP (a 12 MP phone photo is far below)
+Image.MAX_IMAGE_PIXELS = 50_000_000
+
+
+class ImageError(ValueError):
+    """Raised when an uploaded image cannot be decoded."""
+
+
+class PreparedImage(NamedTuple):
+    jpeg: bytes  # Oriented, downscaled, re-encoded; what the model receives
+    sha256: str  # Of the bytes as uploaded
+    phash: int  # dHash of the prepared image
+    width: int
+    height: int
+
+    @property
+    def fingerprint(self) -> tuple[str, int]:
+        return self.sha256, self.phash
+
+
+def prepare_image(data: Union[bytes, str], max_edge: int, quality: int) -> PreparedImage:
+    """
+    Decode, EXIF-orient, downscale and re-encode an upload. Runs in a worker process.
+
+    Args:
+        data: Raw image bytes, or a base64 string (decoded here, off the event loop)
+        max_edge: Longest side of the output in pixels
+        quality: JPEG quality of the output
+    """
+    if isinstance(data, str):
+        try:
+            # Clients often wrap base64 at 76 columns (MIME style)
+            data = base64.b64decode("".join(data.split()))
+        except binascii.Error as e:
+            raise ImageError(f"Invalid base64 image: {e}") from e
+
+    try:
+        image = Image.open(BytesIO(data))
+        # JPEG can decode at 1/2, 1/4 or 1/8 scale directly, skipping most of the work
+        image.draft("RGB", (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGB")
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ImageError(f"Cannot read image: {e}") from e
+
+    image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    output = BytesIO()
+    image.save(output, "JPEG", quality=quality, optimize=True)
+    return PreparedImage(
+        jpeg=output.getvalue(),
+        sha256=hashlib.sha256(data).hexdigest(),
+        phash=dhash(image),
+        width=image.width,
+        height=image.height,
+    )
+
+
+class ImagePipeline:
+    """
+    Prepares uploaded images for the model on a process pool, so decoding
+    full-resolution camera frames never runs on the event loop (or holds the GIL).
+    The pool starts on first use and is rebuilt if a worker dies.
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.image_workers,
+        max_edge: int = settings.image_max_edge,
+        quality: int = settings.image_jpeg_quality,
+    ) -> None:
+        self.workers = max(1, workers)
+        self.max_edge = max_edge
+        self.quality = quality
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    async def prepare(self, data: Union[bytes, str]) -> PreparedImage:
+        """
+        Raises:
+            ImageError: The data is not a readable image
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        try:
+            return await loop.run_in_executor(pool, prepare_image, data, self.max_edge, self.quality)
+        except BrokenProcessPool:
+            # A worker was killed (OOM, crash); every later submit would fail too
+            print("[IMAGES] Worker pool broke, restarting it")
+            self._replace_pool(pool)
+            return await loop.run_in_executor(self._get_pool(), prepare_image, data, self.max_edge, self.quality)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawn, not fork: the server process has MQTT, DB pool and event loop threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def _replace_pool(self, broken: ProcessPoolExecutor) -> None:
+        broken.shutdown(wait=False, cancel_futures=True)
+        if self._pool is broken:  # Concurrent callers may have replaced it already
+            self._pool = None
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Create singleton instance
+image_pipeline = ImagePipeline()
@@ -0,0 +1,272 @@
+import asyncio
+import math
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Optional
+from sqlalchemy import insert
+from ..config import settings
+from ..database import WriteSessionLocal
+from ..models import SensorReading
+from .rollups import apply_rollups
+from .latest_cache import latest_cache
+from .alert_rules import alert_engine
+from .alert_store import alert_store
+from .irrigation import irrigation
+
+_STOP = object()
+READING_METRICS = ("moisture", "temperature", "humidity", "ph")
+
+
+class InvalidReading(ValueError):
+    """Raised by submit() for a payload that cannot be stored as a reading."""
+
+
+class IngestWriter:
+    """
+    Background writer that batches sensor readings into bulk inserts.
+
+    Producers (the MQTT callback) only enqueue; a single writer thread
+    drains the queue and commits each batch in one transaction, flushing
+    when the batch is full or the flush interval has elapsed. Payloads are
+    validated on submit; if a batch still fails to commit it is split in
+    halves and retried, so only the offending rows are lost.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.ingest_batch_size,
+        flush_interval_ms: int = settings.ingest_flush_interval_ms,
+        max_queue: int = settings.ingest_queue_max,
+    ) -> None:
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(1, flush_interval_ms) / 1000
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Stats
+        self._lock = threading.Lock()
+        self._flushes = 0
+        self._rows_written = 0
+        self._dropped = 0
+        self._rejected = 0
+        self._failed = 0
+        self._rows_lost = 0
+        self._last_flush_rows = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._last_flush_at: Optional[datetime] = None
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Start the writer thread.
+
+        Args:
+            loop: Event loop that WebSocket broadcasts are scheduled on.
+                  Defaults to the running loop of the caller.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+        self._loop = loop
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+        print(f"[INGEST] Writer started (batch={self.batch_size}, interval={self.flush_interval * 1000:.0f}ms)")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush whatever is queued and stop the writer thread."""
+        if not self._thread:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        print("[INGEST] Writer stopped")
+
+    def submit(self, data: dict[str, Any]) -> bool:
+        """
+        Queue a decoded sensor payload for persistence.
+        Never blocks; returns False if the queue is full and the reading was dropped.
+
+        Raises:
+            InvalidReading: A metric is missing, null, non-numeric or not finite
+        """
+        try:
+            row = {
+                "sensor_id": int(data.get("id", 1)),  # Hardware sensor ID from MQTT
+                **{metric: float(data[metric]) for metric in READING_METRICS},
+                "zone": str(data.get("zone") or "main"),
+                "timestamp": datetime.now(),  # Local time, matches the model default
+            }
+            if not all(math.isfinite(row[metric]) for metric in READING_METRICS):
+                raise ValueError("metrics must be finite numbers")
+        except (KeyError, TypeError, ValueError) as e:
+            # Rejected here, one bad payload cannot fail a whole batch's INSERT
+            with self._lock:
+                self._rejected += 1
+            raise InvalidReading(f"Invalid reading {data!r}: {e}") from e
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            return False
+
+    def is_saturated(self) -> bool:
+        """True when the queue is full and submit() would drop."""
+        return self._queue.full()
+
+    def stats(self) -> dict[str, Any]:
+        """Snapshot of queue depth and flush statistics."""
+        with self._lock:
+            return {
+                "running": bool(self._thread and self._thread.is_alive()),
+                "queue_depth": self._queue.qsize(),
+                "queue_max": self._queue.maxsize,
+                "batch_size": self.batch_size,
+                "flush_interval_ms": round(self.flush_interval * 1000),
+                "flushes": self._flushes,
+                "rows_written": self._rows_written,
+                "dropped": self._dropped,
+                "rejected": self._rejected,
+                "failed_flushes": self._failed,
+                "rows_lost": self._rows_lost,
+                "last_flush_rows": self._last_flush_rows,
+                "last_flush_ms": round(self._last_flush_ms, 2),
+                "max_flush_ms": round(self._max_flush_ms, 2),
+                "last_flush_at": self._last_flush_at.isoformat() if self._last_flush_at else None,
+            }
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def _collect(self) -> tuple[list[dict[str, Any]], bool]:
+        """Block for the first row, then gather until the batch is full or the interval expires."""
+        batch: list[dict[str, Any]] = []
+        try:
+            item = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return batch, False
+        if item is _STOP:
+            return batch, True
+        batch.append(item)
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _flush(self, batch: list[dict[str, Any]]) -> None:
+        """Write a batch; if it fails, bisect it so the valid rows are still saved."""
+        if self._write(batch):
+            return
+        if len(batch) == 1:
+            with self._lock:
+                self._rows_lost += 1
+            return
+        middle = len(batch) // 2
+        self._flush(batch[:middle])
+        self._flush(batch[middle:])
+
+    def _write(self, batch: list[dict[str, Any]]) -> bool:
+        """Persist one batch in a single transaction. Returns False if it was rolled back."""
+        started = time.perf_counter()
+        # Rule state (hysteresis, rate history) must not move on for a batch that is not persisted
+        checkpoint = alert_engine.checkpoint(batch) if settings.alert_rules_enabled else None
+        db = WriteSessionLocal()
+        try:
+            # One multi-row INSERT ... RETURNING instead of add/commit/refresh per row
+            ids = db.scalars(
+                insert(SensorReading).returning(SensorReading.id, sort_by_parameter_order=True),
+                batch,
+            ).all()
+            apply_rollups(db, batch)
+            alerts = alert_engine.evaluate(batch) if checkpoint is not None else []
+            created, updated = alert_store.record(db, alerts)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            if checkpoint is not None:
+                alert_engine.restore(checkpoint)
+            with self._lock:
+                self._failed += 1
+            print(f"[INGEST] Error persisting batch of {len(batch)}: {e}")
+            return False
+        finally:
+            db.close()
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._flushes += 1
+            self._rows_written += len(batch)
+            self._last_flush_rows = len(batch)
+            self._last_flush_ms = elapsed_ms
+            self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+            self._last_flush_at = datetime.now()
+
+        for row, reading_id in zip(batch, ids):
+            row["id"] = reading_id
+        latest_cache.update(batch)
+        self._dispatch(batch, created, updated)
+        return True
+
+    def _dispatch(self, batch: list[dict[str, Any]], created: list[dict[str, Any]], updated: list[dict[str, Any]]) -> None:
+        """Hand the persisted batch and any alerts it raised to the event loop for WebSocket broadcast."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        if settings.irrigation_enabled:
+            self._loop.call_soon_threadsafe(irrigation.observe, batch)
+        asyncio.run_coroutine_threadsafe(_broadcast_batch(batch, created, updated), self._loop)
+
+
+async def _broadcast_batch(
+    batch: list[dict[str, Any]],
+    created: list[dict[str, Any]],
+    updated: list[dict[str, Any]],
+) -> None:
+    # Imported here: the routers package imports this module for its stats endpoint
+    from ..routers.websocket import broadcast_sensor_reading, broadcast_alert_changes
+
+    for row in batch:
+        reading_data = {
+            "id": row["id"],  # Database ID
+            "sensorId": row["sensor_id"],  # Hardware sensor ID
+            "timestamp": row["timestamp"].isoformat(),  # Local time, not UTC
+            "moisture": row["moisture"],
+            "temperature": row["temperature"],
+            "humidity": row["humidity"],
+            "ph": row["ph"],
+            "zone": row["zone"],
+        }
+        try:
+            await broadcast_sensor_reading(reading_data)
+        except Exception as e:
+            print(f"[INGEST] Error broadcasting reading: {e}")
+
+    try:
+        await broadcast_alert_changes(created, updated)
+    except Exception as e:
+        print(f"[INGEST] Error broadcasting alerts: {e}")
+
+
+# Create singleton instance
+ingest_writer = IngestWriter()
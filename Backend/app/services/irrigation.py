@@ -0,0 +1,240 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import os
+import time
+from datetime import datetime
+from typing import Any, Iterable, Optional
+from ..config import settings
+
+try:
+    import RPi.GPIO as GPIO
+except (ImportError, RuntimeError):  # RPi.GPIO is optional and refuses to import off a Raspberry Pi
+    GPIO = None
+
+DEFAULT_PIN_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "pinconfig.json")
+
+
+class GPIOBackend(ABC):
+    """Drives output pins. Subclasses talk to real hardware or just record state."""
+
+    name = "base"
+
+    @abstractmethod
+    def setup(self, pin: int) -> None:
+        """Configure a pin as an output, initially off."""
+
+    @abstractmethod
+    def write(self, pin: int, on: bool) -> None:
+        """Switch a pin on or off."""
+
+    def cleanup(self) -> None:
+        pass
+
+
+class SimulatedGPIO(GPIOBackend):
+    """In-memory pins for development and tests on any machine."""
+
+    name = "simulated"
+
+    def __init__(self) -> None:
+        self.pins: dict[int, bool] = {}
+        self.history: list[tuple[float, int, bool]] = []  # (monotonic time, pin, on)
+
+    def setup(self, pin: int) -> None:
+        self.pins[pin] = False
+
+    def write(self, pin: int, on: bool) -> None:
+        self.pins[pin] = on
+        self.history.append((time.monotonic(), pin, on))
+        print(f"[GPIO] (simulated) pin {pin} -> {'ON' if on else 'OFF'}")
+
+    def cleanup(self) -> None:
+        for pin in self.pins:
+            self.pins[pin] = False
+
+
+class RPiGPIO(GPIOBackend):
+    """Raspberry Pi pins via RPi.GPIO, BCM numbering."""
+
+    name = "rpi"
+
+    def __init__(self) -> None:
+        if GPIO is None:
+            raise RuntimeError("RPi.GPIO is not available on this machine")
+        GPIO.setwarnings(False)
+        GPIO.setmode(GPIO.BCM)
+
+    def setup(self, pin: int) -> None:
+        GPIO.setup(pin, GPIO.OUT, initial=GPIO.LOW)
+
+    def write(self, pin: int, on: bool) -> None:
+        GPIO.output(pin, GPIO.HIGH if on else GPIO.LOW)
+
+    def cleanup(self) -> None:
+        GPIO.cleanup()
+
+
+def create_backend(name: str = settings.irrigation_gpio_backend) -> GPIOBackend:
+    """Build the configured backend, falling back to simulated pins when the hardware is missing."""
+    if name == "rpi":
+        try:
+            return RPiGPIO()
+        except RuntimeError as e:
+            print(f"[IRRIGATION] {e}; using simulated GPIO")
+    return SimulatedGPIO()
+
+
+class IrrigationController:
+    """
+    Waters modules listed in pinconfig.json without ever blocking ingest.
+
+    Readings are observed on the event loop. A module's sprinkler turns on
+    only after debounce_readings consecutive readings below the humidity
+    threshold. Each watering is an asyncio task: it waits for one of
+    max_concurrent valve slots (pump pressure), holds the valve open for
+    water_s, closes it and leaves the module in cooldown for cooldown_s.
+    Low readings that arrive while a module is queued, watering or cooling
+    down are ignored.
+    """
+
+    def __init__(
+        self,
+        pin_config_path: str = settings.irrigation_pin_config or DEFAULT_PIN_CONFIG_PATH,
+        humidity_threshold: float = settings.irrigation_humidity_threshold,
+        debounce_readings: int = settings.irrigation_debounce_readings,
+        water_s: float = settings.irrigation_water_s,
+        cooldown_s: float = settings.irrigation_cooldown_s,
+        max_concurrent: int = settings.irrigation_max_concurrent_valves,
+    ) -> None:
+        self.pin_config_path = pin_config_path
+        self.humidity_threshold = humidity_threshold
+        self.debounce_readings = max(1, debounce_readings)
+        self.water_s = water_s
+        self.cooldown_s = cooldown_s
+        self.max_concurrent = max(1, max_concurrent)
+        self.backend: Optional[GPIOBackend] = None
+        self.modules: dict[int, dict[str, int]] = {}  # sensor id -> {"sprinkler": pin, "pipe": pin}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._state: dict[int, str] = {}  # 'idle', 'queued', 'watering' or 'cooldown'
+        self._low_streak: dict[int, int] = {}
+        self._cooldown_until: dict[int, float] = {}
+        self._last_watered: dict[int, datetime] = {}
+        self._stats = {"waterings": 0, "debounced": 0}
+
+    def load(self, backend: Optional[GPIOBackend] = None) -> None:
+        """Read pinconfig.json and set every configured pin up as a low output."""
+        self.backend = backend or create_backend()
+        with open(self.pin_config_path, "r") as file:
+            config = json.load(file)
+        self.modules = {int(sensor_id): pins for sensor_id, pins in config.items()}
+        for pins in self.modules.values():
+            for pin in pins.values():
+                self.backend.setup(pin)
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._state = {sensor_id: "idle" for sensor_id in self.modules}
+        print(
+            f"[IRRIGATION] {len(self.modules)} modules from {self.pin_config_path} "
+            f"({self.backend.name} GPIO, max {self.max_concurrent} valves)"
+        )
+
+    def observe(self, readings: Iterable[dict[str, Any]]) -> None:
+        """Feed readings (sensor_id, humidity); starts watering where a low streak is long enough."""
+        for reading in readings:
+            sensor_id = reading["sensor_id"]
+            if sensor_id not in self.modules:
+                continue
+            if reading["humidity"] >= self.humidity_threshold:
+                self._low_streak[sensor_id] = 0
+                continue
+            self._low_streak[sensor_id] = self._low_streak.get(sensor_id, 0) + 1
+            if self._low_streak[sensor_id] < self.debounce_readings:
+                continue
+            if not self.start(sensor_id):
+                self._stats["debounced"] += 1
+
+    def start(self, sensor_id: int, seconds: Optional[float] = None) -> bool:
+        """
+        Schedule a watering (must run on the event loop).
+
+        Returns:
+            False if the module is unknown, or already queued, watering or cooling down
+        """
+        if sensor_id not in self.modules or self.backend is None:
+            return False
+        if sensor_id in self._tasks or time.monotonic() < self._cooldown_until.get(sensor_id, 0):
+            return False
+        self._low_streak[sensor_id] = 0
+        self._state[sensor_id] = "queued"
+        self._tasks[sensor_id] = asyncio.create_task(self._water(sensor_id, seconds or self.water_s))
+        return True
+
+    def stop(self, sensor_id: int) -> bool:
+        """Cancel a queued or running watering; the valve is closed straight away."""
+        task = self._tasks.get(sensor_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    async def _water(self, sensor_id: int, seconds: float) -> None:
+        pin = self.modules[sensor_id]["sprinkler"]
+        opened = False
+        try:
+            async with self._slots:
+                self._state[sensor_id] = "watering"
+                self._last_watered[sensor_id] = datetime.now()
+                self._stats["waterings"] += 1
+                print(f"[IRRIGATION] Watering module {sensor_id} for {seconds:g}s")
+                self.backend.write(pin, True)
+                opened = True
+                try:
+                    await asyncio.sleep(seconds)
+                finally:
+                    self.backend.write(pin, False)
+        finally:
+            self._tasks.pop(sensor_id, None)
+            if opened:
+                self._cooldown_until[sensor_id] = time.monotonic() + self.cooldown_s
+                self._state[sensor_id] = "cooldown" if self.cooldown_s > 0 else "idle"
+            else:
+                self._state[sensor_id] = "idle"  # Cancelled while queued; nothing was watered
+
+    def status(self) -> dict[str, Any]:
+        now = time.monotonic()
+        modules = []
+        for sensor_id, pins in self.modules.items():
+            state = self._state.get(sensor_id, "idle")
+            if state == "cooldown" and now >= self._cooldown_until.get(sensor_id, 0):
+                state = self._state[sensor_id] = "idle"
+            watered = self._last_watered.get(sensor_id)
+            modules.append({
+                "sensor_id": sensor_id,
+                "state": state,
+                "pins": pins,
+                "low_streak": self._low_streak.get(sensor_id, 0),
+                "last_watered": watered.isoformat() if watered else None,
+            })
+        return {
+            "backend": self.backend.name if self.backend else None,
+            "max_concurrent_valves": self.max_concurrent,
+            "open_valves": sum(1 for state in self._state.values() if state == "watering"),
+            "humidity_threshold": self.humidity_threshold,
+            "modules": modules,
+            **self._stats,
+        }
+
+    async def shutdown(self) -> None:
+        """Cancel all waterings (closing their valves) and release the pins."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self.backend is not None:
+            self.backend.cleanup()
+
+
+# Create singleton instance
+irrigation = IrrigationController()
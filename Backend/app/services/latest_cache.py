@@ -0,0 +1,82 @@
+import threading
+from typing import Any, Iterable, Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from ..models import SensorReading
+
+READING_FIELDS = ("id", "timestamp", "sensor_id", "moisture", "temperature", "humidity", "ph", "zone")
+
+
+class LatestReadingCache:
+    """
+    Process-wide newest reading per sensor and per zone.
+
+    Kept current by the ingest path (writer thread and POST endpoint) and
+    warmed from the DB at startup, so dashboard polling never hits SQLite.
+    Entries are plain dicts shaped like SensorReadingResponse.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._by_sensor: dict[int, dict[str, Any]] = {}
+        self._by_zone: dict[str, dict[str, Any]] = {}
+
+    def update(self, rows: Iterable[dict[str, Any]]) -> None:
+        """Record persisted readings (must include their DB id); newer timestamps win."""
+        with self._lock:
+            for row in rows:
+                reading = {field: row.get(field) for field in READING_FIELDS}
+                self._keep_newest(self._by_sensor, reading["sensor_id"], reading)
+                self._keep_newest(self._by_zone, reading["zone"], reading)
+
+    @staticmethod
+    def _keep_newest(index: dict, key: Any, reading: dict[str, Any]) -> None:
+        current = index.get(key)
+        if current is None or (reading["timestamp"], reading["id"]) >= (current["timestamp"], current["id"]):
+            index[key] = reading
+
+    def for_zone(self, zone: str) -> Optional[dict[str, Any]]:
+        return self._by_zone.get(zone)
+
+    def for_sensor(self, sensor_id: int) -> Optional[dict[str, Any]]:
+        return self._by_sensor.get(sensor_id)
+
+    def all_sensors(self, zone: Optional[str] = None) -> list[dict[str, Any]]:
+        with self._lock:
+            readings = list(self._by_sensor.values())
+        if zone:
+            readings = [r for r in readings if r["zone"] == zone]
+        return sorted(readings, key=lambda r: r["sensor_id"])
+
+    def warm(self, db: Session) -> None:
+        """Load the newest reading per sensor and per zone from the DB."""
+        with self._lock:
+            self._by_sensor.clear()
+            self._by_zone.clear()
+        for column in (SensorReading.sensor_id, SensorReading.zone):
+            self.update(self._load_latest(db, column))
+        print(f"[CACHE] Latest readings warmed for {len(self._by_sensor)} sensors, {len(self._by_zone)} zones")
+
+    def refresh(self, db: Session, sensor_id: int, zone: str) -> None:
+        """Re-read one sensor and zone from the DB, e.g. after their cached reading was deleted."""
+        with self._lock:
+            self._by_sensor.pop(sensor_id, None)
+            self._by_zone.pop(zone, None)
+        self.update(self._load_latest(db, SensorReading.sensor_id, sensor_id))
+        self.update(self._load_latest(db, SensorReading.zone, zone))
+
+    @staticmethod
+    def _load_latest(db: Session, column, value: Any = None) -> list[dict[str, Any]]:
+        newest = select(column.label("key"), func.max(SensorReading.timestamp).label("ts"))
+        if value is not None:
+            newest = newest.where(column == value)
+        newest = newest.group_by(column).subquery()
+
+        query = select(*(getattr(SensorReading, f) for f in READING_FIELDS)).join(
+            newest, (column == newest.c.key) & (SensorReading.timestamp == newest.c.ts)
+        )
+        return [row._asdict() for row in db.execute(query)]
+
+
+# Create singleton instance
+latest_cache = LatestReadingCache()
@@ -0,0 +1,153 @@
+import asyncio
+import heapq
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Iterable, Optional
+from ..config import settings
+
+
+def parse_timeout_overrides(spec: str) -> dict[int, float]:
+    """Parse "sensor_id:seconds,..." (e.g. "3:120,7:600") into per-sensor timeouts."""
+    overrides = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        try:
+            sensor_id, seconds = item.split(":")
+            overrides[int(sensor_id)] = float(seconds)
+        except ValueError:
+            print(f"[LIVENESS] Ignoring invalid timeout override '{item.strip()}'")
+    return overrides
+
+
+class LivenessTracker:
+    """
+    Tracks which sensors are online, firing offline events at their exact deadline.
+
+    Each online sensor has one entry in a min-heap of deadlines. A reading
+    only moves the sensor's deadline in a dict (O(1)); when its heap entry
+    comes due and the real deadline has since moved on, the entry is
+    re-armed at the real deadline instead (O(log n)). So the heap never
+    holds more than one live entry per sensor, and run() sleeps exactly
+    until the earliest deadline instead of polling.
+
+    last_seen holds naive UTC datetimes; online is True/False per known sensor.
+    """
+
+    def __init__(
+        self,
+        default_timeout_s: float = settings.sensor_timeout_s,
+        overrides: Optional[dict[int, float]] = None,
+    ) -> None:
+        self.default_timeout_s = default_timeout_s
+        self.overrides = parse_timeout_overrides(settings.sensor_timeout_overrides) if overrides is None else overrides
+        self.last_seen: dict[int, datetime] = {}
+        self.online: dict[int, bool] = {}
+        self._seen_at: dict[int, float] = {}  # sensor -> epoch seconds of its last reading
+        self._deadline: dict[int, float] = {}  # sensor -> epoch seconds it goes offline
+        self._armed: dict[int, float] = {}  # sensor -> deadline of its live heap entry
+        self._heap: list[tuple[float, int]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def timeout_for(self, sensor_id: int) -> float:
+        return self.overrides.get(sensor_id, self.default_timeout_s)
+
+    def seen(self, sensor_id: int, at: Optional[float] = None) -> bool:
+        """
+        Record a reading from a sensor (at = epoch seconds, default now).
+
+        Returns:
+            True if the sensor was offline or unknown and is now online
+        """
+        at = time.time() if at is None else at
+        came_online = not self.online.get(sensor_id, False)
+        self.last_seen[sensor_id] = datetime.utcfromtimestamp(at)
+        self.online[sensor_id] = True
+        self._seen_at[sensor_id] = at
+        self._deadline[sensor_id] = at + self.timeout_for(sensor_id)
+        if sensor_id not in self._armed:
+            self._arm(sensor_id)
+        return came_online
+
+    def set_timeout(self, sensor_id: int, timeout_s: Optional[float]) -> None:
+        """Override one sensor's timeout (None restores the default); takes effect immediately."""
+        if timeout_s is None:
+            self.overrides.pop(sensor_id, None)
+        else:
+            self.overrides[sensor_id] = timeout_s
+        if sensor_id in self._deadline:
+            self._deadline[sensor_id] = self._seen_at[sensor_id] + self.timeout_for(sensor_id)
+            if self._deadline[sensor_id] < self._armed.get(sensor_id, float("inf")):
+                self._arm(sensor_id)  # Sooner than the live entry; the old one goes stale
+
+    def _arm(self, sensor_id: int) -> None:
+        deadline = self._deadline[sensor_id]
+        self._armed[sensor_id] = deadline
+        heapq.heappush(self._heap, (deadline, sensor_id))
+        if self._wakeup is not None and self._heap[0] == (deadline, sensor_id):
+            self._wakeup.set()  # New earliest deadline; re-plan the sleep
+
+    def expire(self, now: Optional[float] = None) -> list[int]:
+        """Pop every due deadline and return the sensors that just went offline."""
+        now = time.time() if now is None else now
+        offline = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, sensor_id = heapq.heappop(self._heap)
+            if self._armed.get(sensor_id) != deadline:
+                continue  # Superseded by a sooner entry
+            if self._deadline[sensor_id] > now:
+                self._arm(sensor_id)  # Readings arrived since; wait for the real deadline
+                continue
+            del self._armed[sensor_id]
+            del self._deadline[sensor_id]
+            self.online[sensor_id] = False
+            offline.append(sensor_id)
+        return offline
+
+    async def run(self, on_offline: Callable[[int], Awaitable[Any]]) -> None:
+        """Sleep until the earliest deadline (or until an earlier one is armed) and report expiries."""
+        self._wakeup = asyncio.Event()
+        while True:
+            delay = self._heap[0][0] - time.time() if self._heap else None
+            if delay is None or delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            for sensor_id in self.expire():
+                try:
+                    await on_offline(sensor_id)
+                except Exception as e:
+                    print(f"[LIVENESS] Error reporting sensor {sensor_id} offline: {e}")
+
+    def restore(self, readings: Iterable[dict[str, Any]]) -> None:
+        """
+        Seed state from each sensor's newest stored reading (local-time timestamps),
+        so sensors show as online/offline with their real last-seen time after a restart.
+        """
+        now = time.time()
+        for reading in readings:
+            at = reading["timestamp"].timestamp()
+            if at + self.timeout_for(reading["sensor_id"]) > now:
+                self.seen(reading["sensor_id"], at)
+            else:
+                self.last_seen[reading["sensor_id"]] = datetime.utcfromtimestamp(at)
+                self.online[reading["sensor_id"]] = False
+        online = sum(self.online.values())
+        print(f"[LIVENESS] Restored {len(self.online)} sensors ({online} online, {len(self.online) - online} offline)")
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "sensors": len(self.online),
+            "online": sum(self.online.values()),
+            "default_timeout_s": self.default_timeout_s,
+            "overrides": self.overrides,
+            "heap_size": len(self._heap),
+            "next_deadline_in_s": round(self._heap[0][0] - time.time(), 3) if self._heap else None,
+        }
+
+
+# Create singleton instance
+sensor_liveness = LivenessTracker()
@@ -0,0 +1,218 @@
+import asyncio
+import random
+import socket
+from typing import Any, Optional
+import paho.mqtt.client as mqtt
+from ..config import settings
+from .ingest_writer import ingest_writer
+from .mqtt_listener import MQTT_HOST, MQTT_PORT, MQTT_USER, MQTT_PASSWORD, MQTT_TOPICS
+from .payload_decoder import decode_payload
+
+
+class AsyncMQTTListener:
+    """
+    MQTT ingest driven by the FastAPI event loop.
+
+    Instead of paho's ``loop_start`` thread, the client socket is registered
+    with the running loop (``add_reader``/``add_writer``) and a single
+    supervisor task owns the connection, reconnecting with exponential
+    backoff. Decoded readings go through a bounded queue; when it fills up
+    the socket reader is paused so TCP flow control pushes back on the broker.
+    """
+
+    def __init__(
+        self,
+        queue_max: int = settings.mqtt_ingest_queue_max,
+        reconnect_min: float = settings.mqtt_reconnect_min_s,
+        reconnect_max: float = settings.mqtt_reconnect_max_s,
+    ) -> None:
+        self.queue_max = max(1, queue_max)
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = max(reconnect_min, reconnect_max)
+        self.is_connected = False
+
+        self.client = mqtt.Client()
+        self.client.username_pw_set(MQTT_USER, MQTT_PASSWORD)
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._disconnected: Optional[asyncio.Event] = None
+        self._supervisor: Optional[asyncio.Task] = None
+        self._consumer: Optional[asyncio.Task] = None
+        self._misc: Optional[asyncio.Task] = None
+        self._fd: Optional[int] = None
+        self._paused = False
+        self._shutdown = False
+        self.dropped = 0
+
+    async def start(self) -> None:
+        """Start the connection supervisor and the queue consumer."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_max)
+        self._disconnected = asyncio.Event()
+        self._shutdown = False
+        self._consumer = asyncio.create_task(self._consume())
+        self._supervisor = asyncio.create_task(self._supervise())
+        print("[MQTT] Asyncio ingest started")
+
+    async def shutdown(self) -> None:
+        """Disconnect and stop background tasks, handing queued readings to the writer."""
+        self._shutdown = True
+        if self.is_connected:
+            self.client.disconnect()
+        for task in (self._supervisor, self._misc):
+            if task:
+                task.cancel()
+        if self._fd is not None:
+            self._on_socket_close(self.client, None, None)
+        if self._consumer:
+            # Drain what was already accepted before stopping the consumer
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=10)
+            except asyncio.TimeoutError:
+                print(f"[MQTT] Gave up draining {self._queue.qsize()} queued readings")
+            self._consumer.cancel()
+        print("[MQTT] Disconnected")
+
+    async def _supervise(self) -> None:
+        """Own the single broker connection and reconnect with exponential backoff."""
+        delay = self.reconnect_min
+        while not self._shutdown:
+            self._disconnected.clear()
+            try:
+                print(f"[MQTT] Attempting to connect to {MQTT_HOST}:{MQTT_PORT}...")
+                # connect() resolves and opens the TCP socket synchronously; keep it off the loop
+                await self._loop.run_in_executor(None, self.client.connect, MQTT_HOST, MQTT_PORT, 60)
+                await self._disconnected.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[MQTT] Connection failed: {e}")
+
+            if self._shutdown:
+                break
+            if self.is_connected:
+                delay = self.reconnect_min
+            self.is_connected = False
+            sleep_for = delay * random.uniform(0.5, 1.0)
+            print(f"[MQTT] Reconnecting in {sleep_for:.1f} seconds...")
+            await asyncio.sleep(sleep_for)
+            delay = min(delay * 2, self.reconnect_max)
+
+    async def _consume(self) -> None:
+        """Move readings from the loop queue into the batched DB writer."""
+        while True:
+            data = await self._queue.get()
+            try:
+                while ingest_writer.is_saturated():
+                    # Hold this reading and let our own queue fill up until the writer catches up
+                    await asyncio.sleep(ingest_writer.flush_interval)
+                ingest_writer.submit(data)
+            except Exception as e:
+                print(f"[MQTT] Invalid reading {data}: {e}")
+            finally:
+                self._queue.task_done()
+            if self._paused and self._queue.qsize() <= self.queue_max // 2:
+                self._resume_reading()
+
+    async def _misc_loop(self) -> None:
+        """Drive paho's keepalive/ping handling."""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+    def on_connect(self, client: mqtt.Client, userdata: Any, flags: Any, rc: int) -> None:
+        if rc == 0:
+            print("[MQTT] Connected successfully!")
+            self.is_connected = True
+            client.subscribe([(topic, 0) for topic in MQTT_TOPICS])
+            print(f"[MQTT] Subscribed to topics: {', '.join(MQTT_TOPICS)}")
+        else:
+            print(f"[MQTT] Connection failed with code: {rc}")
+            self.is_connected = False
+            self._disconnected.set()
+
+    def on_disconnect(self, client: mqtt.Client, userdata: Any, rc: int) -> None:
+        print(f"[MQTT] Disconnected (rc={rc})")
+        self._disconnected.set()
+
+    def on_message(self, client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage) -> None:
+        try:
+            data = decode_payload(msg.topic, msg.payload)
+            data.setdefault('ph', 0)  # Text payloads from boards without a pH probe omit it
+        except Exception as exc:
+            print(f"[MQTT] Invalid payload on '{msg.topic}' {msg.payload!r}: {exc}")
+            return
+
+        try:
+            self._queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.dropped += 1
+        if self._queue.full():
+            self._pause_reading()
+
+    # Socket registration (paho external loop API). connect() runs in an
+    # executor, so callbacks may arrive off-loop and are marshalled back.
+
+    def _call_in_loop(self, fn, *args) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            fn(*args)
+        else:
+            self._loop.call_soon_threadsafe(fn, *args)
+
+    def _on_socket_open(self, client: mqtt.Client, userdata: Any, sock: socket.socket) -> None:
+        # Capture the fd now: by the time a marshalled close runs, the socket may already be closed
+        fd = sock.fileno()
+
+        def register() -> None:
+            self._fd = fd
+            self._paused = False
+            self._loop.add_reader(fd, client.loop_read)
+            self._misc = self._loop.create_task(self._misc_loop())
+        self._call_in_loop(register)
+
+    def _on_socket_close(self, client: mqtt.Client, userdata: Any, sock: socket.socket) -> None:
+        def unregister() -> None:
+            if self._fd is None:
+                return
+            self._loop.remove_reader(self._fd)
+            self._loop.remove_writer(self._fd)
+            self._fd = None
+            if self._misc:
+                self._misc.cancel()
+                self._misc = None
+        self._call_in_loop(unregister)
+
+    def _on_socket_register_write(self, client: mqtt.Client, userdata: Any, sock: socket.socket) -> None:
+        fd = sock.fileno()
+        self._call_in_loop(self._loop.add_writer, fd, client.loop_write)
+
+    def _on_socket_unregister_write(self, client: mqtt.Client, userdata: Any, sock: socket.socket) -> None:
+        fd = sock.fileno()
+        self._call_in_loop(self._loop.remove_writer, fd)
+
+    def _pause_reading(self) -> None:
+        if not self._paused and self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._paused = True
+            print("[MQTT] Ingest queue full, pausing socket reads")
+
+    def _resume_reading(self) -> None:
+        if self._paused and self._fd is not None:
+            self._loop.add_reader(self._fd, self.client.loop_read)
+            print("[MQTT] Ingest queue drained, resuming socket reads")
+        self._paused = False
+
+
+# Create singleton instance
+async_mqtt_listener = AsyncMQTTListener()
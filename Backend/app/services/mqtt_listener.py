@@ -1,19 +1,17 @@
 import json
 from typing import Any
-import asyncio
 import threading
 import time
 import paho.mqtt.client as mqtt
-from ..database import SessionLocal
-from ..models import SensorReading
-from ..routers.websocket import broadcast_sensor_reading
-import ast
+from .ingest_writer import ingest_writer
+from .payload_decoder import BINARY_TOPICS, decode_payload
 
 MQTT_HOST = "smart.local"
 MQTT_PORT = 1883
 MQTT_USER = "esp32"
 MQTT_PASSWORD = "sensormod"
 MQTT_TOPIC = "AgriMonitor"
+MQTT_TOPICS = [MQTT_TOPIC, *sorted(BINARY_TOPICS)]
 
 class MQTTListener:
     def __init__(self) -> None:
@@ -64,8 +62,8 @@ class MQTTListener:
         if rc == 0:
             print(f"[MQTT] Connected successfully!")
             self.is_connected = True
-            client.subscribe(MQTT_TOPIC)
-            print(f"[MQTT] Subscribed to topic: {MQTT_TOPIC}")
+            client.subscribe([(topic, 0) for topic in MQTT_TOPICS])
+            print(f"[MQTT] Subscribed to topics: {', '.join(MQTT_TOPICS)}")
         else:
             print(f"[MQTT] Connection failed with code: {rc}")
             self.is_connected = False
@@ -80,56 +78,17 @@ class MQTTListener:
             threading.Thread(target=self._connect_with_retry, daemon=True).start()
 
     def on_message(self, client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage) -> None:
-        msg_payload = msg.payload.decode("utf-8")
         try:
-            data = ast.literal_eval(msg_payload)
+            data = decode_payload(msg.topic, msg.payload)
             print(data)
-            data['ph']=0 #Remove this line when ph sensor is available
+            data.setdefault('ph', 0)  # Text payloads from boards without a pH probe omit it
             self.persist_reading(data)
         except Exception as exc:
-            print(f"[MQTT] Invalid payload '{msg_payload}': {exc}")
+            print(f"[MQTT] Invalid payload on '{msg.topic}' {msg.payload!r}: {exc}")
 
     def persist_reading(self, data: dict[str, Any]) -> None:
-        db = SessionLocal()
-        try:
-            reading = SensorReading(
-                sensor_id=data.get("id", 1),  # Hardware sensor ID from MQTT
-                moisture=data["moisture"],
-                temperature=data["temperature"],
-                humidity=data["humidity"],
-                ph=data["ph"],
-                zone=data.get("zone", "main"),
-            )
-            db.add(reading)
-            db.commit()
-            db.refresh(reading)
-
-            # Broadcast to WebSocket clients
-            # Use local time for display consistency
-            from datetime import datetime
-            reading_data = {
-                "id": reading.id,  # Database ID
-                "sensorId": reading.sensor_id,  # Hardware sensor ID
-                "timestamp": datetime.now().isoformat(),  # Use local time, not UTC
-                "moisture": reading.moisture,
-                "temperature": reading.temperature,
-                "humidity": reading.humidity,
-                "ph": reading.ph,
-                "zone": reading.zone,
-            }
-            
-            print(f"[MQTT] Broadcasting reading: {reading_data}")
-            
-            # Create task to broadcast (don't block MQTT thread)
-            try:
-                loop = asyncio.get_event_loop()
-                loop.create_task(broadcast_sensor_reading(reading_data))
-            except RuntimeError:
-                # If no event loop in thread, use asyncio.run
-                asyncio.run(broadcast_sensor_reading(reading_data))
-        except Exception as e:
-            print(f"[MQTT] Error persisting reading: {e}")
-        finally:
-            db.close()
+        """Hand the reading to the batched writer; persistence and broadcast happen there."""
+        if not ingest_writer.submit(data):
+            print(f"[MQTT] Ingest queue full, dropped reading from sensor {data.get('id', 1)}")
 
 mqtt_listener = MQTTListener()
\ No newline at end of file
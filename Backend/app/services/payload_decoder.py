@@ -0,0 +1,107 @@
+import ast
+import struct
+from typing import Any
+from ..config import settings
+
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+    _JSONDecodeError: tuple = (orjson.JSONDecodeError,)
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    import json
+
+    _json_loads = json.loads
+    _JSONDecodeError = (json.JSONDecodeError, UnicodeDecodeError)
+
+
+# Fixed-layout binary frame, little-endian (ESP32 native byte order):
+#   uint16 id | float32 moisture | float32 temperature | float32 humidity | float32 ph | uint8 zone code
+BINARY_FRAME = struct.Struct("<HffffB")
+
+BINARY_TOPICS = frozenset(t.strip() for t in settings.mqtt_binary_topics.split(",") if t.strip())
+ZONE_CODES = [z.strip() for z in settings.sensor_zone_codes.split(",") if z.strip()]
+
+
+class PayloadError(ValueError):
+    """Raised when an MQTT payload cannot be decoded into a sensor reading."""
+
+
+def zone_for_code(code: int) -> str:
+    """Map a binary frame zone code to its configured zone name."""
+    if code < len(ZONE_CODES):
+        return ZONE_CODES[code]
+    return f"zone_{code}"
+
+
+def code_for_zone(zone: str) -> int:
+    """Inverse of zone_for_code, for encoding frames."""
+    if zone in ZONE_CODES:
+        return ZONE_CODES.index(zone)
+    if zone.startswith("zone_") and zone[5:].isdigit():
+        return int(zone[5:])
+    raise PayloadError(f"Zone '{zone}' has no binary code")
+
+
+def decode_binary(payload: bytes) -> dict[str, Any]:
+    """Decode a struct-packed sensor frame."""
+    if len(payload) != BINARY_FRAME.size:
+        raise PayloadError(f"Binary frame must be {BINARY_FRAME.size} bytes, got {len(payload)}")
+    sensor_id, moisture, temperature, humidity, ph, zone_code = BINARY_FRAME.unpack(payload)
+    # float32 on the wire; round away the representation noise (22.1 -> 22.100000381)
+    return {
+        "id": sensor_id,
+        "moisture": round(moisture, 2),
+        "temperature": round(temperature, 2),
+        "humidity": round(humidity, 2),
+        "ph": round(ph, 2),
+        "zone": zone_for_code(zone_code),
+    }
+
+
+def encode_binary(data: dict[str, Any]) -> bytes:
+    """Pack a reading into the binary frame (used by simulators and tests)."""
+    return BINARY_FRAME.pack(
+        data.get("id", 1),
+        data["moisture"],
+        data["temperature"],
+        data["humidity"],
+        data.get("ph", 0),
+        code_for_zone(data.get("zone", "main")),
+    )
+
+
+def decode_text(payload: bytes) -> dict[str, Any]:
+    """
+    Decode a JSON payload, falling back to a Python dict literal for
+    older firmware when MQTT_ACCEPT_LITERAL_PAYLOADS is enabled.
+    """
+    try:
+        data = _json_loads(payload)
+    except _JSONDecodeError as e:
+        if not settings.mqtt_accept_literal_payloads:
+            raise PayloadError(f"Invalid JSON payload: {e}") from e
+        try:
+            data = ast.literal_eval(payload.decode("utf-8"))
+        except (ValueError, SyntaxError, UnicodeDecodeError) as e:
+            raise PayloadError(f"Invalid payload: {e}") from e
+
+    if not isinstance(data, dict):
+        raise PayloadError(f"Payload must be an object, got {type(data).__name__}")
+    return data
+
+
+def decode_payload(topic: str, payload: bytes) -> dict[str, Any]:
+    """
+    Decode an MQTT payload into a reading dict, choosing the format by topic.
+
+    Args:
+        topic: MQTT topic the message arrived on
+        payload: Raw message bytes
+
+    Returns:
+        Dict with id, moisture, temperature, humidity, ph and zone keys
+    """
+    if topic in BINARY_TOPICS:
+        return decode_binary(payload)
+    return decode_text(payload)
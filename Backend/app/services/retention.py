@@ -0,0 +1,263 @@
+import asyncio
+import csv
+import gzip
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from sqlalchemy import delete, func, select, tuple_
+from ..config import settings
+from ..database import SessionLocal, WriteSessionLocal, write_engine
+from ..models import SensorReading, Alert, SensorRollupMinute
+from .alert_store import alert_counters
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Listed in requirements.txt; without it archives fall back to gzipped CSV
+    pa = None
+    pq = None
+
+ARCHIVE_COLUMNS = ("id", "timestamp", "sensor_id", "zone", "moisture", "temperature", "humidity", "ph")
+
+
+def _month_start(timestamp: datetime) -> datetime:
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+class RetentionJob:
+    """
+    Archives and purges raw sensor readings older than the retention window.
+
+    Only whole months are archived, one columnar file per month (Parquet with
+    zstd; gzipped CSV if pyarrow is missing). Rows are deleted
+    afterwards in small chunks, each its own short transaction with a pause in
+    between, so the MQTT writer is never locked out for long. Hour rollups
+    are left alone, so long-window stats keep covering archived months.
+    Resolved alerts and minute rollups past their own retention windows are
+    purged the same way.
+    """
+
+    def __init__(
+        self,
+        retention_days: int = settings.retention_days,
+        alert_retention_days: int = settings.alert_retention_days,
+        minute_rollup_retention_days: int = settings.rollup_minute_retention_days,
+        archive_dir: str = settings.retention_archive_dir,
+        chunk_size: int = settings.retention_chunk_size,
+        chunk_pause_ms: int = settings.retention_chunk_pause_ms,
+        vacuum: bool = settings.retention_vacuum,
+    ) -> None:
+        self.retention_days = retention_days
+        self.alert_retention_days = alert_retention_days
+        self.minute_rollup_retention_days = minute_rollup_retention_days
+        self.archive_dir = archive_dir
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_pause = chunk_pause_ms / 1000
+        self.vacuum = vacuum
+
+    def run(self, now: Optional[datetime] = None) -> dict[str, Any]:
+        """
+        Run one retention pass.
+
+        Returns:
+            Summary with archived files and purged row counts
+        """
+        now = now or datetime.now()  # Readings are stored in local time
+        archive_before = _month_start(now - timedelta(days=self.retention_days))
+        summary: dict[str, Any] = {
+            "archived_files": [],
+            "readings_purged": 0,
+            "alerts_purged": 0,
+            "minute_rollups_purged": 0,
+        }
+
+        db = SessionLocal()
+        try:
+            oldest = db.scalar(select(func.min(SensorReading.timestamp)))
+        finally:
+            db.close()
+
+        month = _month_start(oldest) if oldest else archive_before
+        while month < archive_before:
+            month_end = _next_month(month)
+            path, max_id = self._archive_month(month, month_end)
+            if path:
+                summary["archived_files"].append(path)
+                summary["readings_purged"] += self._purge(
+                    SensorReading,
+                    SensorReading.timestamp >= month,
+                    SensorReading.timestamp < month_end,
+                    SensorReading.id <= max_id,
+                )
+            month = month_end
+
+        alert_cutoff = now - timedelta(days=self.alert_retention_days)
+        summary["alerts_purged"] = self._purge(
+            Alert,
+            Alert.timestamp < alert_cutoff,
+            Alert.is_resolved == True,
+        )
+        if summary["alerts_purged"]:
+            # Purged alerts are resolved but may be unread; recount rather than track each chunk
+            db = SessionLocal()
+            try:
+                alert_counters.load(db)
+            finally:
+                db.close()
+
+        if self.minute_rollup_retention_days > 0:
+            # Cut on an hour boundary so every hour still held at minute resolution is complete
+            rollup_cutoff = (now - timedelta(days=self.minute_rollup_retention_days)).replace(
+                minute=0, second=0, microsecond=0
+            )
+            summary["minute_rollups_purged"] = self._purge(
+                SensorRollupMinute,
+                SensorRollupMinute.bucket < rollup_cutoff,
+            )
+
+        if self.vacuum and (summary["readings_purged"] or summary["alerts_purged"] or summary["minute_rollups_purged"]):
+            self._vacuum()
+
+        print(
+            f"[RETENTION] Archived {len(summary['archived_files'])} month(s), purged "
+            f"{summary['readings_purged']} readings, {summary['alerts_purged']} alerts and "
+            f"{summary['minute_rollups_purged']} minute rollups"
+        )
+        return summary
+
+    def _archive_month(self, month: datetime, month_end: datetime) -> tuple[Optional[str], int]:
+        """Stream one month of readings into an archive file. Returns (path, highest archived id)."""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        extension = "parquet" if pq else "csv.gz"
+        path = os.path.join(self.archive_dir, f"sensor_readings-{month:%Y-%m}.{extension}")
+        part = 1
+        while os.path.exists(path):
+            # A rerun after a partial purge; never overwrite an existing archive
+            part += 1
+            path = os.path.join(self.archive_dir, f"sensor_readings-{month:%Y-%m}.part{part}.{extension}")
+        tmp_path = path + ".tmp"
+
+        db = SessionLocal()
+        max_id = 0
+        rows = 0
+        try:
+            query = (
+                select(*(getattr(SensorReading, c) for c in ARCHIVE_COLUMNS))
+                .where(SensorReading.timestamp >= month, SensorReading.timestamp < month_end)
+                .order_by(SensorReading.id)
+                .execution_options(yield_per=10000)
+            )
+            partitions = db.execute(query).partitions()
+            if pq:
+                rows, max_id = self._write_parquet(tmp_path, partitions)
+            else:
+                rows, max_id = self._write_csv_gz(tmp_path, partitions)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            db.close()
+
+        if rows == 0:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None, 0
+        os.replace(tmp_path, path)
+        print(f"[RETENTION] Archived {rows} readings for {month:%Y-%m} to {path}")
+        return path, max_id
+
+    @staticmethod
+    def _write_parquet(path: str, partitions) -> tuple[int, int]:
+        schema = pa.schema([
+            ("id", pa.int64()),
+            ("timestamp", pa.timestamp("us")),
+            ("sensor_id", pa.int32()),
+            ("zone", pa.string()),
+            ("moisture", pa.float64()),
+            ("temperature", pa.float64()),
+            ("humidity", pa.float64()),
+            ("ph", pa.float64()),
+        ])
+        rows = 0
+        max_id = 0
+        writer = None
+        try:
+            for partition in partitions:
+                columns = list(zip(*partition))
+                batch = pa.RecordBatch.from_arrays(
+                    [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                    schema=schema
+                )
+                if writer is None:
+                    writer = pq.ParquetWriter(path, schema, compression="zstd")
+                writer.write_batch(batch)
+                rows += len(partition)
+                max_id = partition[-1].id
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows, max_id
+
+    @staticmethod
+    def _write_csv_gz(path: str, partitions) -> tuple[int, int]:
+        rows = 0
+        max_id = 0
+        with gzip.open(path, "wt", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(ARCHIVE_COLUMNS)
+            for partition in partitions:
+                writer.writerows((row.id, row.timestamp.isoformat(), *row[2:]) for row in partition)
+                rows += len(partition)
+                max_id = partition[-1].id
+        return rows, max_id
+
+    def _purge(self, model, *conditions) -> int:
+        """Delete matching rows chunk by chunk, committing and pausing between chunks."""
+        total = 0
+        while True:
+            db = WriteSessionLocal()
+            try:
+                # Rollup tables have a composite primary key, so match on the whole key
+                key = list(model.__table__.primary_key.columns)
+                chunk = select(*key).where(*conditions).limit(self.chunk_size)
+                match = key[0].in_(chunk) if len(key) == 1 else tuple_(*key).in_(chunk)
+                deleted = db.execute(delete(model).where(match)).rowcount
+                db.commit()
+            finally:
+                db.close()
+            total += deleted
+            if deleted < self.chunk_size:
+                return total
+            # Let the ingest writer take the write lock between chunks
+            time.sleep(self.chunk_pause)
+
+    @staticmethod
+    def _vacuum() -> None:
+        print("[RETENTION] Vacuuming database...")
+        with write_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("VACUUM")
+
+
+async def retention_scheduler(job: RetentionJob, interval_hours: float = settings.retention_interval_hours):
+    """Background task running the retention job off the event loop at a fixed interval."""
+    while True:
+        try:
+            await asyncio.to_thread(job.run)
+        except Exception as e:
+            print(f"[RETENTION] Error: {e}")
+        await asyncio.sleep(interval_hours * 3600)
+
+
+# Create singleton instance
+retention_job = RetentionJob()
+
+
+if __name__ == "__main__":
+    # Usage (from Backend/): python -m app.services.retention
+    retention_job.run()
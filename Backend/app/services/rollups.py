@@ -0,0 +1,238 @@
+from datetime import datetime, timedelta
+from typing import Any, Iterable, Optional
+from sqlalchemy import func, select, delete
+from sqlalchemy.orm import Session
+from ..models import SensorReading, SensorRollupMinute, SensorRollupHour
+
+METRICS = ("moisture", "temperature", "humidity", "ph")
+ROLLUPS = {
+    "minute": SensorRollupMinute,
+    "hour": SensorRollupHour,
+}
+
+
+def _bucket(timestamp: datetime, resolution: str) -> datetime:
+    if resolution == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(second=0, microsecond=0)
+
+
+def aggregate(rows: Iterable[dict[str, Any]], resolution: str) -> list[dict[str, Any]]:
+    """
+    Fold raw reading rows into rollup rows for one resolution.
+
+    Args:
+        rows: Dicts with timestamp, sensor_id, zone and the metric values
+        resolution: 'minute' or 'hour'
+
+    Returns:
+        One partial aggregate per (bucket, zone, sensor_id)
+    """
+    buckets: dict[tuple, dict[str, Any]] = {}
+    for row in rows:
+        key = (_bucket(row["timestamp"], resolution), row["zone"] or "", row["sensor_id"])
+        agg = buckets.get(key)
+        if agg is None:
+            agg = buckets[key] = {"bucket": key[0], "zone": key[1], "sensor_id": key[2], "count": 0}
+            for metric in METRICS:
+                agg[f"{metric}_sum"] = 0.0
+                agg[f"{metric}_min"] = row[metric]
+                agg[f"{metric}_max"] = row[metric]
+        agg["count"] += 1
+        for metric in METRICS:
+            value = row[metric]
+            agg[f"{metric}_sum"] += value
+            if value < agg[f"{metric}_min"]:
+                agg[f"{metric}_min"] = value
+            if value > agg[f"{metric}_max"]:
+                agg[f"{metric}_max"] = value
+    return list(buckets.values())
+
+
+def _upsert(db: Session, model, rows: list[dict[str, Any]]) -> None:
+    """Merge partial aggregates into a rollup table with INSERT ... ON CONFLICT DO UPDATE."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        least, greatest = func.least, func.greatest
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+        # SQLite's multi-argument min()/max() are scalar functions
+        least, greatest = func.min, func.max
+
+    stmt = insert(model)
+    table = model.__table__
+    excluded = stmt.excluded
+    updates = {"count": table.c.count + excluded.count}
+    for metric in METRICS:
+        updates[f"{metric}_sum"] = table.c[f"{metric}_sum"] + excluded[f"{metric}_sum"]
+        updates[f"{metric}_min"] = least(table.c[f"{metric}_min"], excluded[f"{metric}_min"])
+        updates[f"{metric}_max"] = greatest(table.c[f"{metric}_max"], excluded[f"{metric}_max"])
+    stmt = stmt.on_conflict_do_update(index_elements=["bucket", "zone", "sensor_id"], set_=updates)
+    db.execute(stmt, rows)
+
+
+def apply_rollups(db: Session, rows: list[dict[str, Any]]) -> None:
+    """
+    Add newly ingested readings to the minute and hour rollups.
+    Runs inside the caller's transaction so rollups commit with the readings.
+    """
+    if not rows:
+        return
+    for resolution, model in ROLLUPS.items():
+        _upsert(db, model, aggregate(rows, resolution))
+
+
+def remove_from_rollups(db: Session, reading: SensorReading) -> None:
+    """
+    Take a deleted reading out of its buckets' counts and sums.
+    Min/max cannot be un-merged and are left as they are.
+    """
+    for resolution, model in ROLLUPS.items():
+        rollup = db.get(model, (_bucket(reading.timestamp, resolution), reading.zone or "", reading.sensor_id))
+        if rollup is None:
+            continue
+        if rollup.count <= 1:
+            db.delete(rollup)
+            continue
+        rollup.count -= 1
+        for metric in METRICS:
+            setattr(rollup, f"{metric}_sum", getattr(rollup, f"{metric}_sum") - getattr(reading, metric))
+
+
+def _summary_columns(model) -> list:
+    columns = [func.sum(model.count).label("count")]
+    for metric in METRICS:
+        columns += [
+            func.sum(model.__table__.c[f"{metric}_sum"]).label(f"{metric}_sum"),
+            func.min(model.__table__.c[f"{metric}_min"]).label(f"{metric}_min"),
+            func.max(model.__table__.c[f"{metric}_max"]).label(f"{metric}_max"),
+        ]
+    return columns
+
+
+def summarize(db: Session, zone: str, since: datetime, sensor_id: Optional[int] = None) -> Optional[dict[str, Any]]:
+    """
+    Avg/min/max/count per metric since a point in time, answered from rollups.
+
+    Whole hours come from the hour table and the partial leading hour from the
+    minute table, so a week is ~170 + <60 rows per sensor however many raw
+    readings it holds. The window starts at the minute containing `since`.
+
+    Returns:
+        Dict of metric -> {avg, min, max} plus reading_count, or None if empty
+    """
+    since = _bucket(since, "minute")
+    first_hour = _bucket(since, "hour")
+    if first_hour < since:
+        first_hour += timedelta(hours=1)
+
+    parts = []
+    for model, start, end in (
+        (SensorRollupMinute, since, first_hour),
+        (SensorRollupHour, first_hour, None),
+    ):
+        query = select(*_summary_columns(model)).where(model.zone == zone, model.bucket >= start)
+        if end is not None:
+            query = query.where(model.bucket < end)
+        if sensor_id is not None:
+            query = query.where(model.sensor_id == sensor_id)
+        row = db.execute(query).one()
+        if row.count:
+            parts.append(row)
+
+    if not parts:
+        return None
+
+    count = sum(part.count for part in parts)
+    summary: dict[str, Any] = {"reading_count": count}
+    for metric in METRICS:
+        summary[metric] = {
+            "avg": sum(getattr(part, f"{metric}_sum") for part in parts) / count,
+            "min": min(getattr(part, f"{metric}_min") for part in parts),
+            "max": max(getattr(part, f"{metric}_max") for part in parts),
+        }
+    return summary
+
+
+def history(
+    db: Session,
+    zone: str,
+    since: datetime,
+    resolution: str = "hour",
+    sensor_id: Optional[int] = None,
+) -> list[dict[str, Any]]:
+    """Per-bucket avg/min/max series for a zone (optionally one sensor) from the rollup tables."""
+    model = ROLLUPS[resolution]
+    query = select(model.bucket, *_summary_columns(model)).where(
+        model.zone == zone,
+        model.bucket >= _bucket(since, resolution),
+    )
+    if sensor_id is not None:
+        query = query.where(model.sensor_id == sensor_id)
+    query = query.group_by(model.bucket).order_by(model.bucket)
+
+    series = []
+    for row in db.execute(query):
+        point: dict[str, Any] = {"timestamp": row.bucket, "reading_count": row.count}
+        for metric in METRICS:
+            point[metric] = {
+                "avg": round(getattr(row, f"{metric}_sum") / row.count, 2),
+                "min": round(getattr(row, f"{metric}_min"), 2),
+                "max": round(getattr(row, f"{metric}_max"), 2),
+            }
+        series.append(point)
+    return series
+
+
+def backfill(db: Session, chunk_size: int = 5000) -> int:
+    """
+    Rebuild both rollup tables from the raw readings.
+
+    Clearing the rollups and reading the current max ID happen in one
+    transaction, so readings ingested while the backfill runs (higher IDs)
+    are rolled up by the ingest path and not counted twice.
+
+    Returns:
+        Number of readings rolled up
+    """
+    for model in ROLLUPS.values():
+        db.execute(delete(model))
+    max_id = db.scalar(select(func.max(SensorReading.id))) or 0
+    db.commit()
+
+    columns = [SensorReading.id, SensorReading.timestamp, SensorReading.sensor_id, SensorReading.zone]
+    columns += [getattr(SensorReading, metric) for metric in METRICS]
+
+    last_id = 0
+    total = 0
+    while last_id < max_id:
+        rows = [
+            row._asdict() for row in db.execute(
+                select(*columns)
+                .where(SensorReading.id > last_id, SensorReading.id <= max_id)
+                .order_by(SensorReading.id)
+                .limit(chunk_size)
+            )
+        ]
+        if not rows:
+            break
+        apply_rollups(db, rows)
+        db.commit()
+        last_id = rows[-1]["id"]
+        total += len(rows)
+        print(f"[ROLLUPS] Backfilled {total} readings (up to id {last_id})")
+    return total
+
+
+if __name__ == "__main__":
+    # Usage (from Backend/): python -m app.services.rollups
+    from ..database import Base, WriteSessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    db = WriteSessionLocal()
+    try:
+        count = backfill(db)
+        print(f"[ROLLUPS] Backfill complete: {count} readings")
+    finally:
+        db.close()
@@ -1,48 +1,51 @@
-import json
-import ast
+"""
+Standalone irrigation loop for a Raspberry Pi without the API server.
+
+Run from Backend/ as a module, so the app package resolves and .env
+(SECRET_KEY is required by the settings) is picked up:
+
+    python -m app.utils
+"""
+import asyncio
 import paho.mqtt.client as mqtt
-# import RPi.GPIO as GPIO
-from time import sleep
+from app.services.payload_decoder import decode_payload
+from app.services.irrigation import irrigation
 
 mqtt_addr = "smart.local"
 mqtt_user = "esp32"
 mqtt_passwd = "sensormod"
 mqtt_topic = "AgriMonitor"
 
-with open('./app/pinconfig.json', 'r') as file:
-        moduleData = json.load(file)
-
-# GPIO.setwarnings(False)
-# GPIO.setmode(GPIO.BCM)
-
-for (key, value) in moduleData.items():
-        # GPIO.setup(value["sprinkler"], GPIO.OUT)
-        # GPIO.setup(value["pipe"], GPIO.OUT)
-        pass
-
 
 def on_connect(client, userdata, flags, rc):
         print('Connected with result code ' + str(rc))
         client.subscribe(mqtt_topic)
 
 def on_message(client, userdata, msg):
-        msg_payload = msg.payload.decode("utf-8")
-        print(msg.topic + ' '  + msg_payload)
-        data = ast.literal_eval(msg_payload)
-        id = data["id"]
-        if data["humidity"] < 80:
-                # GPIO.output(moduleData[str(id)]["sprinkler"], True)
-                # sleep(5)
-                # GPIO.output(moduleData[str(id)]["sprinkler"], False)
-                # sleep(5)
-                pass
-
-if __name__=='__main__':
-
-        mqtt_client = mqtt.Client()
+        print(msg.topic + ' '  + repr(msg.payload))
+        try:
+                data = decode_payload(msg.topic, msg.payload)
+        except Exception as exc:
+                print(f"[MQTT] Invalid payload on '{msg.topic}' {msg.payload!r}: {exc}")
+                return
+        reading = {"sensor_id": data["id"], "humidity": data["humidity"]}
+        # Runs on paho's network thread; watering decisions and valve timers live on the event loop
+        userdata["loop"].call_soon_threadsafe(irrigation.observe, [reading])
+
+async def main():
+        irrigation.load()  # pinconfig.json is read here, not at import time
+        mqtt_client = mqtt.Client(userdata={"loop": asyncio.get_running_loop()})
         mqtt_client.on_connect = on_connect
         mqtt_client.on_message = on_message
         mqtt_client.username_pw_set(mqtt_user, mqtt_passwd)
 
         mqtt_client.connect(mqtt_addr, 1883)
-        mqtt_client.loop_forever()
+        mqtt_client.loop_start()
+        try:
+                await asyncio.Event().wait()
+        finally:
+                mqtt_client.loop_stop()
+                await irrigation.shutdown()
+
+if __name__=='__main__':
+        asyncio.run(main())
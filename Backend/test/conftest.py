@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+
+# Settings are read at import time, so the environment must be in place before app is imported
+_DB_DIR = tempfile.mkdtemp(prefix="agrosense-test-")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ.setdefault("MQTT_INGEST_MODE", "thread")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import pytest
+from app.database import Base, async_engine, engine, SessionLocal
+from app.services.alert_store import alert_counters, alert_store
+
+Base.metadata.create_all(bind=engine)
+
+
+@pytest.fixture
+def db():
+    """A session on an empty database; all tables and in-memory alert state are cleared afterwards."""
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+        alert_store.close_all()
+        with SessionLocal() as fresh:
+            alert_counters.load(fresh)
+
+
+@pytest.fixture
+def api():
+    """Run requests against the HTTP routers (without the app lifespan): api(lambda client: client.get(...))."""
+    import httpx
+    from fastapi import FastAPI
+    from app.routers import ai_analysis, sensors
+
+    app = FastAPI()
+    app.include_router(sensors.router, prefix="/api/sensors")
+    app.include_router(ai_analysis.router, prefix="/api/ai")
+
+    def call(request):
+        async def scenario():
+            try:
+                async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                    return await request(client)
+            finally:
+                # Pooled aiosqlite connections belong to this event loop (and keep a thread alive)
+                await async_engine.dispose()
+
+        return asyncio.run(scenario())
+
+    return call
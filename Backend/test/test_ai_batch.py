@@ -0,0 +1,78 @@
+import asyncio
+import json
+import anyio
+from types import SimpleNamespace
+from sqlalchemy import select
+from app.database import async_engine
+from app.models import AnalysisLog
+from app.routers import ai_analysis
+from app.services.image_pipeline import ImageError
+
+
+def _run_batch(uploads):
+    async def collect():
+        try:
+            return [json.loads(line) async for line in ai_analysis._batch_results("security", uploads)]
+        finally:
+            # Pooled aiosqlite connections belong to this event loop (and keep a thread alive)
+            await async_engine.dispose()
+
+    return asyncio.run(collect())
+
+
+def test_batch_reports_each_failure_as_an_error_line(db, monkeypatch):
+    async def prepare(data):
+        if data == b"unreadable":
+            raise ImageError("Cannot read image")
+        return SimpleNamespace(jpeg=data, fingerprint=("sha", 0))
+
+    async def analyze(jpeg):
+        if jpeg == b"explodes":
+            raise RuntimeError("boom")
+        if jpeg == b"model error":
+            return "Error analyzing security image: quota exceeded"
+        return "All clear"
+
+    monkeypatch.setattr(ai_analysis.image_pipeline, "prepare", prepare)
+    monkeypatch.setitem(ai_analysis.ANALYZERS, "security", analyze)
+
+    lines = _run_batch([("a.jpg", b"fine"), ("b.jpg", b"unreadable"), ("c.jpg", b"explodes"), ("d.jpg", b"model error")])
+    *items, summary = lines
+    by_name = {item["filename"]: item for item in items}
+
+    assert by_name["a.jpg"]["status"] == "ok"
+    assert by_name["a.jpg"]["result"] == "All clear"
+    assert (by_name["b.jpg"]["status"], by_name["b.jpg"]["status_code"]) == ("error", 400)
+    assert (by_name["c.jpg"]["status"], by_name["c.jpg"]["status_code"]) == ("error", 500)
+    assert (by_name["d.jpg"]["status"], by_name["d.jpg"]["status_code"]) == ("error", 502)
+    assert summary == {"done": True, "count": 4, "errors": 3, "logged": 2}
+    assert sorted(db.scalars(select(AnalysisLog.result))) == ["All clear", "Error analyzing security image: quota exceeded"]
+
+
+def test_results_finished_before_a_disconnect_are_still_logged(db, monkeypatch):
+    async def prepare(data):
+        return SimpleNamespace(jpeg=data, fingerprint=("sha", 0))
+
+    async def analyze(jpeg):
+        if jpeg == b"slow":
+            await asyncio.Event().wait()
+        return "All clear"
+
+    monkeypatch.setattr(ai_analysis.image_pipeline, "prepare", prepare)
+    monkeypatch.setitem(ai_analysis.ANALYZERS, "security", analyze)
+
+    async def disconnect_after_first_line():
+        lines = []
+        try:
+            # Starlette cancels the response's scope like this when the client goes away
+            with anyio.CancelScope() as scope:
+                async for line in ai_analysis._batch_results("security", [("a.jpg", b"fast"), ("b.jpg", b"slow")]):
+                    lines.append(json.loads(line))
+                    scope.cancel()
+            return lines
+        finally:
+            await async_engine.dispose()
+
+    lines = asyncio.run(disconnect_after_first_line())
+    assert [line["filename"] for line in lines] == ["a.jpg"]
+    assert list(db.scalars(select(AnalysisLog.result))) == ["All clear"]
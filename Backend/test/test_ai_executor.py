@@ -0,0 +1,243 @@
+import asyncio
+import threading
+import time
+from contextlib import aclosing
+import pytest
+from app.services.ai_executor import AIBusyError, AIExecutor, AITimeoutError
+
+
+class Gate:
+    """A fake blocking model call: holds its worker thread until opened."""
+
+    def __init__(self):
+        self.opened = threading.Event()
+        self.finished = 0
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, result="answer"):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        self.opened.wait(5)
+        with self._lock:
+            self.running -= 1
+            self.finished += 1
+        return result
+
+
+def _run(scenario):
+    return asyncio.run(scenario())
+
+
+async def _until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition never became true"
+        await asyncio.sleep(0.01)
+
+
+def test_semaphore_caps_concurrent_calls():
+    gate = Gate()
+
+    async def scenario():
+        executor = AIExecutor(max_concurrency=2, call_timeout_s=5, queue_timeout_s=5)
+        calls = [asyncio.create_task(executor.run(gate, i)) for i in range(5)]
+        await _until(lambda: gate.running == 2)
+        await asyncio.sleep(0.05)  # Give a third call the chance to (wrongly) start
+        in_flight = executor.stats()["in_flight"]
+        gate.opened.set()
+        return in_flight, await asyncio.gather(*calls), executor.stats()
+
+    in_flight, results, stats = _run(scenario)
+    assert in_flight == 2
+    assert gate.max_running == 2
+    assert results == [0, 1, 2, 3, 4]
+    assert (stats["calls"], stats["in_flight"]) == (5, 0)
+
+
+def test_waiting_too_long_for_a_slot_is_a_503():
+    gate = Gate()
+
+    async def scenario():
+        executor = AIExecutor(max_concurrency=1, call_timeout_s=5, queue_timeout_s=0.05)
+        busy = asyncio.create_task(executor.run(gate))
+        await _until(lambda: gate.running == 1)
+        with pytest.raises(AIBusyError) as excinfo:
+            await executor.run(gate)
+        gate.opened.set()
+        await busy
+        return excinfo.value, executor.stats()
+
+    error, stats = _run(scenario)
+    assert error.status_code == 503
+    assert (stats["rejected"], stats["calls"]) == (1, 1)
+
+
+def test_call_timeout_is_a_504_and_keeps_the_slot_until_the_thread_returns():
+    gate = Gate()
+
+    async def scenario():
+        executor = AIExecutor(max_concurrency=1, call_timeout_s=0.05, queue_timeout_s=0.05)
+        with pytest.raises(AITimeoutError) as excinfo:
+            await executor.run(gate)
+        # The abandoned call still occupies the only worker, so the cap holds
+        in_flight = executor.stats()["in_flight"]
+        with pytest.raises(AIBusyError):
+            await executor.run(gate)
+        gate.opened.set()
+        await _until(lambda: executor.stats()["in_flight"] == 0)
+        return excinfo.value, in_flight, await executor.run(gate, "after"), executor.stats()
+
+    error, in_flight, after, stats = _run(scenario)
+    assert error.status_code == 504
+    assert in_flight == 1
+    assert after == "after"
+    assert stats["timeouts"] == 1
+    assert gate.finished == 2  # The timed-out call ran to completion anyway
+
+
+def test_cancelled_caller_does_not_release_the_slot_early():
+    gate = Gate()
+
+    async def scenario():
+        executor = AIExecutor(max_concurrency=1, call_timeout_s=5, queue_timeout_s=5)
+        caller = asyncio.create_task(executor.run(gate))
+        await _until(lambda: gate.running == 1)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        held = executor.stats()["in_flight"]
+        gate.opened.set()
+        await _until(lambda: executor.stats()["in_flight"] == 0)
+        return held
+
+    assert _run(scenario) == 1
+    assert gate.finished == 1
+
+
+def test_stream_yields_items_then_ends():
+    def tokens(count):
+        for i in range(count):
+            yield f"t{i}"
+
+    async def scenario():
+        executor = AIExecutor(max_concurrency=1, call_timeout_s=5, queue_timeout_s=5)
+        items = [item async for item in executor.stream(tokens, 3)]
+        await _until(lambda: executor.stats()["in_flight"] == 0)
+        return items
+
+    assert _run(scenario) == ["t0", "t1", "t2"]
+
+
+def test_stream_raises_the_generator_error_after_its_items():
+    def failing():
+        yield "partial"
+        raise RuntimeError("quota exceeded")
+
+    async def scenario():
+        executor = AIExecutor(max_concurrency=1, call_timeout_s=5, queue_timeout_s=5)
+        items = []
+        with pytest.raises(RuntimeError, match="quota exceeded"):
+            async for item in executor.stream(failing):
+                items.append(item)
+        return items, executor.stats()["errors"]
+
+    assert _run(scenario) == (["partial"], 1)
+
+
+def test_stream_times_out_as_a_whole():
+    gate = Gate()
+
+    def slow():
+        yield "first"
+        gate()
+        yield "never"
+
+    async def scenario():
+        executor = AIExecutor(max_concurrency=1, call_timeout_s=0.1, queue_timeout_s=5)
+        items = []
+        with pytest.raises(AITimeoutError):
+            async for item in executor.stream(slow):
+                items.append(item)
+        gate.opened.set()
+        await _until(lambda: executor.stats()["in_flight"] == 0)
+        return items, executor.stats()["timeouts"]
+
+    assert _run(scenario) == (["first"], 1)
+
+
+def test_stream_worker_stops_when_the_consumer_does():
+    produced = []
+
+    def endless():
+        while True:
+            produced.append(len(produced))
+            time.sleep(0.005)
+            yield produced[-1]
+
+    async def scenario():
+        executor = AIExecutor(max_concurrency=1, call_timeout_s=5, queue_timeout_s=5)
+        async with aclosing(executor.stream(endless)) as stream:
+            async for item in stream:
+                if item == 2:
+                    break
+        await _until(lambda: executor.stats()["in_flight"] == 0)
+        return len(produced)
+
+    count = _run(scenario)
+    time.sleep(0.05)
+    assert len(produced) == count  # The worker thread is no longer producing
+
+
+def test_job_table_tracks_status_and_result():
+    async def answer():
+        await asyncio.sleep(0.01)
+        return "healthy"
+
+    async def explode():
+        raise RuntimeError("boom")
+
+    async def scenario():
+        executor = AIExecutor(max_pending_jobs=5, job_ttl_s=60)
+        ok = executor.submit("plant_health", answer())
+        failed = executor.submit("security", explode())
+        queued = ok["status"]
+        await _until(lambda: executor.stats()["jobs_pending"] == 0)
+        return queued, executor.get_job(ok["job_id"]), executor.get_job(failed["job_id"]), executor.get_job("missing")
+
+    queued, ok, failed, missing = _run(scenario)
+    assert queued == "queued"
+    assert (ok["status"], ok["result"], ok["kind"]) == ("done", "healthy", "plant_health")
+    assert ok["finished_at"] >= ok["created_at"]
+    assert "_finished" not in ok
+    assert (failed["status"], failed["error"]) == ("failed", "boom")
+    assert missing is None
+
+
+def test_job_table_rejects_when_full_and_prunes_expired_jobs():
+    async def scenario():
+        executor = AIExecutor(max_pending_jobs=1, job_ttl_s=0.05)
+        hold = asyncio.Event()
+
+        async def waiting():
+            await hold.wait()
+            return "done"
+
+        first = executor.submit("plant_health", waiting())
+        extra = waiting()
+        with pytest.raises(AIBusyError):
+            executor.submit("plant_health", extra)
+        closed = extra.cr_frame is None  # Rejected coroutines are closed, never left un-awaited
+        hold.set()
+        await _until(lambda: executor.stats()["jobs_pending"] == 0)
+        await asyncio.sleep(0.1)
+        executor.submit("plant_health", waiting())  # Submitting prunes jobs past their TTL
+        await _until(lambda: executor.stats()["jobs_pending"] == 0)
+        return closed, executor.get_job(first["job_id"]), executor.stats()
+
+    closed, first, stats = _run(scenario)
+    assert closed
+    assert first is None
+    assert (stats["rejected"], stats["jobs_stored"]) == (1, 1)
@@ -0,0 +1,84 @@
+import json
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import select
+from app.models import AnalysisLog
+from app.routers import ai_analysis
+from app.services.ai_executor import AITimeoutError
+
+
+def _events(body):
+    """Parse an SSE body into (event, data) pairs."""
+    events = []
+    for frame in body.split("\n\n"):
+        if frame:
+            event, data = frame.split("\n")
+            events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+@pytest.fixture
+def stream(api, monkeypatch):
+    """POST an upload to a streaming endpoint, with the given async generator standing in for the model."""
+    async def prepare(data):
+        return SimpleNamespace(jpeg=data, fingerprint=("sha", 0))
+
+    monkeypatch.setattr(ai_analysis.image_pipeline, "prepare", prepare)
+
+    def post(analysis_type, analyzer):
+        monkeypatch.setitem(ai_analysis.STREAMING_ANALYZERS, analysis_type, analyzer)
+        path = "/api/ai/analyze-plant/stream" if analysis_type == "plant_health" else "/api/ai/analyze-security/stream"
+        return api(lambda client: client.post(path, files={"file": ("frame.jpg", b"jpeg bytes", "image/jpeg")}))
+
+    return post
+
+
+def test_chunks_then_done_and_the_answer_is_logged(db, stream):
+    async def analyzer(jpeg):
+        assert jpeg == b"jpeg bytes"
+        for text in ("All ", "clear", "."):
+            yield text
+
+    response = stream("security", analyzer)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["cache-control"] == "no-cache"
+    *chunks, (event, done) = _events(response.text)
+    assert chunks == [("chunk", {"text": "All "}), ("chunk", {"text": "clear"}), ("chunk", {"text": "."})]
+    assert event == "done"
+    assert (done["analysis_type"], done["result"], done["cache_hit"]) == ("security", "All clear.", False)
+    log = db.scalars(select(AnalysisLog)).one()
+    assert (log.analysis_type, log.result, log.cache_hit) == ("security", "All clear.", False)
+
+
+@pytest.mark.parametrize("error, status_code", [(AITimeoutError("AI call timed out after 5s"), 504), (RuntimeError("boom"), 500)])
+def test_a_failing_model_ends_with_an_error_event_and_logs_nothing(db, stream, error, status_code):
+    async def analyzer(jpeg):
+        yield "partial"
+        raise error
+
+    events = _events(stream("security", analyzer).text)
+
+    assert events[0] == ("chunk", {"text": "partial"})
+    assert events[1][0] == "error"
+    assert events[1][1]["status_code"] == status_code
+    assert str(error) in events[1][1]["detail"]
+    assert len(events) == 2
+    assert db.scalars(select(AnalysisLog)).all() == []
+
+
+def test_cached_plant_analysis_arrives_as_one_chunk(db, stream, monkeypatch):
+    entry = {"id": 1, "result": "Healthy leaf", "hit_count": 1}
+    monkeypatch.setattr(ai_analysis.analysis_cache, "lookup", lambda *args: entry)
+
+    async def analyzer(jpeg):
+        raise AssertionError("a cache hit must not call the model")
+        yield
+
+    events = _events(stream("plant_health", analyzer).text)
+
+    assert events[0] == ("chunk", {"text": "Healthy leaf"})
+    assert events[1][0] == "done"
+    assert events[1][1]["cache_hit"] is True
+    assert db.scalars(select(AnalysisLog.cache_hit)).all() == [True]
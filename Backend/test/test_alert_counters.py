@@ -0,0 +1,72 @@
+import threading
+from datetime import datetime
+from app.models import Alert
+from app.services.alert_store import AlertCounters, AlertStore, alert_counters
+
+
+def _alert(zone="main", severity="high", type_="moisture"):
+    return {"type": type_, "severity": severity, "message": "m", "zone": zone, "timestamp": datetime.now()}
+
+
+def test_counts_apply_on_commit_only(db):
+    store = AlertStore(window_s=0)
+    store.record(db, [_alert(), _alert(zone=None, severity="low")])
+    assert alert_counters.unread == 0  # Not committed yet
+    db.commit()
+    assert (alert_counters.unread, alert_counters.unresolved) == (2, 2)
+
+    store.record(db, [_alert()])
+    db.rollback()
+    assert alert_counters.unread == 2
+
+    snapshot = alert_counters.snapshot()
+    assert snapshot["by_zone"] == {"main": {"unread": 1, "unresolved": 1}, "unassigned": {"unread": 1, "unresolved": 1}}
+    assert snapshot["by_severity"]["low"] == {"unread": 1, "unresolved": 1}
+
+
+def test_transitions_and_recount_agree(db):
+    store = AlertStore(window_s=0)
+    (created, _) = store.record(db, [_alert(), _alert(zone="field_a")])
+    db.commit()
+
+    alert = db.get(Alert, created[0]["id"])
+    alert.is_read = True
+    assert alert_counters.stage_transition(db, alert, was_read=False, was_resolved=False)
+    db.commit()
+    assert (alert_counters.unread, alert_counters.unresolved) == (1, 2)
+
+    incremental = alert_counters.snapshot()
+    alert_counters.load(db)
+    assert alert_counters.snapshot() == incremental
+
+
+def test_reads_are_safe_while_another_thread_applies_deltas():
+    counters = AlertCounters()
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        zone = 0
+        while not stop.is_set():
+            zone += 1
+            counters._apply([("high", f"zone_{zone}", 1, 1)])
+            counters._apply([("high", f"zone_{zone}", -1, -1)])  # Key removed again
+
+    def reader():
+        try:
+            for _ in range(20000):
+                counters.unread
+                counters.unresolved
+                counters.snapshot()
+        except RuntimeError as e:  # dictionary changed size during iteration
+            errors.append(e)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        reader()
+    finally:
+        stop.set()
+        thread.join()
+    assert errors == []
+    assert counters.unread == 0
@@ -0,0 +1,126 @@
+import json
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+import pytest
+from app.services import ingest_writer as ingest_writer_module
+from app.services.alert_rules import DEFAULT_RULES_PATH, AlertRule, AlertRuleEngine
+from app.services.ingest_writer import IngestWriter
+
+START = datetime(2026, 3, 1, 8)
+
+
+def _engine(tmp_path, *rules):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rules": list(rules)}))
+    engine = AlertRuleEngine(str(path))
+    engine.load()
+    return engine
+
+
+def _row(seconds, moisture, sensor_id=1, zone="main"):
+    return {
+        "sensor_id": sensor_id,
+        "zone": zone,
+        "timestamp": START + timedelta(seconds=seconds),
+        "moisture": moisture,
+        "temperature": 20.0,
+        "humidity": 50.0,
+        "ph": 6.5,
+    }
+
+
+LOW = {"name": "low", "metric": "moisture", "op": "<", "value": 25, "clear": 30, "severity": "high"}
+DROP = {"name": "drop", "metric": "moisture", "kind": "rate", "op": "<", "value": -10, "per_seconds": 600}
+
+
+def test_threshold_fires_once_per_breach_with_hysteresis(tmp_path):
+    engine = _engine(tmp_path, LOW)
+    # 24 breaches, 27 is inside the hysteresis band, 31 clears, 20 breaches again
+    values = [35, 24, 22, 27, 23, 31, 20]
+    alerts = engine.evaluate([_row(i * 10, v) for i, v in enumerate(values)])
+    assert [alert["timestamp"] for alert in alerts] == [START + timedelta(seconds=10), START + timedelta(seconds=60)]
+    assert alerts[0]["severity"] == "high"
+    assert alerts[0]["sensor_id"] == 1
+
+
+def test_threshold_state_carries_across_batches(tmp_path):
+    engine = _engine(tmp_path, LOW)
+    assert len(engine.evaluate([_row(0, 20)])) == 1
+    assert engine.evaluate([_row(10, 27)]) == []  # Still in breach: never cleared
+    assert engine.evaluate([_row(20, 31)]) == []
+    assert len(engine.evaluate([_row(30, 10)])) == 1
+
+
+def test_sensors_are_tracked_independently(tmp_path):
+    engine = _engine(tmp_path, LOW)
+    alerts = engine.evaluate([_row(0, 20, sensor_id=1), _row(0, 20, sensor_id=2), _row(10, 20, sensor_id=1)])
+    assert sorted(alert["sensor_id"] for alert in alerts) == [1, 2]
+
+
+def test_rate_ignores_point_to_point_jitter(tmp_path):
+    engine = _engine(tmp_path, DROP)
+    # +-1% jitter every 5 s is a huge per-10-minute rate point to point, but no trend
+    rows = [_row(i * 5, 40 + (1 if i % 2 else -1)) for i in range(300)]
+    assert engine.evaluate(rows) == []
+
+
+def test_rate_fires_on_a_sustained_drop(tmp_path):
+    engine = _engine(tmp_path, DROP)
+    # Steady for 10 minutes, then falling 2% per minute (20% per 10 minutes)
+    rows = [_row(i * 30, 50.0) for i in range(21)]
+    rows += [_row(600 + i * 30, 50.0 - i) for i in range(1, 41)]
+    alerts = engine.evaluate(rows)
+    assert len(alerts) == 1
+    assert alerts[0]["type"] == "moisture"
+
+
+def test_rate_needs_a_full_window_of_history(tmp_path):
+    engine = _engine(tmp_path, DROP)
+    # A big fall, but only 2 minutes of history: not rated yet
+    assert engine.evaluate([_row(i * 30, 50.0 - 5 * i) for i in range(5)]) == []
+
+
+def test_rate_baseline_carries_across_batches_and_priming(tmp_path):
+    engine = _engine(tmp_path, DROP)
+    engine.prime([_row(0, 60.0)])
+    assert len(engine.evaluate([_row(600, 40.0)])) == 1
+
+
+def test_restore_rolls_back_rule_state(tmp_path):
+    engine = _engine(tmp_path, LOW)
+    batch = [_row(0, 20)]
+    checkpoint = engine.checkpoint(batch)
+    assert len(engine.evaluate(batch)) == 1
+    engine.restore(checkpoint)
+    # The breach was forgotten, so the same reading fires again
+    assert len(engine.evaluate(batch)) == 1
+
+
+def test_clear_level_inside_breach_range_is_rejected():
+    with pytest.raises(ValueError):
+        AlertRule({**LOW, "clear": 20})
+
+
+def test_default_rules_load():
+    engine = AlertRuleEngine(DEFAULT_RULES_PATH)
+    engine.load()
+    drop = next(rule for rule in engine.rules if rule.kind == "rate")
+    assert drop.window_s >= drop.per_seconds
+
+
+def test_failed_flush_does_not_advance_rule_state(db, tmp_path, monkeypatch):
+    engine = _engine(tmp_path, LOW)
+    monkeypatch.setattr(ingest_writer_module, "alert_engine", engine)
+
+    def fail(*args):
+        raise RuntimeError("disk full")
+
+    writer = IngestWriter()
+    batch = [_row(0, 20)]
+    with monkeypatch.context() as patch:
+        # Fails after the rules were evaluated, inside the batch's transaction
+        patch.setattr(ingest_writer_module, "alert_store", SimpleNamespace(record=fail))
+        writer._flush([dict(row) for row in batch])
+    assert writer.stats()["failed_flushes"] == 1
+    # Had the failed flush entered the breach, the retry would not alert
+    assert len(engine.evaluate(batch)) == 1
@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from app.models import Alert
+from app.services.alert_store import AlertStore
+
+START = datetime(2026, 3, 1, 8)
+
+
+def _alert(minutes, type_="moisture", zone="main", severity="high", sensor_id=1):
+    return {
+        "type": type_,
+        "severity": severity,
+        "message": f"reading at +{minutes} min",
+        "zone": zone,
+        "sensor_id": sensor_id,
+        "timestamp": START + timedelta(minutes=minutes),
+    }
+
+
+def _record(db, store, *alerts):
+    created, updated = store.record(db, list(alerts))
+    db.commit()
+    return created, updated
+
+
+def test_repeats_within_window_coalesce_into_one_row(db):
+    store = AlertStore(window_s=900)
+    (first,), _ = _record(db, store, _alert(0))
+    created, (merged,) = _record(db, store, _alert(5, sensor_id=2), _alert(10, sensor_id=3))
+
+    assert created == []
+    assert merged["id"] == first["id"]
+    assert merged["occurrences"] == 3
+    assert merged["last_seen"] == START + timedelta(minutes=10)
+    assert merged["sensor_id"] == 3  # The latest repeat's sensor
+    row = db.get(Alert, first["id"])
+    db.refresh(row)
+    assert (row.occurrences, row.message, row.first_seen) == (3, "reading at +10 min", START)
+    assert store.stats()["coalesced"] == 2
+
+
+def test_different_keys_and_gaps_start_new_rows(db):
+    store = AlertStore(window_s=900)
+    created, _ = _record(
+        db, store,
+        _alert(0),
+        _alert(1, zone="field_a"),
+        _alert(2, severity="medium"),
+        _alert(3, type_="temp"),
+        _alert(30),  # Quiet for longer than the window
+    )
+    assert len(created) == 5
+    assert db.query(Alert).count() == 5
+
+
+def test_closed_alert_is_not_coalesced_into(db):
+    store = AlertStore(window_s=900)
+    (first,), _ = _record(db, store, _alert(0))
+    db.get(Alert, first["id"]).is_read = True
+    db.commit()
+    store.close(first["id"])
+
+    (second,), updated = _record(db, store, _alert(1))
+    assert updated == []
+    assert second["id"] != first["id"]
+
+
+def test_row_closed_behind_the_index_gets_a_fresh_row(db):
+    store = AlertStore(window_s=900)
+    (first,), _ = _record(db, store, _alert(0))
+    # Resolved by another writer without telling the index
+    db.get(Alert, first["id"]).is_resolved = True
+    db.commit()
+
+    (second,), updated = _record(db, store, _alert(1))
+    assert updated == []
+    assert second["id"] != first["id"]
+
+
+def test_index_closed_during_the_update_still_returns_the_row(db, monkeypatch):
+    store = AlertStore(window_s=900)
+    (first,), _ = _record(db, store, _alert(0))
+    execute = db.execute
+
+    def execute_then_close(statement, *args, **kwargs):
+        result = execute(statement, *args, **kwargs)
+        store.close(first["id"])  # e.g. marked read concurrently, after the UPDATE matched
+        return result
+
+    monkeypatch.setattr(db, "execute", execute_then_close)
+    created, (merged,) = store.record(db, [_alert(1)])
+    db.commit()
+
+    assert created == []
+    assert (merged["id"], merged["occurrences"]) == (first["id"], 2)
+
+
+def test_warm_rebuilds_the_index(db):
+    store = AlertStore(window_s=900)
+    (first,), _ = _record(db, store, _alert(0))
+    db.execute(
+        Alert.__table__.update().values(last_seen=datetime.now(), timestamp=datetime.now())
+    )
+    db.commit()
+
+    fresh = AlertStore(window_s=900)
+    fresh.warm(db)
+    assert fresh.stats()["open"] == 1
+    _, (merged,) = _record(db, fresh, _alert(0) | {"timestamp": datetime.now()})
+    assert merged["id"] == first["id"]
+
+
+def test_zero_window_disables_coalescing(db):
+    store = AlertStore(window_s=0)
+    created, updated = _record(db, store, _alert(0), _alert(0), _alert(1))
+    assert (len(created), updated) == (3, [])
+    assert sorted(db.scalars(select(Alert.occurrences))) == [1, 1, 1]
+
+
+def test_rolled_back_record_leaves_the_index_and_stats_alone(db):
+    store = AlertStore(window_s=900)
+    (first,), _ = _record(db, store, _alert(0))
+
+    _, (merged,) = store.record(db, [_alert(5), _alert(6, type_="temp")])
+    assert merged["occurrences"] == 2  # Returned as it will be once committed...
+    db.rollback()
+    assert store.stats() == {"window_s": 900, "open": 1, "created": 1, "coalesced": 0}  # ...but never was
+
+    created, (merged,) = _record(db, store, _alert(7), _alert(8, type_="temp"))
+    assert merged["id"] == first["id"]
+    assert merged["occurrences"] == 2
+    assert [alert["type"] for alert in created] == ["temp"]  # Not merged into the rolled-back insert
+    assert store.stats() == {"window_s": 900, "open": 2, "created": 2, "coalesced": 1}
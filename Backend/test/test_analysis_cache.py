@@ -0,0 +1,134 @@
+import asyncio
+from datetime import datetime, timedelta
+from io import BytesIO
+from PIL import Image, ImageDraw
+from sqlalchemy import insert, select
+from app.database import AsyncSessionLocal, async_engine
+from app.models import AnalysisCacheEntry
+from app.config import settings
+from app.services.analysis_cache import AnalysisCache, dhash
+
+PHASH = 0x0F0F_0F0F_0F0F_0F0F
+
+
+def _store(cache, *items):
+    """Store (analysis_type, sha256, phash, result) items in one committed transaction."""
+    async def scenario():
+        try:
+            async with AsyncSessionLocal() as session:
+                for analysis_type, sha256, phash, result in items:
+                    await cache.store(session, analysis_type, "v1", (sha256, phash), result)
+                await session.commit()
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def _flip(phash, bits):
+    """phash with its lowest `bits` bits inverted (Hamming distance `bits`)."""
+    return phash ^ ((1 << bits) - 1)
+
+
+def _photo(flip=False):
+    image = Image.new("RGB", (640, 480), (30, 90, 40))
+    draw = ImageDraw.Draw(image)
+    for i in range(8):
+        draw.ellipse((i * 70, 40 + i * 40, i * 70 + 120, 160 + i * 40), fill=(40 + i * 25, 160, 60))
+    return image.transpose(Image.Transpose.FLIP_LEFT_RIGHT) if flip else image
+
+
+def test_dhash_of_a_re_encoded_upload_is_within_the_default_threshold():
+    original = _photo()
+    output = BytesIO()
+    original.resize((320, 240)).save(output, "JPEG", quality=60)
+    re_encoded = Image.open(BytesIO(output.getvalue()))
+
+    assert (dhash(original) ^ dhash(re_encoded)).bit_count() <= settings.ai_cache_phash_distance
+    assert (dhash(original) ^ dhash(_photo(flip=True))).bit_count() > settings.ai_cache_phash_distance
+
+
+def test_exact_hash_hit_is_scoped_by_type_and_prompt_version(db):
+    cache = AnalysisCache(enabled=True, ttl_hours=24, max_entries=10, max_distance=-1)
+    _store(cache, ("plant_health", "sha-a", PHASH, "healthy"))
+
+    entry = cache.lookup("plant_health", "v1", ("sha-a", PHASH))
+    assert entry["result"] == "healthy"
+    assert entry["hit_count"] == 1
+    assert cache.lookup("plant_health", "v2", ("sha-a", PHASH)) is None
+    assert cache.lookup("security", "v1", ("sha-a", PHASH)) is None
+    assert cache.stats() == {"enabled": True, "entries": 1, "max_entries": 10,
+                             "hits": 1, "near_hits": 0, "misses": 2, "evictions": 0}
+
+
+def test_near_match_uses_the_distance_threshold_inclusively(db):
+    cache = AnalysisCache(enabled=True, ttl_hours=24, max_entries=10, max_distance=4)
+    _store(cache, ("plant_health", "sha-a", PHASH, "healthy"))
+
+    assert cache.lookup("plant_health", "v1", ("re-encoded", _flip(PHASH, 4)))["result"] == "healthy"
+    assert cache.lookup("plant_health", "v1", ("other photo", _flip(PHASH, 5))) is None
+    assert (cache.stats()["near_hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_near_match_picks_the_closest_entry(db):
+    cache = AnalysisCache(enabled=True, ttl_hours=24, max_entries=10, max_distance=8)
+    _store(cache, ("plant_health", "sha-a", PHASH, "far"), ("plant_health", "sha-b", _flip(PHASH, 6), "near"))
+
+    assert cache.lookup("plant_health", "v1", ("sha-c", _flip(PHASH, 5)))["result"] == "near"
+
+
+def test_expired_entries_are_not_served_and_are_purged(db):
+    cache = AnalysisCache(enabled=True, ttl_hours=1, max_entries=10, max_distance=4)
+    db.execute(insert(AnalysisCacheEntry).values(
+        analysis_type="plant_health", prompt_version="v1", sha256="stale-row", phash=f"{PHASH:016x}",
+        result="stale", created_at=datetime.now() - timedelta(hours=2), last_hit_at=datetime.now(), hit_count=0,
+    ))
+    db.commit()
+    _store(cache, ("plant_health", "sha-a", PHASH, "healthy"))
+    cache._entries[("plant_health", "v1", "sha-a")]["created_at"] -= timedelta(hours=2)
+
+    assert cache.lookup("plant_health", "v1", ("sha-b", PHASH)) is None  # No near match on expired entries
+    assert cache.lookup("plant_health", "v1", ("sha-a", PHASH)) is None
+    assert cache.stats()["entries"] == 0
+    # Storing also deletes expired rows from the table
+    assert list(db.scalars(select(AnalysisCacheEntry.sha256))) == ["sha-a"]
+
+
+def test_least_recently_used_entry_is_evicted(db):
+    cache = AnalysisCache(enabled=True, ttl_hours=24, max_entries=2, max_distance=-1)
+    _store(cache, ("plant_health", "sha-a", 1, "a"), ("plant_health", "sha-b", 2, "b"))
+    cache.lookup("plant_health", "v1", ("sha-a", 1))  # a is now more recent than b
+
+    _store(cache, ("plant_health", "sha-c", 3, "c"))
+
+    assert cache.lookup("plant_health", "v1", ("sha-b", 2)) is None
+    assert cache.lookup("plant_health", "v1", ("sha-a", 1))["result"] == "a"
+    assert cache.stats()["evictions"] == 1
+    assert sorted(db.scalars(select(AnalysisCacheEntry.sha256))) == ["sha-a", "sha-c"]
+
+
+def test_warm_restores_persisted_entries_in_lru_order(db):
+    cache = AnalysisCache(enabled=True, ttl_hours=24, max_entries=10, max_distance=4)
+    _store(cache, ("plant_health", "sha-a", PHASH, "a"), ("plant_health", "sha-b", 2, "b"))
+
+    async def hit_a():
+        try:
+            async with AsyncSessionLocal() as session:
+                entry = cache.lookup("plant_health", "v1", ("sha-a", PHASH))
+                await cache.record_hit(session, entry)
+                await session.commit()
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(hit_a())
+
+    restarted = AnalysisCache(enabled=True, ttl_hours=24, max_entries=10, max_distance=4)
+    restarted.warm(db)
+
+    assert [key[2] for key in restarted._entries] == ["sha-b", "sha-a"]  # Most recently hit last
+    entry = restarted.lookup("plant_health", "v1", ("re-encoded", _flip(PHASH, 2)))
+    assert (entry["result"], entry["hit_count"]) == ("a", 2)
+
+    smaller = AnalysisCache(enabled=True, ttl_hours=24, max_entries=1, max_distance=4)
+    smaller.warm(db)
+    assert [key[2] for key in smaller._entries] == ["sha-a"]
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import insert
+from app.models import SensorReading
+from app.services.downsample import downsample_series, load_series, lttb
+
+
+def test_lttb_keeps_endpoints_and_threshold():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    keep = lttb(x, y, 100)
+    assert len(keep) == 100
+    assert keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+
+
+def test_lttb_keeps_spikes():
+    x = np.arange(500, dtype=np.float64)
+    y = np.zeros(500)
+    y[123], y[377] = 50.0, -40.0
+    keep = lttb(x, y, 20)
+    assert 123 in keep and 377 in keep
+
+
+def test_lttb_returns_everything_when_not_reducing():
+    x = np.arange(10, dtype=np.float64)
+    assert list(lttb(x, x, 10)) == list(range(10))
+    assert list(lttb(x, x, 2)) == list(range(10))
+
+
+def test_load_and_downsample_from_db(db):
+    start = datetime(2026, 3, 1, 8)
+    db.execute(insert(SensorReading), [
+        {
+            "timestamp": start + timedelta(seconds=30 * i),
+            "sensor_id": 1 + i % 2,
+            "zone": "main",
+            "moisture": float(i),
+            "temperature": 20.0,
+            "humidity": 50.0,
+            "ph": 6.5,
+        }
+        for i in range(400)
+    ])
+    db.commit()
+
+    timestamps, values = load_series(db, start, start + timedelta(hours=4), ["moisture"], sensor_id=1, chunk_size=64)
+    assert len(timestamps) == 200
+    assert values[:, 0].tolist() == [float(i) for i in range(0, 400, 2)]
+
+    series = downsample_series(timestamps, values, ["moisture"], 50)
+    assert len(series["moisture"]) == 50
+    assert series["moisture"][0] == {"timestamp": start.isoformat(), "value": 0.0}
+    assert series["moisture"][-1]["value"] == 398.0
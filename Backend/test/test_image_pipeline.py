@@ -0,0 +1,58 @@
+import asyncio
+import base64
+import textwrap
+from concurrent.futures import Executor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+import pytest
+from PIL import Image
+from app.services.image_pipeline import ImageError, ImagePipeline, prepare_image
+
+
+def _jpeg(width=640, height=480) -> bytes:
+    output = BytesIO()
+    Image.new("RGB", (width, height), (40, 120, 60)).save(output, "JPEG")
+    return output.getvalue()
+
+
+def test_prepare_downscales_and_fingerprints():
+    prepared = prepare_image(_jpeg(), max_edge=320, quality=80)
+    assert (prepared.width, prepared.height) == (320, 240)
+    assert prepared.jpeg.startswith(b"\xff\xd8")
+    assert prepared == prepare_image(_jpeg(), max_edge=320, quality=80)
+
+
+def test_prepare_accepts_line_wrapped_base64():
+    data = _jpeg()
+    wrapped = "\n".join(textwrap.wrap(base64.b64encode(data).decode(), 76)) + "\n"
+    assert prepare_image(wrapped, 320, 80) == prepare_image(data, 320, 80)
+
+
+@pytest.mark.parametrize("data", [b"not an image", "bm90IGFuIGltYWdl", "%%%"])
+def test_unreadable_upload_is_an_image_error(data):
+    with pytest.raises(ImageError):
+        prepare_image(data, 320, 80)
+
+
+class BrokenExecutor(Executor):
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, fn, *args, **kwargs):
+        raise BrokenProcessPool("a worker died")
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self.shut_down = True
+
+
+def test_broken_pool_is_replaced_and_retried():
+    pipeline = ImagePipeline(workers=1, max_edge=320, quality=80)
+    broken = pipeline._pool = BrokenExecutor()
+    try:
+        prepared = asyncio.run(pipeline.prepare(_jpeg()))
+        assert prepared.width == 320
+        assert broken.shut_down
+        assert pipeline._pool is not broken
+        assert pipeline._pool._mp_context.get_start_method() == "spawn"
+    finally:
+        pipeline.shutdown()
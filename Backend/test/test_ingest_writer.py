@@ -0,0 +1,76 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import func, select
+from app.models import SensorReading
+from app.services.ingest_writer import IngestWriter, InvalidReading
+
+
+def _payload(sensor_id=1, moisture=40.0):
+    return {"id": sensor_id, "moisture": moisture, "temperature": 22.0, "humidity": 55.0, "ph": 6.5, "zone": "main"}
+
+
+def test_writer_persists_queued_readings_in_batches(db):
+    writer = IngestWriter(batch_size=50, flush_interval_ms=20, max_queue=1000)
+    for i in range(120):
+        assert writer.submit(_payload(sensor_id=i % 3 + 1))
+
+    writer.start(loop=None)
+    writer.stop()
+
+    assert db.scalar(select(func.count()).select_from(SensorReading)) == 120
+    stats = writer.stats()
+    assert stats["rows_written"] == 120
+    assert stats["flushes"] == 3  # 50 + 50 + 20
+    assert stats["dropped"] == 0
+
+
+def test_writer_drops_instead_of_blocking_when_full():
+    writer = IngestWriter(batch_size=10, flush_interval_ms=20, max_queue=2)
+    assert writer.submit(_payload())
+    assert writer.submit(_payload())
+    assert writer.is_saturated()
+    assert not writer.submit(_payload())
+    assert writer.stats()["dropped"] == 1
+
+
+def test_collect_stops_at_batch_size():
+    writer = IngestWriter(batch_size=4, flush_interval_ms=1000, max_queue=100)
+    for _ in range(10):
+        writer.submit(_payload())
+    batch, stopping = writer._collect()
+    assert len(batch) == 4
+    assert not stopping
+
+
+@pytest.mark.parametrize("bad", [
+    {"moisture": None},
+    {"temperature": "warm"},
+    {"ph": float("nan")},
+    {"humidity": [55]},
+])
+def test_submit_rejects_and_counts_invalid_readings(bad):
+    writer = IngestWriter(batch_size=10, flush_interval_ms=20, max_queue=10)
+    with pytest.raises(InvalidReading):
+        writer.submit({**_payload(), **bad})
+    assert writer.submit({**_payload(), "moisture": "41.5"})  # Numeric strings are coerced
+    assert writer.stats()["rejected"] == 1
+    assert writer._queue.qsize() == 1
+
+
+def test_failed_batch_is_bisected_so_valid_rows_are_saved(db):
+    writer = IngestWriter(batch_size=20, flush_interval_ms=20, max_queue=100)
+    batch = [
+        {"sensor_id": 1, "moisture": float(i), "temperature": 22.0, "humidity": 55.0, "ph": 6.5,
+         "zone": "main", "timestamp": datetime(2026, 3, 1, 8, i)}
+        for i in range(10)
+    ]
+    batch.insert(7, {**batch[0], "moisture": None})  # Violates NOT NULL, as a raw null payload would
+
+    writer._flush(batch)
+
+    saved = db.scalars(select(SensorReading.moisture).order_by(SensorReading.timestamp, SensorReading.id)).all()
+    assert saved == [float(i) for i in range(10)]
+    stats = writer.stats()
+    assert stats["rows_written"] == 10
+    assert stats["rows_lost"] == 1
+    assert stats["failed_flushes"] >= 1
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import pytest
+from app.services.irrigation import GPIOBackend, IrrigationController, SimulatedGPIO
+
+PINS = {"1": {"sprinkler": 17, "pipe": 27}, "2": {"sprinkler": 22, "pipe": 23}}
+
+
+@pytest.fixture
+def controller_factory(tmp_path):
+    path = tmp_path / "pinconfig.json"
+    path.write_text(json.dumps(PINS))
+
+    def make(**options):
+        options = {"humidity_threshold": 40, "debounce_readings": 3, "water_s": 0.05,
+                   "cooldown_s": 60, "max_concurrent": 1, **options}
+        controller = IrrigationController(pin_config_path=str(path), **options)
+        controller.load(SimulatedGPIO())
+        return controller
+
+    return make
+
+
+def _low(sensor_id=1, humidity=30.0):
+    return {"sensor_id": sensor_id, "humidity": humidity}
+
+
+def test_backend_must_implement_setup_and_write():
+    class Incomplete(GPIOBackend):
+        def setup(self, pin):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_debounce_then_water_then_cooldown(controller_factory):
+    async def scenario():
+        controller = controller_factory()
+        controller.observe([_low(), _low()])
+        assert controller.status()["modules"][0]["state"] == "idle"
+        controller.observe([_low(humidity=50), _low(), _low()])  # A good reading resets the streak
+        assert not controller._tasks
+        controller.observe([_low()])
+        assert controller._state[1] == "queued"
+        await asyncio.sleep(0.01)
+        assert controller.backend.pins[17] is True
+        await asyncio.sleep(0.1)
+        assert controller.backend.pins[17] is False
+        controller.observe([_low()] * 3)  # Cooling down: ignored
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller._state[1] == "cooldown"
+    assert controller.status()["waterings"] == 1
+    assert controller.status()["debounced"] == 1
+
+
+def test_valve_slots_queue_extra_modules(controller_factory):
+    async def scenario():
+        controller = controller_factory(max_concurrent=1)
+        controller.start(1)
+        controller.start(2)
+        await asyncio.sleep(0.01)
+        states = dict(controller._state)
+        await asyncio.gather(*controller._tasks.values())
+        return controller, states
+
+    controller, states = asyncio.run(scenario())
+    assert states == {1: "watering", 2: "queued"}
+    opened = [pin for _, pin, on in controller.backend.history if on]
+    assert opened == [17, 22]
+
+
+def test_cancelling_a_queued_watering_skips_cooldown(controller_factory):
+    async def scenario():
+        controller = controller_factory(max_concurrent=1, water_s=10)
+        controller.start(1)
+        controller.start(2)
+        await asyncio.sleep(0.01)
+        assert controller.stop(2)  # Still waiting for a valve slot
+        await asyncio.sleep(0.01)
+        state_2 = controller._state[2]
+        restarted = controller.start(2)
+        await controller.shutdown()
+        return controller, state_2, restarted
+
+    controller, state_2, restarted = asyncio.run(scenario())
+    assert state_2 == "idle"
+    assert restarted
+    assert 22 not in [pin for _, pin, on in controller.backend.history if on]
+
+
+def test_stopping_an_open_valve_closes_it_and_cools_down(controller_factory):
+    async def scenario():
+        controller = controller_factory(water_s=10)
+        controller.start(1)
+        await asyncio.sleep(0.01)
+        controller.stop(1)
+        await asyncio.sleep(0.01)
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller.backend.pins[17] is False
+    assert controller._state[1] == "cooldown"
+    assert not controller.start(1)
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select
+from app.models import SensorReading
+from app.schemas import SensorReadingResponse
+from app.services.ingest_writer import IngestWriter
+from app.services.latest_cache import latest_cache
+
+START = datetime(2026, 3, 1, 8)
+
+
+def _row(minute, sensor_id, zone="main", moisture=40.0):
+    return {"timestamp": START + timedelta(minutes=minute), "sensor_id": sensor_id, "zone": zone,
+            "moisture": moisture, "temperature": 20.0, "humidity": 50.0, "ph": 6.5}
+
+
+def _db_latest(db):
+    """Newest reading per sensor and per zone, computed the slow way."""
+    by_sensor, by_zone = {}, {}
+    for reading in db.scalars(select(SensorReading).order_by(SensorReading.timestamp, SensorReading.id)):
+        json = SensorReadingResponse.model_validate(reading).model_dump(mode="json")
+        by_sensor[reading.sensor_id] = by_zone[reading.zone] = json
+    return [by_sensor[sensor_id] for sensor_id in sorted(by_sensor)], by_zone
+
+
+def _cached(api, zone="main"):
+    async def request(client):
+        latest = await client.get("/api/sensors/latest", params={"zone": zone})
+        everything = await client.get("/api/sensors/latest/all")
+        return latest.json(), everything.json()
+
+    return api(request)
+
+
+def _assert_cache_matches_db(db, api, zone="main"):
+    expected_all, expected_by_zone = _db_latest(db)
+    latest, everything = _cached(api, zone)
+    assert latest == expected_by_zone[zone]
+    assert everything == expected_all
+
+
+def test_warm_up_loads_the_newest_reading_per_sensor_and_zone(db, api):
+    db.execute(insert(SensorReading), [_row(0, 1), _row(5, 2), _row(3, 1), _row(9, 3, zone="field_a")])
+    db.commit()
+
+    latest_cache.warm(db)
+
+    _assert_cache_matches_db(db, api)
+    _assert_cache_matches_db(db, api, zone="field_a")
+
+
+def test_ingest_updates_the_cache(db, api):
+    db.execute(insert(SensorReading), [_row(0, 1), _row(1, 2)])
+    db.commit()
+    latest_cache.warm(db)
+
+    # The batched MQTT writer...
+    writer = IngestWriter(batch_size=10, flush_interval_ms=20, max_queue=10)
+    writer.submit({"id": 2, "moisture": 33.0, "temperature": 21.0, "humidity": 50.0, "ph": 6.4, "zone": "main"})
+    writer.start(loop=None)
+    writer.stop()
+    _assert_cache_matches_db(db, api)
+
+    # ...and the POST endpoint
+    posted = api(lambda client: client.post("/api/sensors/", json={
+        "sensor_id": 4, "moisture": 12.5, "temperature": 19.0, "humidity": 48.0, "ph": 7.0,
+    }))
+    assert posted.status_code == 200
+    db.expire_all()
+    _assert_cache_matches_db(db, api)
+    assert _cached(api)[0]["id"] == posted.json()["id"]
+
+
+def test_deleting_a_cached_reading_refreshes_from_the_db(db, api):
+    db.execute(insert(SensorReading), [_row(0, 1), _row(2, 1), _row(1, 2)])
+    db.commit()
+    latest_cache.warm(db)
+    newest_id = _cached(api)[0]["id"]
+
+    older = db.scalar(select(SensorReading.id).where(SensorReading.timestamp == START))
+    assert api(lambda client: client.delete(f"/api/sensors/{older}")).status_code == 200
+    _assert_cache_matches_db(db, api)  # Not cached, nothing to refresh
+
+    assert api(lambda client: client.delete(f"/api/sensors/{newest_id}")).status_code == 200
+    db.expire_all()
+    _assert_cache_matches_db(db, api)
+    assert _cached(api)[0]["sensor_id"] == 2
@@ -0,0 +1,88 @@
+import asyncio
+import time
+from datetime import datetime
+from app.services.liveness import LivenessTracker, parse_timeout_overrides
+
+
+def test_parse_timeout_overrides_skips_invalid_items():
+    assert parse_timeout_overrides("3:120, 7:600,,bad,8:x") == {3: 120.0, 7: 600.0}
+
+
+def test_sensor_goes_offline_at_its_deadline():
+    tracker = LivenessTracker(default_timeout_s=30, overrides={})
+    assert tracker.seen(1, at=100) is True
+    assert tracker.seen(1, at=110) is False  # Already online
+    assert tracker.expire(now=139.9) == []
+    assert tracker.expire(now=140) == [1]
+    assert tracker.online[1] is False
+    assert tracker.last_seen[1] == datetime.utcfromtimestamp(110)
+
+
+def test_readings_rearm_lazily_with_one_heap_entry_per_sensor():
+    tracker = LivenessTracker(default_timeout_s=30, overrides={})
+    for at in range(100, 200):
+        tracker.seen(1, at=at)
+    assert len(tracker._heap) == 1  # Readings only move the deadline
+    assert tracker.expire(now=150) == []  # Stale entry re-armed at the real deadline
+    assert len(tracker._heap) == 1
+    assert tracker.expire(now=228.9) == []  # Last reading at 199
+    assert tracker.expire(now=229) == [1]
+
+
+def test_sensor_comes_back_online():
+    tracker = LivenessTracker(default_timeout_s=10, overrides={})
+    tracker.seen(1, at=0)
+    assert tracker.expire(now=10) == [1]
+    assert tracker.seen(1, at=20) is True
+    assert tracker.expire(now=25) == []
+    assert tracker.expire(now=30) == [1]
+
+
+def test_per_sensor_timeouts():
+    tracker = LivenessTracker(default_timeout_s=30, overrides={2: 5})
+    tracker.seen(1, at=0)
+    tracker.seen(2, at=0)
+    assert tracker.expire(now=5) == [2]
+
+    # Shortening a timeout takes effect straight away; restoring the default moves it back
+    tracker.set_timeout(1, 10)
+    assert tracker.expire(now=10) == [1]
+    tracker.seen(3, at=10)
+    tracker.set_timeout(3, 1)
+    tracker.set_timeout(3, None)
+    assert tracker.expire(now=20) == []
+    assert tracker.expire(now=40) == [3]
+
+
+def test_restore_marks_stale_sensors_offline():
+    tracker = LivenessTracker(default_timeout_s=30, overrides={})
+    now = time.time()
+    tracker.restore([
+        {"sensor_id": 1, "timestamp": datetime.fromtimestamp(now - 5)},
+        {"sensor_id": 2, "timestamp": datetime.fromtimestamp(now - 3600)},
+    ])
+    assert tracker.online == {1: True, 2: False}
+    assert tracker.stats()["heap_size"] == 1
+
+
+def test_run_reports_offline_at_the_deadline_without_polling():
+    async def scenario():
+        tracker = LivenessTracker(default_timeout_s=0.2, overrides={})
+        offline = []
+
+        async def on_offline(sensor_id):
+            offline.append((sensor_id, time.monotonic()))
+
+        runner = asyncio.create_task(tracker.run(on_offline))
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        tracker.seen(1)
+        await asyncio.sleep(0.1)
+        tracker.seen(2)  # Later deadline; must not delay sensor 1
+        await asyncio.sleep(0.4)
+        runner.cancel()
+        return started, offline
+
+    started, offline = asyncio.run(scenario())
+    assert [sensor_id for sensor_id, _ in offline] == [1, 2]
+    assert 0.15 <= offline[0][1] - started < 0.3
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import insert, select
+from app.models import SensorReading
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, keyset_page, set_next_cursor
+
+
+def test_cursor_round_trip():
+    timestamp = datetime(2026, 3, 1, 12, 30, 15, 123456)
+    cursor = encode_cursor(timestamp, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (timestamp, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor(datetime(2026, 1, 1), 1)[:-3]])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor)
+    assert excinfo.value.status_code == 400
+
+
+def test_pages_cover_every_row_once_with_tied_timestamps(db):
+    start = datetime(2026, 3, 1, 8)
+    # Pairs of readings share a timestamp, so ordering must fall back to the id
+    db.execute(insert(SensorReading), [
+        {"timestamp": start + timedelta(minutes=i // 2), "sensor_id": 1, "zone": "main",
+         "moisture": 1.0, "temperature": 1.0, "humidity": 1.0, "ph": 1.0}
+        for i in range(25)
+    ])
+    db.commit()
+
+    seen, cursor = [], None
+    while True:
+        rows = db.scalars(keyset_page(select(SensorReading), SensorReading, cursor).limit(10)).all()
+        seen += [row.id for row in rows]
+        response = Response()
+        set_next_cursor(response, rows, 10)
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+
+    expected = db.scalars(
+        select(SensorReading.id).order_by(SensorReading.timestamp.desc(), SensorReading.id.desc())
+    ).all()
+    assert seen == expected
+    assert len(seen) == 25
@@ -0,0 +1,58 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.services.mqtt_async import AsyncMQTTListener
+from app.services.payload_decoder import (
+    BINARY_FRAME,
+    PayloadError,
+    decode_payload,
+    encode_binary,
+)
+
+READING = {"id": 7, "moisture": 41.5, "temperature": 22.1, "humidity": 63.25, "ph": 6.8, "zone": "field_a"}
+
+
+def test_binary_frame_round_trip():
+    frame = encode_binary(READING)
+    assert len(frame) == BINARY_FRAME.size
+    assert decode_payload("AgriMonitor/bin", frame) == READING
+
+
+def test_binary_frame_unknown_zone_code():
+    frame = BINARY_FRAME.pack(1, 1.0, 2.0, 3.0, 4.0, 42)
+    assert decode_payload("AgriMonitor/bin", frame)["zone"] == "zone_42"
+
+
+def test_binary_frame_wrong_length():
+    with pytest.raises(PayloadError):
+        decode_payload("AgriMonitor/bin", encode_binary(READING)[:-1])
+
+
+def test_json_payload():
+    data = decode_payload("AgriMonitor", b'{"id": 2, "moisture": 30, "temperature": 20, "humidity": 50}')
+    assert data == {"id": 2, "moisture": 30, "temperature": 20, "humidity": 50}
+
+
+def test_legacy_dict_literal_payload():
+    data = decode_payload("AgriMonitor", b"{'id': 3, 'moisture': 30.5, 'temperature': 20, 'humidity': 50}")
+    assert data["id"] == 3 and data["moisture"] == 30.5
+
+
+@pytest.mark.parametrize("payload", [b"not a reading", b"[1, 2, 3]", b"\xff\xfe"])
+def test_invalid_text_payload(payload):
+    with pytest.raises(PayloadError):
+        decode_payload("AgriMonitor", payload)
+
+
+def test_listener_keeps_ph_from_binary_frames():
+    async def scenario():
+        listener = AsyncMQTTListener(queue_max=10)
+        listener._queue = asyncio.Queue(maxsize=10)
+        listener.on_message(listener.client, None, SimpleNamespace(topic="AgriMonitor/bin", payload=encode_binary(READING)))
+        listener.on_message(listener.client, None, SimpleNamespace(topic="AgriMonitor", payload=b'{"moisture": 1, "temperature": 2, "humidity": 3}'))
+        listener.on_message(listener.client, None, SimpleNamespace(topic="AgriMonitor", payload=b"garbage"))
+        return [listener._queue.get_nowait() for _ in range(listener._queue.qsize())]
+
+    binary, text = asyncio.run(scenario())
+    assert binary["ph"] == 6.8
+    assert text["ph"] == 0
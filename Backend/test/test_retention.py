@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import func, insert, select
+from app.models import Alert, SensorReading, SensorRollupHour, SensorRollupMinute
+from app.services import rollups
+from app.services.retention import RetentionJob
+
+NOW = datetime(2026, 6, 15, 12, 30)
+
+
+def _reading(timestamp):
+    return {"timestamp": timestamp, "sensor_id": 1, "zone": "main",
+            "moisture": 40.0, "temperature": 20.0, "humidity": 50.0, "ph": 6.5}
+
+
+def _count(db, model):
+    return db.scalar(select(func.count()).select_from(model))
+
+
+def _job(tmp_path, **overrides):
+    options = dict(
+        retention_days=30,
+        alert_retention_days=30,
+        minute_rollup_retention_days=7,
+        archive_dir=str(tmp_path),
+        chunk_size=7,
+        chunk_pause_ms=0,
+        vacuum=False,
+    )
+    options.update(overrides)
+    return RetentionJob(**options)
+
+
+def test_archives_whole_months_and_purges_them(db, tmp_path):
+    old = [_reading(datetime(2026, 3, 1) + timedelta(hours=i)) for i in range(40)]
+    recent = [_reading(NOW - timedelta(days=1, minutes=i)) for i in range(5)]
+    db.execute(insert(SensorReading), old + recent)
+    db.commit()
+
+    summary = _job(tmp_path).run(NOW)
+
+    assert summary["readings_purged"] == 40
+    assert len(summary["archived_files"]) == 1
+    assert _count(db, SensorReading) == 5
+
+
+def test_archives_are_parquet_with_every_purged_row(db, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    old = [_reading(datetime(2026, 3, 1) + timedelta(hours=i)) for i in range(40)]
+    db.execute(insert(SensorReading), old)
+    db.commit()
+
+    (path,) = _job(tmp_path).run(NOW)["archived_files"]
+
+    assert path.endswith("sensor_readings-2026-03.parquet")
+    table = pq.read_table(path)
+    assert table.num_rows == 40
+    assert table.column("timestamp").to_pylist() == [row["timestamp"] for row in old]
+
+
+def test_purges_old_minute_rollups_but_keeps_hours(db, tmp_path):
+    rows = [_reading(NOW - timedelta(days=10, minutes=i)) for i in range(30)]
+    rows += [_reading(NOW - timedelta(days=2, minutes=i)) for i in range(20)]
+    rollups.apply_rollups(db, rows)
+    db.commit()
+    hours_before = _count(db, SensorRollupHour)
+
+    summary = _job(tmp_path).run(NOW)
+
+    assert summary["minute_rollups_purged"] == 30
+    assert _count(db, SensorRollupMinute) == 20
+    assert _count(db, SensorRollupHour) == hours_before
+    assert db.scalar(select(func.min(SensorRollupMinute.bucket))) >= NOW - timedelta(days=7, hours=1)
+
+
+def test_minute_rollup_pruning_can_be_disabled(db, tmp_path):
+    rollups.apply_rollups(db, [_reading(NOW - timedelta(days=400))])
+    db.commit()
+
+    summary = _job(tmp_path, minute_rollup_retention_days=0).run(NOW)
+
+    assert summary["minute_rollups_purged"] == 0
+    assert _count(db, SensorRollupMinute) == 1
+
+
+def test_purges_only_old_resolved_alerts(db, tmp_path):
+    old = NOW - timedelta(days=60)
+    db.execute(insert(Alert), [
+        {"timestamp": old, "type": "moisture", "severity": "high", "message": "old resolved", "is_read": True, "is_resolved": True},
+        {"timestamp": old, "type": "moisture", "severity": "high", "message": "old open", "is_read": False, "is_resolved": False},
+        {"timestamp": NOW, "type": "moisture", "severity": "high", "message": "new resolved", "is_read": True, "is_resolved": True},
+    ])
+    db.commit()
+
+    summary = _job(tmp_path).run(NOW)
+
+    assert summary["alerts_purged"] == 1
+    assert sorted(db.scalars(select(Alert.message))) == ["new resolved", "old open"]
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert, select
+from app.models import SensorReading, SensorRollupHour, SensorRollupMinute
+from app.services import rollups
+
+START = datetime(2026, 3, 1, 9, 40)
+
+
+def _rows(count, step=timedelta(minutes=1), sensor_id=1):
+    return [
+        {
+            "timestamp": START + i * step,
+            "sensor_id": sensor_id,
+            "zone": "main",
+            "moisture": 30.0 + i,
+            "temperature": 20.0,
+            "humidity": 50.0 - i,
+            "ph": 6.5,
+        }
+        for i in range(count)
+    ]
+
+
+def test_aggregate_folds_rows_into_buckets():
+    rows = _rows(3, step=timedelta(seconds=10))
+    (minute,) = rollups.aggregate(rows, "minute")
+    assert minute["bucket"] == START
+    assert minute["count"] == 3
+    assert minute["moisture_sum"] == 93.0
+    assert (minute["moisture_min"], minute["moisture_max"]) == (30.0, 32.0)
+
+
+def test_incremental_upserts_merge_into_existing_buckets(db):
+    rows = _rows(90)
+    rollups.apply_rollups(db, rows[:50])
+    rollups.apply_rollups(db, rows[50:])
+    db.commit()
+
+    assert db.query(SensorRollupMinute).count() == 90
+    hours = {row.bucket: row for row in db.scalars(select(SensorRollupHour))}
+    assert sorted(hours) == [datetime(2026, 3, 1, 9), datetime(2026, 3, 1, 10), datetime(2026, 3, 1, 11)]
+    assert sum(row.count for row in hours.values()) == 90
+    ten = hours[datetime(2026, 3, 1, 10)]
+    assert (ten.count, ten.moisture_min, ten.moisture_max) == (60, 50.0, 109.0)
+
+
+def test_summarize_matches_raw_readings(db):
+    rows = _rows(90)
+    rollups.apply_rollups(db, rows)
+    db.commit()
+
+    since = START + timedelta(minutes=5, seconds=30)
+    summary = rollups.summarize(db, "main", since)
+    expected = [row for row in rows if row["timestamp"] >= since.replace(second=0)]
+    assert summary["reading_count"] == len(expected)
+    assert summary["moisture"]["avg"] == pytest.approx(sum(r["moisture"] for r in expected) / len(expected))
+    assert summary["humidity"]["min"] == min(r["humidity"] for r in expected)
+    assert rollups.summarize(db, "elsewhere", since) is None
+
+
+def test_history_and_backfill_agree(db):
+    rows = _rows(90)
+    db.execute(insert(SensorReading), rows)
+    rollups.apply_rollups(db, rows)
+    db.commit()
+    before = rollups.history(db, "main", START, "hour")
+
+    assert rollups.backfill(db) == 90
+    assert rollups.history(db, "main", START, "hour") == before
+    assert [point["reading_count"] for point in before] == [20, 60, 10]
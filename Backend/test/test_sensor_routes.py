@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import insert
+from app.models import SensorReading
+from app.routers.sensors import EXPORT_COLUMNS
+from app.services import rollups
+
+
+@pytest.fixture
+def behind_utc(monkeypatch):
+    """Run in a timezone three hours behind UTC, so local and UTC clocks disagree."""
+    monkeypatch.setenv("TZ", "America/Sao_Paulo")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _reading(timestamp, moisture=40.0):
+    return {"timestamp": timestamp, "sensor_id": 1, "zone": "main",
+            "moisture": moisture, "temperature": 20.0, "humidity": 50.0, "ph": 6.5}
+
+
+def test_history_and_stats_windows_are_local_time(db, api, behind_utc):
+    rollups.apply_rollups(db, [_reading(datetime.now() - timedelta(minutes=30))])
+    db.commit()
+
+    history = api(lambda client: client.get("/api/sensors/history", params={"hours": 2, "resolution": "minute"}))
+    stats = api(lambda client: client.get("/api/sensors/stats", params={"hours": 2}))
+
+    assert len(history.json()["points"]) == 1
+    assert stats.status_code == 200
+    assert stats.json()["reading_count"] == 1
+
+
+def test_series_accepts_timezone_aware_bounds(db, api, behind_utc):
+    now = datetime.now().replace(microsecond=0)
+    db.execute(insert(SensorReading), [_reading(now - timedelta(minutes=m), moisture=float(m)) for m in (10, 90)])
+    db.commit()
+
+    # One hour back, written in UTC: only the reading from 10 minutes ago is inside
+    start = (now - timedelta(hours=1)).astimezone(timezone.utc).isoformat()
+    response = api(lambda client: client.get("/api/sensors/series", params={"start": start}))
+
+    assert response.status_code == 200
+    assert response.json()["raw_count"] == 1
+    assert response.json()["series"]["moisture"][0]["value"] == 10.0
+
+
+def _export_fixture(db):
+    start = datetime(2026, 3, 1, 8)
+    rows = [
+        {**_reading(start + timedelta(minutes=i // 2), moisture=float(i)), "sensor_id": 1 + i % 2,
+         "zone": "main" if i < 8 else "field_a"}
+        for i in range(10)
+    ]
+    db.execute(insert(SensorReading), list(reversed(rows)))  # Insert order must not leak into the export
+    db.commit()
+    return start
+
+
+def test_export_ndjson_filters_and_orders_oldest_first(db, api):
+    start = _export_fixture(db)
+    response = api(lambda client: client.get("/api/sensors/export", params={
+        "format": "ndjson", "sensor_id": 1, "zone": "main",
+        "start": (start + timedelta(minutes=1)).isoformat(), "end": (start + timedelta(minutes=3)).isoformat(),
+    }))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["moisture"] for line in lines] == [2.0, 4.0, 6.0]
+    assert [line["timestamp"] for line in lines] == sorted(line["timestamp"] for line in lines)
+    assert set(lines[0]) == set(EXPORT_COLUMNS)
+
+
+def test_export_csv_has_a_header_and_every_row(db, api):
+    _export_fixture(db)
+    response = api(lambda client: client.get("/api/sensors/export", params={"format": "csv"}))
+
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == 'attachment; filename="sensor-readings-all.csv"'
+    header, *rows = list(csv.reader(io.StringIO(response.text)))
+    assert tuple(header) == EXPORT_COLUMNS
+    assert len(rows) == 10
+    assert [(row[1], int(row[0])) for row in rows] == sorted((row[1], int(row[0])) for row in rows)
+    assert [row[3] for row in rows[-2:]] == ["field_a", "field_a"]
+
+
+def test_export_mixes_aware_and_naive_bounds(db, api, behind_utc):
+    start = _export_fixture(db)
+    aware_end = (start + timedelta(minutes=1)).astimezone(timezone.utc).isoformat()
+    response = api(lambda client: client.get("/api/sensors/export", params={
+        "format": "ndjson", "start": start.isoformat(), "end": aware_end,
+    }))
+
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 4
+
+    backwards = api(lambda client: client.get("/api/sensors/export", params={
+        "start": aware_end, "end": start.isoformat(),
+    }))
+    assert backwards.status_code == 400
@@ -0,0 +1,207 @@
+import asyncio
+import pytest
+from app.config import settings
+from app.routers.websocket import ClientConnection, ConnectionManager, OutboundMessage
+
+
+class FakeWebSocket:
+    """Records frames; send_text can be made to fail or hang."""
+
+    def __init__(self, fail: bool = False, hang: bool = False):
+        self.fail = fail
+        self.hang = hang
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.fail:
+            raise RuntimeError("connection reset")
+        if self.hang:
+            await asyncio.Event().wait()
+        self.sent.append(text)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def _run_writer_until_closed(websocket):
+    async def scenario():
+        manager = ConnectionManager()
+        await manager.connect(websocket)
+        task = manager.clients[websocket].task
+        manager.send(websocket, {"type": "ping"})
+        await asyncio.wait_for(task, 1)
+        return manager
+
+    return asyncio.run(scenario())
+
+
+def test_send_error_closes_with_1011():
+    websocket = FakeWebSocket(fail=True)
+    manager = _run_writer_until_closed(websocket)
+    assert websocket.closed_with == 1011
+    assert websocket not in manager.clients
+
+
+def test_send_timeout_closes_with_1013(monkeypatch):
+    monkeypatch.setattr(settings, "ws_send_timeout_s", 0.05)
+    websocket = FakeWebSocket(hang=True)
+    manager = _run_writer_until_closed(websocket)
+    assert websocket.closed_with == 1013
+    assert websocket not in manager.clients
+
+
+def test_full_queue_drops_oldest(monkeypatch):
+    monkeypatch.setattr(settings, "ws_slow_client_policy", "drop_oldest")
+
+    async def scenario():
+        client = ClientConnection(FakeWebSocket(), queue_size=2)
+        for i in range(3):
+            assert client.enqueue(OutboundMessage({"type": "ping", "n": i}))
+        return client
+
+    client = asyncio.run(scenario())
+    assert client.dropped == 1
+    assert [client.queue.get_nowait().message["n"] for _ in range(2)] == [1, 2]
+
+
+def test_full_queue_disconnect_policy(monkeypatch):
+    monkeypatch.setattr(settings, "ws_slow_client_policy", "disconnect")
+
+    async def scenario():
+        client = ClientConnection(FakeWebSocket(), queue_size=1)
+        return client.enqueue(OutboundMessage({"type": "ping"})), client.enqueue(OutboundMessage({"type": "ping"}))
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_alerts_are_routed_by_sensor():
+    from app.routers import websocket as ws
+
+    async def scenario():
+        manager = ConnectionManager()
+        sensor_3, sensor_4, everything = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        for websocket in (sensor_3, sensor_4, everything):
+            await manager.connect(websocket)
+        manager.subscribe(sensor_3, {"sensor": frozenset({3})})
+        manager.subscribe(sensor_4, {"sensor": frozenset({4})})
+        original, ws.manager = ws.manager, manager
+        try:
+            await ws.broadcast_alert({"id": 1, "type": "moisture", "zone": "main", "sensor_id": 3})
+            await ws.broadcast_alert_update({"id": 1, "type": "moisture", "zone": "main", "sensor_id": 3})
+        finally:
+            ws.manager = original
+        await asyncio.sleep(0.05)  # let the writer tasks deliver
+        return {"sensor_3": len(sensor_3.sent), "sensor_4": len(sensor_4.sent), "everything": len(everything.sent)}
+
+    assert asyncio.run(scenario()) == {"sensor_3": 2, "sensor_4": 0, "everything": 2}
+
+
+def _reading(sensor_id, reading_id, moisture=40.0, temperature=22.0):
+    message = {
+        "type": "sensor_reading",
+        "data": {
+            "id": reading_id,
+            "sensorId": sensor_id,
+            "timestamp": "2026-01-01T12:00:00",
+            "moisture": moisture,
+            "temperature": temperature,
+            "humidity": 55.0,
+            "ph": 6.5,
+            "zone": "main",
+        },
+    }
+    return OutboundMessage(message, conflate_key=sensor_id)
+
+
+def test_rate_limited_client_gets_latest_reading_per_sensor():
+    async def scenario():
+        client = ClientConnection(FakeWebSocket(), queue_size=16, max_rate=5)
+        for reading_id in range(1, 6):
+            client.enqueue(_reading(1, reading_id))
+        client.enqueue(_reading(2, 10))
+        return client, await client._next_batch()
+
+    client, batch = asyncio.run(scenario())
+    assert sorted(outbound.message["data"]["id"] for outbound in batch) == [5, 10]
+    assert client.conflated_away == 4
+    assert client.queue.empty()
+
+
+def test_rate_limited_client_flushes_at_most_max_rate():
+    async def scenario():
+        client = ClientConnection(FakeWebSocket(), queue_size=16, max_rate=10)
+        client.enqueue(_reading(1, 1))
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await client._next_batch()
+        client.enqueue(_reading(1, 2))
+        await client._next_batch()
+        return loop.time() - started
+
+    assert asyncio.run(scenario()) >= 0.09
+
+
+def test_clearing_max_rate_requeues_pending_readings():
+    async def scenario():
+        client = ClientConnection(FakeWebSocket(), queue_size=16, max_rate=1)
+        client.enqueue(_reading(1, 1))
+        client.set_max_rate(None)
+        return client
+
+    client = asyncio.run(scenario())
+    assert not client.conflated
+    assert client.queue.qsize() == 1
+
+
+def test_delta_frames_carry_only_changed_fields():
+    import json
+
+    async def scenario():
+        websocket = FakeWebSocket()
+        client = ClientConnection(websocket, queue_size=16)
+        client.set_encoding("json", delta=True)
+        await client._send(_reading(1, 1, moisture=40.0, temperature=22.0))
+        await client._send(_reading(1, 2, moisture=39.5, temperature=22.0))
+        await client._send(_reading(2, 3))
+        await client._send(OutboundMessage({"type": "ping"}))
+        return [json.loads(frame) for frame in websocket.sent]
+
+    first, second, other_sensor, ping = asyncio.run(scenario())
+    assert first["type"] == "reading_delta"
+    assert set(first["d"]) == {"s", "i", "ts", "z", "m", "t", "h", "p"}
+    assert second["d"] == {"s": 1, "i": 2, "ts": first["d"]["ts"], "m": 39.5}
+    assert set(other_sensor["d"]) == set(first["d"])  # Each sensor has its own base
+    assert ping == {"type": "ping"}
+
+
+def test_msgpack_frames_are_binary():
+    msgpack = pytest.importorskip("msgpack")
+
+    async def scenario():
+        websocket = FakeWebSocket()
+        client = ClientConnection(websocket, queue_size=16)
+        client.set_encoding("msgpack", delta=False)
+        await client._send(_reading(1, 1))
+        return websocket.sent
+
+    (frame,) = asyncio.run(scenario())
+    assert isinstance(frame, bytes)
+    assert msgpack.unpackb(frame)["data"]["id"] == 1
+
+
+def test_switching_encoding_resets_delta_base():
+    async def scenario():
+        client = ClientConnection(FakeWebSocket(), queue_size=16)
+        client.set_encoding("json", delta=True)
+        await client._send(_reading(1, 1))
+        client.set_encoding("json", delta=True)
+        return client._delta(_reading(1, 2).compact)
+
+    assert "m" in asyncio.run(scenario())